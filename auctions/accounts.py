@@ -0,0 +1,182 @@
+"""
+Signing in, and knowing who is signed in, without a database round trip per page.
+
+Django's AuthenticationMiddleware loads request.user from the database on
+every request that has a session. CachedAuthenticationMiddleware gets it from
+`users`, a process-local cache of User rows, instead. It still checks the
+session's password hash against the cached row, as Django does, and falls
+back to the database whenever they differ, so a changed password still
+signs out other sessions. Saving or deleting a User drops it from this
+process's cache (see signals.py). Other processes see the change within
+AUCTIONS_USER_CACHE_TTL seconds.
+
+Password hashing (PBKDF2, deliberately slow) runs in a small thread pool of
+AUCTIONS_PASSWORD_THREADS threads, so a burst of sign-ins can only use that
+many CPUs and the rest keep serving pages. Requests that can't get a place
+in the pool within AUCTIONS_PASSWORD_WAIT seconds fail with
+PasswordHashingBusy, which the views turn into a "try again" page and
+CachedAuthenticationMiddleware into a bare 503 anywhere else, such as the
+admin's sign-in.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, hashers
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import User
+
+
+class UserCache:
+    """User rows by id, each kept for `ttl` seconds, least recently used dropped first."""
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # id -> (expires, user)
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        # Each request gets its own copy to change as it likes
+        return copy.copy(entry[1])
+
+    def set(self, user):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[user.pk] = (time.monotonic() + self.ttl, copy.copy(user))
+            self.entries.move_to_end(user.pk)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+users = UserCache(settings.AUCTIONS_USER_CACHE_TTL)
+
+
+class PasswordHashingBusy(Exception):
+    """Too many passwords are waiting to be hashed."""
+
+
+class PasswordHasherPool:
+    def __init__(self, threads, waiting):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="passwords")
+        # Running plus queued; beyond that callers give up rather than pile up
+        self.slots = threading.BoundedSemaphore(threads + waiting)
+
+    def run(self, function, *args, timeout):
+        if not self.slots.acquire(timeout=timeout):
+            raise PasswordHashingBusy
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+
+passwords = PasswordHasherPool(settings.AUCTIONS_PASSWORD_THREADS, settings.AUCTIONS_PASSWORD_THREADS * 4)
+
+
+def make_password(raw_password):
+    """hashers.make_password(), in the pool. May raise PasswordHashingBusy."""
+    return passwords.run(hashers.make_password, raw_password, timeout=settings.AUCTIONS_PASSWORD_WAIT)
+
+
+def check_password(user, raw_password):
+    """
+    user.check_password(), with the hashing in the pool. A hash made with
+    outdated parameters is upgraded and saved, here in the caller's thread
+    (and database connection). May raise PasswordHashingBusy.
+    """
+    upgraded = []
+
+    def check():
+        return hashers.check_password(raw_password, user.password, lambda raw: upgraded.append(hashers.make_password(raw)))
+
+    valid = passwords.run(check, timeout=settings.AUCTIONS_PASSWORD_WAIT)
+    if upgraded:
+        user.password = upgraded[0]
+        user.save(update_fields=["password"])
+    return valid
+
+
+class CachedUserBackend(ModelBackend):
+    """ModelBackend that hashes in the pool and loads users through `users`."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Take as long as a wrong password would, so usernames can't be probed by timing
+            make_password(password)
+            return None
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        user = users.get(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                users.set(user)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+def get_user(request):
+    """
+    auth.get_user(), answered from `users` when the session's password hash
+    matches the cached row. Anything else (no session, another backend, a
+    stale or missing row) takes Django's path, which reloads the cache.
+    """
+    session = request.session
+    backend_path = session.get(BACKEND_SESSION_KEY)
+    if SESSION_KEY in session and backend_path in settings.AUTHENTICATION_BACKENDS:
+        user_id = User._meta.pk.to_python(session[SESSION_KEY])
+        user = users.get(user_id)
+        if user is not None:
+            if user.is_active and constant_time_compare(session.get(HASH_SESSION_KEY, ""), user.get_session_auth_hash()):
+                user.backend = backend_path
+                return user
+            users.forget(user_id)
+    return auth.get_user(request)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PasswordHashingBusy):
+            response = HttpResponse("Too many people are signing in right now. Please try again.", status=503)
+            response["Retry-After"] = "5"
+            return response
+        return None
@@ -1,8 +1,17 @@
 from django.contrib import admin
-from .models import Categories, Bids, Listings, Comments
+from .models import (
+    ArchivedComments, ArchivedListings, Categories, Bids, Listings, Comments, OutboxEvents, Photos, ProxyBids, Rankings, Stamps,
+)
 
 # Register your models here.
 admin.site.register(Categories)
 admin.site.register(Bids)
 admin.site.register(Listings)
 admin.site.register(Comments)
+admin.site.register(OutboxEvents)
+admin.site.register(Photos)
+admin.site.register(ProxyBids)
+admin.site.register(Rankings)
+admin.site.register(Stamps)
+admin.site.register(ArchivedListings)
+admin.site.register(ArchivedComments)
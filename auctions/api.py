@@ -0,0 +1,126 @@
+"""
+Read-only JSON API.
+
+Responses are built from .values() rows rather than model instances, and
+every response carries a strong ETag. For a listing the ETag is just its id
+and version, which are read before anything else, so a client revalidating
+an unchanged listing gets a 304 without the bids or comments tables being
+touched. Collections hash the (id, version) pairs of their rows.
+"""
+import hashlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+
+from . import loaders
+from .directory import category_directory
+from .models import Listings
+from .pagination import paginate
+from .thumbnails import thumbnail_url
+
+LISTING_FIELDS = ("id", "title", "description", "price", "photo", "thumbnail", "category__category_name", "is_active",
+                  "publication_date", "ends_at", "bid_count", "last_bid_at", "version")
+HISTORY_SIZE = 50
+THUMBNAIL_WIDTH = 320
+
+
+def _etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _respond(request, etag, build):
+    """Return 304 if the client already has `etag`, otherwise the JSON built by `build()`."""
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse(build(), encoder=DjangoJSONEncoder)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _listing_rows(rows):
+    """
+    Rows from .values(*LISTING_FIELDS), with the category under a friendlier
+    key and the photo's medium JPEG thumbnail, if built, in place of its digest.
+    """
+    return [
+        {**row, "category": row.pop("category__category_name"),
+         "thumbnail": thumbnail_url(row["thumbnail"], THUMBNAIL_WIDTH, "jpg") if row["thumbnail"] else None}
+        for row in rows
+    ]
+
+
+@require_GET
+def listings(request):
+    """The active listing feed, keyset paginated like the index page."""
+    page = paginate(loaders.active_listings().values(*LISTING_FIELDS), request.GET.get("cursor"))
+    rows = _listing_rows(page)
+    etag = _etag(page.next_cursor, [(row["id"], row["version"]) for row in rows])
+    return _respond(request, etag, lambda: {"results": rows, "next_cursor": page.next_cursor})
+
+
+def _thread_page(listing_id, thread, cursor=None):
+    """A page of a listing's bids or comments, newest first."""
+    if thread == "bids":
+        rows = loaders.listing_bids(listing_id).values("id", "bid_amount", "bid_date", bidder_name=F("bidder__username"))
+        return paginate(rows, cursor, HISTORY_SIZE, keys=loaders.BID_KEYS)
+    rows = loaders.listing_comments(listing_id).values("id", "content", "publication_date", username=F("user__username"))
+    return paginate(rows, cursor, HISTORY_SIZE)
+
+
+@require_GET
+def listing(request, listing_id):
+    """One listing with the first page of its bids and of its comments."""
+    rows = _listing_rows(Listings.objects.filter(pk=listing_id).values(*LISTING_FIELDS))
+    if not rows:
+        raise Http404("No such listing")
+    listing = rows[0]
+
+    def build():
+        for thread in ("bids", "comments"):
+            page = _thread_page(listing_id, thread)
+            listing[thread] = page.items
+            listing[f"{thread}_next_cursor"] = page.next_cursor
+        return listing
+
+    return _respond(request, f'"listing-{listing_id}-v{listing["version"]}"', build)
+
+
+@require_GET
+def listing_thread(request, listing_id, thread):
+    """Later pages of a listing's bids or comments, following a *_next_cursor."""
+    version = Listings.objects.filter(pk=listing_id).values_list("version", flat=True).first()
+    if version is None:
+        raise Http404("No such listing")
+    cursor = request.GET.get("cursor")
+
+    def build():
+        page = _thread_page(listing_id, thread, cursor)
+        return {"results": page.items, "next_cursor": page.next_cursor}
+
+    return _respond(request, _etag(listing_id, version, thread, cursor), build)
+
+
+@require_GET
+def categories(request):
+    """Every category with its number of active listings and their price range."""
+    rows = [
+        {"id": c.id, "category_name": c.category_name, "active_count": c.active_count,
+         "min_price": c.min_price, "max_price": c.max_price}
+        for c in category_directory()
+    ]
+    return _respond(request, _etag(rows), lambda: {"results": rows})
+
+
+@require_GET
+def watchlist(request):
+    """The signed-in user's active watchlist."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    rows = _listing_rows(loaders.watchlist_listings(request.user).order_by("-publication_date", "-id").values(*LISTING_FIELDS))
+    return _respond(request, _etag([(row["id"], row["version"]) for row in rows]), lambda: {"results": rows})
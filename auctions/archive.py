@@ -0,0 +1,164 @@
+"""
+Archiving closed auctions, so the live tables only hold what is still in play.
+
+archive_closed() moves listings that closed more than
+AUCTIONS_ARCHIVE_AFTER_DAYS ago out of Listings, Bids and Comments and into
+ArchivedListings and ArchivedComments, BATCH_SIZE listings per transaction.
+A batch moves completely or not at all, so an interrupted run (see the
+archive_listings command) just resumes with what is left. Listings with
+notifications still waiting to be delivered are left for a later run.
+Their watchlist entries and proxy maximums are dropped.
+
+An archived listing keeps its id, so links to it keep working. Its bids are
+summarised: counts and first/last bid times in columns, and the history
+packed BID_FORMAT per bid (pennies, bidder id, seconds after the first bid),
+newest first, into ArchivedListings.bids: 12 bytes a bid rather than a row
+and two index entries. The listing, closed listing, thread and profile
+pages fall back to the archive for listings that aren't in Listings.
+"""
+import struct
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedComments, ArchivedListings, Bids, Comments, Listings, OutboxEvents, User
+from .pagination import KeysetPage, PAGE_SIZE, decode_cursor, encode_cursor, paginate
+
+BATCH_SIZE = 500
+BID_FORMAT = struct.Struct("<III")
+
+# What the bid history templates need of a bid
+ArchivedBid = namedtuple("ArchivedBid", ["bid_amount", "bidder", "bid_date"])
+
+
+def pack_bids(bids):
+    """
+    (packed history, first bid time) from (amount, bidder id, time) tuples,
+    newest first. Times are kept to the second.
+    """
+    if not bids:
+        return b"", None
+    first = bids[-1][2]
+    packed = bytearray(BID_FORMAT.size * len(bids))
+    for i, (amount, bidder_id, when) in enumerate(bids):
+        BID_FORMAT.pack_into(packed, i * BID_FORMAT.size, int(amount * 100), bidder_id or 0, int((when - first).total_seconds()))
+    return bytes(packed), first
+
+
+def unpack_bids(listing, start=0, stop=None):
+    """(amount, bidder id, time) of an archived listing's bids, newest first, from `start` to `stop`."""
+    size = BID_FORMAT.size
+    data = memoryview(listing.bids)[start * size: None if stop is None else stop * size]
+    return [
+        (Decimal(pennies) / 100, bidder_id or None, listing.first_bid_at + timedelta(seconds=offset))
+        for pennies, bidder_id, offset in BID_FORMAT.iter_unpack(data)
+    ]
+
+
+def due_listing_ids(cutoff, batch_size=BATCH_SIZE):
+    """Ids of listings that closed before `cutoff` and have nothing left to deliver, oldest first."""
+    pending = OutboxEvents.objects.filter(delivered_at__isnull=True).values("listing_id")
+    due = Listings.objects.filter(is_active=False, closed_at__lt=cutoff).exclude(pk__in=pending)
+    return list(due.order_by("closed_at", "id").values_list("id", flat=True)[:batch_size])
+
+
+def archive_listings(listing_ids):
+    """Move the given closed listings into the archive. Returns how many were moved."""
+    now = timezone.now()
+    with transaction.atomic():
+        listings = list(Listings.objects.filter(pk__in=listing_ids, is_active=False, closed_at__isnull=False))
+        if not listings:
+            return 0
+        ids = [listing.pk for listing in listings]
+        history = defaultdict(list)
+        bids = Bids.objects.filter(listing_id__in=ids).order_by("listing_id", "-bid_date", "-id")
+        for listing_id, amount, bidder_id, when in bids.values_list("listing_id", "bid_amount", "bidder_id", "bid_date"):
+            history[listing_id].append((amount, bidder_id, when))
+        archived = []
+        for listing in listings:
+            listing_bids = history[listing.pk]
+            packed, first_bid_at = pack_bids(listing_bids)
+            archived.append(ArchivedListings(
+                id=listing.pk,
+                title=listing.title,
+                description=listing.description,
+                price=listing.price,
+                photo=listing.photo,
+                thumbnail=listing.thumbnail,
+                category_id=listing.category_id,
+                owner_id=listing.owner_id,
+                seller_id=listing.seller_id,
+                high_bidder_id=listing.high_bidder_id,
+                publication_date=listing.publication_date,
+                ends_at=listing.ends_at,
+                closed_at=listing.closed_at,
+                archived_at=now,
+                bid_count=len(listing_bids),
+                bidder_count=len({bidder_id for _, bidder_id, _ in listing_bids if bidder_id}),
+                first_bid_at=first_bid_at,
+                last_bid_at=listing_bids[0][2] if listing_bids else None,
+                bids=packed,
+            ))
+        ArchivedListings.objects.bulk_create(archived)
+        comments = Comments.objects.filter(listing_id__in=ids)
+        ArchivedComments.objects.bulk_create(
+            ArchivedComments(id=pk, listing_id=listing_id, user_id=user_id, content=content, publication_date=published)
+            for pk, listing_id, user_id, content, published in comments.values_list(
+                "id", "listing_id", "user_id", "content", "publication_date"
+            ).iterator()
+        )
+        # Without the post_delete signals, which would bump the version of a
+        # listing that is about to go, once per comment and bid
+        comments._raw_delete(comments.db)
+        bids._raw_delete(bids.db)
+        Listings.watchlist.through.objects.filter(listings_id__in=ids).delete()
+        # Proxy maximums and delivered notifications go with the listings
+        Listings.objects.filter(pk__in=ids).delete()
+    return len(listings)
+
+
+def archive_closed(older_than=None, batch_size=BATCH_SIZE, limit=None, progress=None):
+    """
+    Archive every listing that closed more than `older_than` (a timedelta,
+    AUCTIONS_ARCHIVE_AFTER_DAYS by default) ago, one committed batch at a
+    time, stopping after about `limit` listings if given. Calls
+    `progress(total so far)` after each batch. Returns the number archived.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.AUCTIONS_ARCHIVE_AFTER_DAYS)
+    cutoff = timezone.now() - older_than
+    total = 0
+    while limit is None or total < limit:
+        ids = due_listing_ids(cutoff, batch_size if limit is None else min(batch_size, limit - total))
+        moved = archive_listings(ids)
+        if not moved:
+            break
+        total += moved
+        if progress:
+            progress(total)
+    return total
+
+
+def bid_page(listing, cursor=None, page_size=PAGE_SIZE):
+    """
+    A KeysetPage of an archived listing's bids, newest first. The packed
+    history never changes, so the cursor is simply a position in it.
+    """
+    values = decode_cursor(cursor, 1)
+    try:
+        start = max(int(values[0]), 0) if values else 0
+    except (TypeError, ValueError):
+        start = 0
+    rows = unpack_bids(listing, start, start + page_size + 1)
+    bidders = User.objects.in_bulk({bidder_id for _, bidder_id, _ in rows[:page_size] if bidder_id})
+    items = [ArchivedBid(amount, bidders.get(bidder_id), when) for amount, bidder_id, when in rows[:page_size]]
+    return KeysetPage(items, encode_cursor([start + page_size]) if len(rows) > page_size else None)
+
+
+def comment_page(listing, cursor=None):
+    """A KeysetPage of an archived listing's comments, newest first through archived_comment_thread_idx."""
+    return paginate(ArchivedComments.objects.filter(listing=listing).select_related("user"), cursor)
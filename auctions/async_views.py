@@ -0,0 +1,119 @@
+"""
+Async versions of the busiest views, plus the live price stream.
+
+urls.py routes index, listing and bid here instead of auctions.views when
+AUCTIONS_ASYNC_VIEWS is on (commerce/asgi.py turns it on by default). Data is
+read with the async ORM; template rendering, session/user loading and bid
+placement still run through sync_to_async because they are synchronous in
+Django.
+
+listing_events is a server-sent events stream: it holds the connection open
+and forwards each new bid on the listing from the pub/sub broker, so watching
+a listing costs nothing until someone bids. It is only routed, and the
+listing page only opens it, when served over ASGI with the async views on.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+
+from . import loaders, views
+from .bidding import place_bid, place_max_bid
+from .db import read_from_replica
+from .models import Listings
+from .pagination import apaginate
+from .pubsub import get_broker, listing_channel
+from .watchlists import is_watching, watched_ids
+
+HEARTBEAT_SECONDS = 15
+
+
+async def _is_authenticated(request):
+    # Loading request.user may query the session and user tables
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+@read_from_replica
+async def index(request):
+    """Active listings, newest first, one keyset page at a time."""
+    page = await apaginate(loaders.active_listings(), request.GET.get("cursor"))
+    watched = await sync_to_async(watched_ids)(request.user)
+    return await sync_to_async(render)(
+        request, "auctions/index.html", {"listings": page.items, "page": page, "watched": watched},
+        using=settings.AUCTIONS_HOT_TEMPLATES,
+    )
+
+
+@read_from_replica
+async def listing(request, listing_id):
+    try:
+        listing = await loaders.listing_detail().aget(pk=listing_id)
+    except Listings.DoesNotExist:
+        archived = await loaders.archived_listing_detail().filter(pk=listing_id).afirst()
+        if archived is None:
+            return HttpResponseRedirect(reverse("index"))
+        return await sync_to_async(views._closed_listing_page)(request, archived)
+    if not listing.is_active:
+        return await sync_to_async(views._closed_listing_page)(request, listing)
+    is_owner = is_watchlist = False
+    if await _is_authenticated(request):
+        user = request.user
+        is_owner = user.id == listing.owner_id
+        is_watchlist = not is_owner and await sync_to_async(is_watching)(user, listing.pk)
+    return await sync_to_async(views._listing_page)(request, listing, is_owner, is_watchlist)
+
+
+async def bid(request, listing_id):
+    """When people submit bids on listings."""
+    if not await _is_authenticated(request):
+        return redirect_to_login(request.get_full_path())
+    if request.method == "POST":
+        place = place_max_bid if request.POST.get("automatic") == "1" else place_bid
+        result = await sync_to_async(place)(listing_id, request.user, request.POST.get("up_bid", ""))
+        views._report_bid(request, result)
+    return HttpResponseRedirect(reverse("listing", args=[listing_id]))
+
+
+async def listing_events(request, listing_id):
+    """
+    Server-sent events with the listing's price and high bidder, one `price`
+    event per accepted bid. 204 when not served over ASGI, which tells
+    EventSource to stop reconnecting.
+    """
+    if not views._live_updates(request):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(_event_stream(listing_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Stop nginx buffering the stream
+    return response
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _event_stream(listing_id):
+    async with get_broker().subscribe(listing_channel(listing_id)) as subscription:
+        # Read the current state only once subscribed, so no bid can slip between the two
+        state = await (
+            Listings.objects.filter(pk=listing_id)
+            .values("price", "is_active", high_bidder_name=F("high_bidder__username"))
+            .afirst()
+        )
+        if state is None or not state["is_active"]:
+            yield _event("closed", {"listing": listing_id})
+            return
+        yield _event("price", {
+            "listing": listing_id,
+            "price": str(state["price"]),
+            "high_bidder": state["high_bidder_name"],
+        })
+        while True:
+            message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+            # SSE comments keep proxies from timing out idle connections
+            yield ": keepalive\n\n" if message is None else _event("price", message)
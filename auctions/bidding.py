@@ -0,0 +1,215 @@
+"""
+Bid placement.
+
+A bid is accepted with a single conditional UPDATE ("set the price to X where
+the listing is open and its price is below X"). The database applies that
+compare-and-set atomically, so concurrent bidders can never overwrite a higher
+price with a lower one, and the Bids row is written in the same transaction so
+every accepted bid is recorded exactly once. The same UPDATE maintains the
+listing's bid statistics (bid_count, high_bidder, last_bid_at), version and
+hotness (see auctions.ranking); the price range of the listing's category is
+refreshed alongside when the bid moves it, and an outbox event is appended
+for the outbid notification.
+
+Proxy bidding: place_max_bid records a hidden maximum (ProxyBids) and the
+listing is settled against every maximum in memory (settle). The leader
+holds the lead at one increment (INCREMENT_LADDER) above the strongest
+rival, never more than their own maximum. Ties go to the maximum set first.
+A settlement that changes the price or the leader writes one UPDATE and one
+Bids row at the resulting price, however many increments the maximums would
+have traded by hand. A manual bid that another bidder's maximum covers is
+settled in the same transaction, so it is answered at once by one
+automatic bid.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .directory import price_raised
+from .models import Bids, Listings, ProxyBids
+from .notifications import record_bid
+from .ranking import BID_WEIGHT
+
+ACCEPTED = "accepted"
+OUTBID = "outbid"
+# The bid was placed, but another bidder's maximum covered it and now leads
+OVERTAKEN = "overtaken"
+INVALID = "invalid"
+
+CENT = Decimal("0.01")
+MAX_BID = Decimal("999999.99")  # Largest value that fits Listings.price (max_digits=8)
+
+# (up to this price, the automatic bid increment), then TOP_INCREMENT
+INCREMENT_LADDER = [
+    (Decimal("1.00"), Decimal("0.05")),
+    (Decimal("5.00"), Decimal("0.20")),
+    (Decimal("15.00"), Decimal("0.50")),
+    (Decimal("60.00"), Decimal("1.00")),
+    (Decimal("150.00"), Decimal("2.00")),
+    (Decimal("300.00"), Decimal("5.00")),
+    (Decimal("600.00"), Decimal("10.00")),
+    (Decimal("1500.00"), Decimal("20.00")),
+    (Decimal("3000.00"), Decimal("50.00")),
+]
+TOP_INCREMENT = Decimal("100.00")
+# Leaders from before any maximum was set (no last_bid_at) rank as earliest
+LONG_AGO = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+
+class BidResult(namedtuple("BidResult", ["status", "amount"])):
+    __slots__ = ()
+
+    @property
+    def accepted(self):
+        return self.status == ACCEPTED
+
+
+def parse_amount(raw):
+    """Convert user input to a two decimal place Decimal, or None if it is not a usable bid."""
+    try:
+        amount = Decimal(str(raw).strip()).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount <= 0 or amount > MAX_BID:
+        return None
+    return amount
+
+
+def place_bid(listing_id, bidder, amount):
+    """
+    Try to raise the price of an open listing to `amount` on behalf of `bidder`.
+    Returns a BidResult; the listing is never read back from the database.
+    """
+    amount = parse_amount(amount)
+    if amount is None:
+        return BidResult(INVALID, None)
+    now = timezone.now()
+    with transaction.atomic():
+        open_listing = Listings.objects.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now), pk=listing_id, is_active=True)
+        updated = open_listing.filter(price__lt=amount).update(
+            price=amount,
+            bid_count=F("bid_count") + 1,
+            high_bidder=bidder,
+            last_bid_at=now,
+            version=F("version") + 1,
+            hotness=F("hotness") + BID_WEIGHT,
+        )
+        if not updated:
+            return BidResult(OUTBID, amount)
+        save_bid(Bids(bid_amount=amount, bidder=bidder, listing_id=listing_id, bid_date=now))
+        record_bid(listing_id, bidder.pk, amount, now)
+        # Read after the UPDATE, which holds the write lock, so no maximum can be set in between
+        price, leader_id = amount, bidder.pk
+        if ProxyBids.objects.filter(listing_id=listing_id, max_amount__gte=amount).exclude(bidder=bidder).exists():
+            price, leader_id = settle(listing_id, amount, bidder.pk, now, now)
+        price_raised(listing_id, price)
+    return BidResult(ACCEPTED if leader_id == bidder.pk else OVERTAKEN, price)
+
+
+def increment(price):
+    """How far an automatic bid raises the price from `price`."""
+    for limit, step in INCREMENT_LADDER:
+        if price <= limit:
+            return step
+    return TOP_INCREMENT
+
+
+def place_max_bid(listing_id, bidder, max_amount):
+    """
+    Set `bidder`'s hidden maximum for an open listing and settle the listing.
+    A maximum has to be above the current price and can only be raised.
+    Returns a BidResult with the price after settling: ACCEPTED if `bidder`
+    leads, OVERTAKEN if another maximum is higher.
+    """
+    max_amount = parse_amount(max_amount)
+    if max_amount is None:
+        return BidResult(INVALID, None)
+    now = timezone.now()
+    with transaction.atomic():
+        # Writing first takes the write lock (the row lock on PostgreSQL) before anything
+        # is read, so settlements of the same listing run one at a time
+        open_listing = Listings.objects.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now), pk=listing_id, is_active=True)
+        if not open_listing.filter(price__lt=max_amount).update(version=F("version") + 1):
+            return BidResult(OUTBID, max_amount)
+        price, leader_id, leader_since = (
+            Listings.objects.filter(pk=listing_id).values_list("price", "high_bidder", "last_bid_at").get()
+        )
+        raised = ProxyBids.objects.filter(listing_id=listing_id, bidder=bidder, max_amount__lt=max_amount).update(
+            max_amount=max_amount, set_at=now
+        )
+        if not raised:
+            _, created = ProxyBids.objects.get_or_create(
+                listing_id=listing_id, bidder=bidder, defaults={"max_amount": max_amount, "set_at": now}
+            )
+            if not created:
+                # Already as high or higher: maximums are never lowered
+                transaction.set_rollback(True)
+                return BidResult(INVALID, price)
+        settled_price, leader_id = settle(listing_id, price, leader_id, leader_since or LONG_AGO, now)
+        if settled_price != price:
+            price_raised(listing_id, settled_price)
+    return BidResult(ACCEPTED if leader_id == bidder.pk else OVERTAKEN, settled_price)
+
+
+def save_bid(bid):
+    """Save a new bid whose listing's version the caller has already bumped."""
+    # Tells the Bids signal receiver not to bump it again (see auctions.signals)
+    bid._version_bumped = True
+    bid.save(force_insert=True)
+
+
+def settle(listing_id, price, leader_id, leader_since, now):
+    """
+    Settle a listing's maximums against its current `price` and leader (who
+    has held it since `leader_since`), and write the outcome: at most one
+    UPDATE and one Bids row. Runs inside the caller's transaction, which
+    must already hold the write lock and bump the listing's version.
+    Returns (price, leader id) after settling.
+    """
+    # Only the leader's maximum and the two strongest rivals can affect the outcome
+    rows = (
+        ProxyBids.objects.filter(listing_id=listing_id, max_amount__gte=price)
+        .order_by("-max_amount", "set_at")
+        .values_list("max_amount", "set_at", "bidder_id")[:3]
+    )
+    leader = (price, leader_since, leader_id) if leader_id else None
+    rivals = []
+    for entry in rows:
+        if entry[2] == leader_id:
+            leader = entry
+        else:
+            rivals.append(entry)
+    contenders = sorted(rivals[:2] + ([leader] if leader else []), key=lambda entry: (-entry[0], entry[1]))
+    if not contenders or contenders[0] is leader and len(contenders) == 1:
+        return price, leader_id
+    (top, _, winner), rest = contenders[0], contenders[1:]
+    # Beat the strongest remaining maximum (or just the current price) by an increment
+    floor = max(price, rest[0][0]) if rest else price
+    new_price = min(top, floor + increment(floor))
+    if (new_price, winner) == (price, leader_id):
+        return price, leader_id
+    Listings.objects.filter(pk=listing_id).update(
+        price=new_price, bid_count=F("bid_count") + 1, high_bidder_id=winner, last_bid_at=now,
+        hotness=F("hotness") + BID_WEIGHT,
+    )
+    save_bid(Bids(bid_amount=new_price, bidder_id=winner, listing_id=listing_id, bid_date=now))
+    record_bid(listing_id, winner, new_price, now)
+    return new_price, winner
+
+
+def bid_stats_from_bids():
+    """
+    Expressions that recompute each listing's bid statistics from its Bids rows.
+    Used to rebuild or verify the denormalised columns in bulk.
+    """
+    bids = Bids.objects.filter(listing=OuterRef("pk")).order_by()
+    return {
+        "bid_count": Coalesce(Subquery(bids.values("listing").annotate(n=Count("id")).values("n")), 0),
+        "high_bidder": Subquery(bids.order_by("-bid_amount", "-id").values("bidder")[:1]),
+        "last_bid_at": Subquery(bids.values("listing").annotate(last=Max("bid_date")).values("last")),
+    }
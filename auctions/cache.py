@@ -0,0 +1,10 @@
+"""
+Fragment caching for the listing detail page.
+
+The parts of listing.html that look the same to every visitor are wrapped in
+{% cache %} blocks keyed by the listing id and Listings.version. Every change
+to what those fragments show bumps the version, so stale fragments are simply
+never looked up again and age out of the cache.
+"""
+
+FRAGMENT_TIMEOUT = 60 * 60
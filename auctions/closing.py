@@ -0,0 +1,63 @@
+"""
+Closing auctions, either by the seller or because their end time has passed.
+
+Closing is one UPDATE over a set of listings that hands each one to its high
+bidder (if it has one), records the seller and closing time, and marks it
+inactive. The UPDATE only matches listings
+that are still active, so running it twice, or from two workers at once, can
+never close a listing twice. Bids use the same is_active condition, so a bid
+either lands before the close or is rejected. Winners are read back after the
+UPDATE, once the listings can no longer change, and queued for notification.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .directory import listings_removed, rebuild_category_stats
+from .models import Listings
+from .notifications import record_wins
+
+BATCH_SIZE = 1000
+
+
+def close_listings(listing_ids):
+    """Close the given listings. Returns how many were actually closed by this call."""
+    still_open = Listings.objects.filter(pk__in=listing_ids, is_active=True)
+    with transaction.atomic():
+        category_ids = list(still_open.values_list("category_id", flat=True))
+        closed = still_open.update(
+            is_active=False,
+            closed_at=timezone.now(),
+            # Both read the row as it was before the UPDATE
+            seller=F("owner"),
+            owner=Coalesce(F("high_bidder"), F("owner")),
+            version=F("version") + 1,
+        )
+        if closed == len(category_ids):
+            listings_removed(category_ids)
+        else:
+            # Someone else closed some of them in between; recount rather than guess which
+            rebuild_category_stats(set(category_ids))
+        if closed:
+            won = Listings.objects.filter(pk__in=listing_ids, is_active=False, high_bidder__isnull=False)
+            record_wins(won.values_list("pk", "high_bidder", "price"))
+    return closed
+
+
+def due_listing_ids(now=None, batch_size=BATCH_SIZE):
+    """Ids of open listings whose end time has passed, oldest first."""
+    now = now or timezone.now()
+    due = Listings.objects.filter(is_active=True, ends_at__lte=now).order_by("ends_at")
+    return list(due.values_list("id", flat=True)[:batch_size])
+
+
+def close_due_listings(now=None, batch_size=BATCH_SIZE):
+    """Close every listing that is due, one batch at a time. Returns the number closed."""
+    now = now or timezone.now()
+    closed = 0
+    while True:
+        ids = due_listing_ids(now, batch_size)
+        if not ids:
+            return closed
+        closed += close_listings(ids)
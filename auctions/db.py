@@ -0,0 +1,122 @@
+"""
+Database profile: SQLite tuning, and a read replica for the hot pages.
+
+Every new SQLite connection gets the pragmas in AUCTIONS_SQLITE_PRAGMAS (WAL
+and synchronous=NORMAL outside DEBUG, a busy timeout, mmap; see settings.py),
+which let bids from several worker processes queue for the write lock
+instead of failing with "database is locked".
+
+When settings.DATABASES has a "replica" alias, views decorated with
+read_from_replica (index, category and listing) read listing data from it.
+Everything else, including sessions, users and every write, stays on
+"default". A client that has just POSTed something is pinned to "default"
+for AUCTIONS_REPLICA_PIN_SECONDS by ReplicaPinMiddleware, so it always sees
+its own bid, comment or watchlist change despite replication lag.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DEFAULT = "default"
+REPLICA = "replica"
+PIN_COOKIE = "auctions_primary"
+# Only listing data is read from the replica
+REPLICATED_MODELS = {"auctions.Listings", "auctions.Listings_watchlist", "auctions.Categories", "auctions.Bids", "auctions.Comments"}
+
+_read_alias = ContextVar("auctions_read_alias", default=None)
+
+
+def apply_sqlite_pragmas(connection):
+    """Called for every new connection (see signals.py)."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "AUCTIONS_SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name}={value}")
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias and model._meta.label in REPLICATED_MODELS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or rows read from the replica would be saved back to it
+        return DEFAULT
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Both aliases hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT
+
+
+def _use_replica(request):
+    return replica_configured() and request.method in ("GET", "HEAD") and PIN_COOKIE not in request.COOKIES
+
+
+def read_from_replica(view):
+    """Serve the view's listing reads from the replica when that is safe (sync or async views)."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not _use_replica(request):
+                return await view(request, *args, **kwargs)
+            with reading_from(REPLICA):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _use_replica(request):
+                return view(request, *args, **kwargs)
+            with reading_from(REPLICA):
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """After any write request, send the client's reads to the primary for a few seconds."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "AUCTIONS_REPLICA_PIN_SECONDS", 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            response.set_cookie(PIN_COOKIE, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,140 @@
+"""
+The category directory: every category with its active listing statistics.
+
+Categories.active_count, min_price and max_price describe each category's
+active listings. Rather than being aggregated from Listings on every page
+view they are adjusted in place whenever a listing is created, closed,
+deleted, re-categorized or bid on (see signals.py, closing.py and
+bidding.py); rebuild_category_stats recomputes them from scratch.
+
+Each of those changes, bar price changes, also bumps the directory's version
+stamp (see auctions.stamps) in the same transaction. Every process keeps the
+last directory it loaded and reuses it until the stamp moves, so a warm
+category page or listing form makes one primary key lookup rather than
+loading the directory. Bids are too frequent to throw every copy away for,
+so the price ranges shown can lag until the next listing comes or goes.
+"""
+from collections import Counter
+
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from . import loaders, stamps
+from .models import Categories, Listings
+
+STAMP = "directory"
+
+# Process-local: (version stamp, directory) for the last directory loaded
+_loaded = (None, None)
+
+
+def directory_version():
+    return stamps.read(STAMP)
+
+
+def directory_changed():
+    """Invalidate every process's directory as the current transaction commits."""
+    stamps.bump([STAMP])
+
+
+def category_directory():
+    """
+    Every category, alphabetically, with its statistics and newest active
+    listings (loaders.categories_with_previews), from this process's copy
+    when it is still current. Treat the result as read-only: it is shared.
+    """
+    global _loaded
+    version = directory_version()
+    loaded_version, categories = _loaded
+    if loaded_version != version:
+        # Loaded after reading the stamp, so a concurrent change can only make this copy newer than its stamp
+        categories = list(loaders.categories_with_previews())
+        _loaded = (version, categories)
+    return categories
+
+
+def find_category(**attrs):
+    """The first directory entry whose attributes match, or None."""
+    for category in category_directory():
+        if all(str(getattr(category, name)) == str(value) for name, value in attrs.items()):
+            return category
+    return None
+
+
+def price_range():
+    """Expressions recomputing a category's min_price and max_price; each is one lookup on listing_category_price_idx."""
+    prices = Listings.objects.filter(category=OuterRef("pk"), is_active=True).values("price")
+    return {
+        "min_price": Subquery(prices.order_by("price")[:1]),
+        "max_price": Subquery(prices.order_by("-price")[:1]),
+    }
+
+
+def category_stats():
+    """Expressions recomputing every statistic from Listings, for rebuilds."""
+    active = Listings.objects.filter(category=OuterRef("pk"), is_active=True).order_by()
+    return {
+        "active_count": Coalesce(Subquery(active.values("category").annotate(n=Count("id")).values("n")), 0),
+        **price_range(),
+    }
+
+
+def _add(category_id, count, low, high):
+    Categories.objects.filter(pk=category_id).update(
+        active_count=F("active_count") + count,
+        min_price=Case(When(Q(min_price__isnull=True) | Q(min_price__gt=low), then=Value(low)), default=F("min_price")),
+        max_price=Case(When(Q(max_price__isnull=True) | Q(max_price__lt=high), then=Value(high)), default=F("max_price")),
+    )
+
+
+def listing_added(category_id, price):
+    """An active listing joined the category."""
+    if category_id is None:
+        return
+    _add(category_id, 1, price, price)
+    directory_changed()
+
+
+def listings_added(listings):
+    """Active listings joined their categories in bulk (see auctions.imports); one UPDATE per category."""
+    stats = {}
+    for listing in listings:
+        if listing.category_id is None:
+            continue
+        count, low, high = stats.get(listing.category_id, (0, listing.price, listing.price))
+        stats[listing.category_id] = (count + 1, min(low, listing.price), max(high, listing.price))
+    for category_id, (count, low, high) in stats.items():
+        _add(category_id, count, low, high)
+    directory_changed()
+
+
+def listings_removed(category_ids):
+    """Active listings left their categories (closed, deleted or moved); one id per listing."""
+    for category_id, count in Counter(i for i in category_ids if i is not None).items():
+        Categories.objects.filter(pk=category_id).update(active_count=F("active_count") - count, **price_range())
+    directory_changed()
+
+
+def prices_changed(category_filter):
+    """An active listing's price changed; `category_filter` is a Q selecting its category."""
+    Categories.objects.filter(category_filter).update(**price_range())
+
+
+def price_raised(listing_id, price):
+    """
+    A bid raised an active listing's price to `price`. Its category's range
+    only moves if that is a new maximum or the listing was the cheapest, so
+    most bids leave the category row alone. Returns whether it was updated.
+    """
+    cheapest = Listings.objects.filter(category=OuterRef("pk"), is_active=True, price=OuterRef("min_price"))
+    return Categories.objects.filter(Q(max_price__lt=price) | ~Exists(cheapest), listings=listing_id).update(**price_range())
+
+
+def rebuild_category_stats(category_ids=None):
+    """Recompute the statistics of the given categories (all by default). Returns how many were updated."""
+    categories = Categories.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    updated = categories.update(**category_stats())
+    directory_changed()
+    return updated
@@ -0,0 +1,198 @@
+"""
+Streaming exports of closed sales, bid histories and a user's activity.
+
+Rows come from .values_list().iterator(chunk_size=CHUNK_SIZE), so the
+database hands them over a chunk at a time and no model instances are
+built. They are written out as CSV or NDJSON in blocks of about BLOCK_SIZE
+bytes, optionally gzipped on the fly. Memory stays flat however many rows
+are exported. Used by views.export and the export_data command.
+
+Datasets (filters: since/until, category, user):
+- sales: closed listings, archived ones included, by closing time; `user`
+  matches seller or winner
+- bids: every bid, in the order placed; `user` matches the bidder
+- activity: one user's listings, bids, wins and comments (`user` required)
+
+Archived listings only keep a summary of their bids, so they appear in
+sales but not in the bids or activity datasets.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, time
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import CharField, F, Q, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ArchivedListings, Bids, Categories, Comments, Listings, User
+
+CHUNK_SIZE = 2000
+BLOCK_SIZE = 64 * 1024
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+SALES_COLUMNS = ("listing_id", "title", "category", "seller", "winner", "price", "bids", "listed_at", "closed_at")
+BID_COLUMNS = ("bid_id", "listing_id", "listing_title", "bidder", "amount", "placed_at")
+ACTIVITY_COLUMNS = ("activity", "at", "listing_id", "listing_title", "amount", "detail")
+
+
+def _between(rows, field, since, until):
+    if since:
+        rows = rows.filter(**{f"{field}__gte": since})
+    if until:
+        rows = rows.filter(**{f"{field}__lt": until})
+    return rows
+
+
+def sales(since=None, until=None, category=None, user=None):
+    parts = []
+    # Archived sales (see auctions.archive) closed before any still in Listings
+    for rows in (ArchivedListings.objects.all(), Listings.objects.filter(is_active=False)):
+        rows = _between(rows, "closed_at", since, until)
+        if category:
+            rows = rows.filter(category=category)
+        if user:
+            rows = rows.filter(Q(seller=user) | Q(high_bidder=user))
+        parts.append(rows.order_by("closed_at", "id").values_list(
+            "id", "title", "category__category_name", "seller__username", "high_bidder__username",
+            "price", "bid_count", "publication_date", "closed_at",
+        ).iterator(chunk_size=CHUNK_SIZE))
+    return chain.from_iterable(parts)
+
+
+def bids(since=None, until=None, category=None, user=None):
+    rows = _between(Bids.objects.all(), "bid_date", since, until)
+    if category:
+        rows = rows.filter(listing__category=category)
+    if user:
+        rows = rows.filter(bidder=user)
+    return rows.order_by("id").values_list(
+        "id", "listing_id", "listing__title", "bidder__username", "bid_amount", "bid_date",
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def activity(since=None, until=None, category=None, user=None):
+    if user is None:
+        raise ValueError("An activity export needs a user")
+    none = Value(None, output_field=CharField())
+    listed = (
+        # Sold listings have passed to their winner, so the seller is looked up separately
+        Listings.objects.filter(Q(is_active=True, owner=user) | Q(is_active=False, seller=user)),
+        "publication_date", "listed", "id", "title", "price", none,
+    )
+    won = (
+        Listings.objects.filter(is_active=False, high_bidder=user),
+        "closed_at", "won", "id", "title", "price", none,
+    )
+    bid = (
+        Bids.objects.filter(bidder=user),
+        "bid_date", "bid", "listing_id", "listing__title", "bid_amount", none,
+    )
+    commented = (
+        Comments.objects.filter(user=user),
+        "publication_date", "comment", "listing_id", "listing__title", none, "content",
+    )
+    parts = []
+    for rows, at, kind, listing_id, title, amount, detail in (listed, won, bid, commented):
+        rows = _between(rows, at, since, until)
+        if category:
+            rows = rows.filter(**{"category" if rows.model is Listings else "listing__category": category})
+        parts.append(
+            rows.order_by(at).annotate(
+                _kind=Value(kind, output_field=CharField()), _at=F(at), _listing=F(listing_id), _title=F(title),
+                _amount=F(amount) if isinstance(amount, str) else amount,
+                _detail=F(detail) if isinstance(detail, str) else detail,
+            ).values_list("_kind", "_at", "_listing", "_title", "_amount", "_detail").iterator(chunk_size=CHUNK_SIZE)
+        )
+    return chain.from_iterable(parts)
+
+
+DATASETS = {"sales": (SALES_COLUMNS, sales), "bids": (BID_COLUMNS, bids), "activity": (ACTIVITY_COLUMNS, activity)}
+
+
+def _instant(value, end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Not a date: {value!r}")
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def parse_filters(since="", until="", category="", user=""):
+    """
+    Filters from strings (query parameters or command options): ISO dates or
+    datetimes, a category name and a username. `until` is inclusive of a
+    whole day given as a bare date. Raises ValueError for bad values.
+    """
+    filters = {}
+    if since:
+        filters["since"] = _instant(since)
+    if until:
+        filters["until"] = _instant(until, end_of_day=True)
+    if category:
+        filters["category"] = Categories.objects.filter(category_name=category).first()
+        if filters["category"] is None:
+            raise ValueError(f"No such category: {category!r}")
+    if user:
+        filters["user"] = User.objects.filter(username=user).first()
+        if filters["user"] is None:
+            raise ValueError(f"No such user: {user!r}")
+    return filters
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_blocks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        if buffer.tell() >= BLOCK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def ndjson_blocks(columns, rows):
+    encoder = DjangoJSONEncoder()
+    lines, size = [], 0
+    for row in rows:
+        line = encoder.encode(dict(zip(columns, row)))
+        lines.append(line)
+        size += len(line) + 1
+        if size >= BLOCK_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines, size = [], 0
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def gzipped(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(dataset, format, compress=False, **filters):
+    """An iterator of byte blocks with the whole export. Raises ValueError for bad arguments."""
+    if dataset not in DATASETS or format not in CONTENT_TYPES:
+        raise ValueError(f"No export {dataset}.{format}")
+    columns, query = DATASETS[dataset]
+    rows = query(**filters)
+    blocks = (csv_blocks if format == "csv" else ndjson_blocks)(columns, rows)
+    return gzipped(blocks) if compress else blocks
+
+
+def filename(dataset, format, compress=False):
+    return f"{dataset}-{timezone.localdate():%Y%m%d}.{format}" + (".gz" if compress else "")
@@ -1,7 +1,32 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from .directory import category_directory, find_category
 from .models import User, Categories, Bids, Listings, Comments
 from django.utils.translation import gettext_lazy as _
 
+
+class CategoryChoiceField(forms.ChoiceField):
+    """A ModelChoiceField over Categories that reads the cached category directory instead of the database."""
+
+    def __init__(self, **kwargs):
+        super().__init__(choices=self.category_choices, **kwargs)
+
+    @staticmethod
+    def category_choices():
+        return [("", "---------")] + [(category.pk, category.category_name) for category in category_directory()]
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        category = find_category(pk=value)
+        if category is None:
+            raise ValidationError(self.error_messages["invalid_choice"], code="invalid_choice", params={"value": value})
+        return category
+
+    def validate(self, value):
+        forms.Field.validate(self, value)
+
+
 class CreateListingForm(forms.ModelForm):
     """A form for creating a new auction listing with options for:
     - Title
@@ -9,16 +34,19 @@ class CreateListingForm(forms.ModelForm):
     - Image (optional)
     - Starting bid
     - Category (optional)
+    - Duration in days (optional, no end date if left blank)
     """
     title = forms.CharField(label="Title", max_length=64, required=True, widget=forms.TextInput(attrs={'placeholder': 'Title', 'class': 'form-control form-group'}))
     description = forms.CharField(label="Description", required=True, widget=forms.Textarea(attrs={'placeholder':'Item details', 'rows':'3', 'class':'form-control form-group'}))
     photo = forms.URLField(label="Image URL", required=False, widget=forms.TextInput(attrs={'placeholder': 'Photo URL', 'class': 'form-control form-group'}))
     starting_bid = forms.DecimalField(decimal_places=2, max_digits=8, widget=forms.NumberInput(attrs={'placeholder':'Initial Price', 'min':'0.01', 'step': '0.01', 'class': 'form-control form-group'}))
-    category = forms.ModelChoiceField(queryset=Categories.objects.all(), required=False, label="Category", widget=forms.Select(attrs={'class': 'form-control form-group'}))
+    duration = forms.TypedChoiceField(label="Duration", required=False, coerce=int, empty_value=None, choices=[("", "No end date"), (1, "1 day"), (3, "3 days"), (7, "7 days"), (14, "14 days")], widget=forms.Select(attrs={'class': 'form-control form-group'}))
+    category = CategoryChoiceField(required=False, label="Category", widget=forms.Select(attrs={'class': 'form-control form-group'}))
 
     class Meta:
         model = Listings
-        fields = ["title", "description", "photo", "starting_bid", "category"]
+        # category is set in save(), so model validation never looks the category up again
+        fields = ["title", "description", "photo", "starting_bid", "duration"]
 
     def save(self, commit=True):
         listing = super().save(commit=False)
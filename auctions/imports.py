@@ -0,0 +1,188 @@
+"""
+Bulk listing import from CSV or NDJSON, for sellers with many items.
+
+Columns/keys: title, description, photo, starting_bid, category (its name)
+and duration (days). Each row is checked by CreateListingForm's own fields,
+built once and reused for every row, plus the model's validators. Category
+names are looked up in a map of every category loaded once up front.
+
+Valid rows are inserted with bulk_create, BATCH_SIZE at a time. Each batch
+runs in its own transaction together with its category statistics, because
+bulk_create skips the signals that normally keep those up to date (see
+auctions.directory). Invalid rows are skipped and reported by line number,
+so a seller can fix just those and upload them again. Used by
+views.import_listings and the import_listings command.
+"""
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import directory
+from .forms import CreateListingForm
+from .models import Categories, Listings
+
+BATCH_SIZE = 1000
+# Beyond this only the count of invalid rows is reported
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "ndjson")
+
+
+def guess_format(filename):
+    """The format a file name's extension suggests. Raises ValueError if it suggests none."""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    if extension == "csv":
+        return "csv"
+    raise ValueError(f"Can't tell the format of {filename!r}; use .csv or .ndjson")
+
+
+class UnreadableFile(ValueError):
+    """
+    A CSV file couldn't be read (decoded or parsed) from `line` on.
+    import_listings sets `summary` to what was imported before that point,
+    which is kept.
+    """
+
+    def __init__(self, line, error):
+        super().__init__(f"Stopped at line {line}: {error}")
+        self.line = line
+        self.summary = None
+
+
+def csv_rows(stream):
+    """(line number, row) for each row of a CSV file with a header line; a row may span lines."""
+    reader = csv.DictReader(stream)
+    line = 2
+    try:
+        for row in reader:
+            yield line, row
+            line = reader.line_num + 1
+    except (csv.Error, ValueError) as e:
+        # Undecodable bytes, or CSV that can't be parsed, such as a field over csv.field_size_limit()
+        raise UnreadableFile(line, e) from e
+
+
+def ndjson_rows(file):
+    """
+    (line number, row) for each line of a binary NDJSON file; row is None for
+    lines that aren't JSON objects, including lines that aren't UTF-8.
+    """
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            # Decoded line by line, so bad bytes only spoil their own line
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+class ListingImport:
+    """Checks rows and inserts the valid ones as listings owned by `owner`."""
+
+    def __init__(self, owner, batch_size=BATCH_SIZE, dry_run=False):
+        form = CreateListingForm()
+        self.fields = {name: form.fields[name] for name in ("title", "description", "photo", "starting_bid", "duration")}
+        # What ModelForm's model validation would add, e.g. the photo URL's length
+        self.model_fields = {name: Listings._meta.get_field(name) for name in ("title", "description", "photo")}
+        self.categories = dict(Categories.objects.values_list("category_name", "pk"))
+        self.owner = owner
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.now = timezone.now()
+        self.created = 0
+        self.invalid = 0
+        self.errors = []
+
+    def clean(self, row):
+        """(listing, None) for a valid row, (None, {field: [messages]}) for an invalid one."""
+        if row is None:
+            return None, {"__all__": ["Not a JSON object."]}
+        cleaned, errors = {}, {}
+        for name, field in self.fields.items():
+            try:
+                cleaned[name] = value = field.clean(row.get(name))
+                if name in self.model_fields:
+                    self.model_fields[name].run_validators(value)
+            except ValidationError as e:
+                errors[name] = e.messages
+        category = str(row.get("category") or "").strip()
+        category_id = self.categories.get(category) if category else None
+        if category and category_id is None:
+            errors["category"] = [f"No such category: {category}"]
+        if errors:
+            return None, errors
+        duration = cleaned["duration"]
+        return Listings(
+            title=cleaned["title"],
+            description=cleaned["description"],
+            photo=cleaned["photo"],
+            price=cleaned["starting_bid"],
+            category_id=category_id,
+            owner=self.owner,
+            ends_at=self.now + timedelta(days=duration) if duration else None,
+        ), None
+
+    def run(self, rows):
+        """Import (line number, row) pairs. Returns the summary()."""
+        batch = []
+        try:
+            for line, row in rows:
+                listing, errors = self.clean(row)
+                if errors:
+                    self.invalid += 1
+                    if len(self.errors) < MAX_REPORTED_ERRORS:
+                        self.errors.append({"line": line, "errors": errors})
+                    continue
+                batch.append(listing)
+                if len(batch) >= self.batch_size:
+                    self.insert(batch)
+                    batch = []
+        except UnreadableFile:
+            # The rows before the unreadable line are kept, like the batches already inserted
+            if batch:
+                self.insert(batch)
+            raise
+        if batch:
+            self.insert(batch)
+        return self.summary()
+
+    def insert(self, listings):
+        if not self.dry_run:
+            with transaction.atomic():
+                Listings.objects.bulk_create(listings)
+                directory.listings_added(listings)
+        self.created += len(listings)
+
+    def summary(self):
+        return {"created": self.created, "invalid": self.invalid, "errors": self.errors, "dry_run": self.dry_run}
+
+
+def import_listings(file, format, owner, **options):
+    """
+    Import listings from a binary file of the given format. Returns
+    ListingImport.summary(). Batches are committed as they go, so if a CSV
+    file turns out to be unreadable part way through (UnreadableFile), the
+    rows before that point are kept and the error carries their summary.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}")
+    importer = ListingImport(owner, **options)
+    if format == "ndjson":
+        return importer.run(ndjson_rows(file))
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        return importer.run(csv_rows(stream))
+    except UnreadableFile as e:
+        e.summary = importer.summary()
+        raise
+    finally:
+        # Leave closing the underlying file to its owner
+        stream.detach()
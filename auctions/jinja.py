@@ -0,0 +1,74 @@
+"""
+Optional Jinja2 templates for the hot pages (index, category, listing).
+
+With the jinja2 package installed, settings.py adds a second template engine,
+"jinja2", reading auctions/jinja2/. Those pages are rendered with it when
+AUCTIONS_JINJA2=1 (see views.HOT_TEMPLATES). Jinja2 compiles each template
+to a Python function once per process, so rendering is mostly plain function
+calls. All other pages, and the hot pages by default, use the Django
+templates in auctions/templates/, which the Jinja2 ones mirror tag for tag.
+
+The environment provides what the Django templates get from tags and
+filters: url(), static(), listing_photo(), pluralize, and cache(), which
+stands in for {% cache %} and is used as {% call cache(timeout, name, *vary_on) %}.
+Values are printed the way Django prints them: dates in the current time
+zone, and localized.
+"""
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template.backends.jinja2 import Jinja2
+from django.template.defaultfilters import pluralize
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.formats import localize
+from django.utils.timezone import template_localtime
+from jinja2 import Environment
+from markupsafe import Markup
+
+from .perf import TimedTemplatesMixin
+from .templatetags.thumbnails import photo_context
+
+
+class TimedJinja2(TimedTemplatesMixin, Jinja2):
+    """The Jinja2 backend, timed like the Django one (see auctions.perf)."""
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args or None, kwargs=kwargs or None)
+
+
+def _fragment_cache():
+    # Where {% cache %} keeps its fragments
+    try:
+        return caches["template_fragments"]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def cache(timeout, name, *vary_on, caller):
+    key = make_template_fragment_key(f"jinja2.{name}", vary_on)
+    fragments = _fragment_cache()
+    fragment = fragments.get(key)
+    if fragment is None:
+        fragment = str(caller())
+        fragments.set(key, fragment, timeout)
+    return Markup(fragment)
+
+
+def _display(value):
+    # Strings and plain ints (most of what a page prints) come out of localize() unchanged
+    if isinstance(value, str) or type(value) is int and not settings.USE_THOUSAND_SEPARATOR:
+        return value
+    return localize(template_localtime(value))
+
+
+def environment(**options):
+    env = Environment(finalize=_display, **options)
+
+    def listing_photo(listing, width, css_class="", lazy=True):
+        return Markup(env.get_template("auctions/_photo.html").render(photo_context(listing, width, css_class, lazy)))
+
+    env.globals.update(url=url, static=static, cache=cache, listing_photo=listing_photo)
+    env.filters["pluralize"] = pluralize
+    return env
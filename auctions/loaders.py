@@ -0,0 +1,89 @@
+"""
+Querysets shared by the views.
+
+Each loader fetches everything its template touches up front (related rows
+via select_related, per-category previews via Prefetch), so a page runs the
+same number of queries however many listings, categories or comments exist.
+Templates should only follow relations that the loader they are fed from
+has already loaded.
+"""
+from django.db.models import Prefetch
+
+from .models import ArchivedListings, Bids, Categories, Comments, Listings
+
+PREVIEW_SIZE = 5
+# Keyset pagination keys for the bid history (comments use the default publication_date, id)
+BID_KEYS = ("bid_date", "id")
+# ... and for the feeds (see auctions.ranking); ending soon is paginated ascending
+TRENDING_KEYS = ("hotness", "id")
+MOST_WATCHED_KEYS = ("watch_count", "id")
+ENDING_SOON_KEYS = ("ends_at", "id")
+
+
+def active_listings():
+    return Listings.objects.filter(is_active=True)
+
+
+def category_listings(category):
+    return active_listings().filter(category=category)
+
+
+def trending_listings():
+    """Paginated hottest first by TRENDING_KEYS through listing_trending_idx; cold listings are left out."""
+    return active_listings().filter(hotness__gt=0)
+
+
+def most_watched_listings():
+    """Paginated by MOST_WATCHED_KEYS through listing_most_watched_idx; unwatched listings are left out."""
+    return active_listings().filter(watch_count__gt=0)
+
+
+def ending_soon_listings(now):
+    """Paginated soonest first by ENDING_SOON_KEYS through listing_expiry_idx."""
+    return active_listings().filter(ends_at__gt=now)
+
+
+def watchlist_listings(user):
+    return user.watchlist_items.filter(is_active=True)
+
+
+def owned_listings(user, is_active):
+    return Listings.objects.filter(owner=user, is_active=is_active)
+
+
+def owned_archived_listings(user):
+    """Closed listings that auctions.archive has moved out of Listings."""
+    return ArchivedListings.objects.filter(owner=user).defer("bids").order_by("-closed_at")
+
+
+def listing_detail():
+    """For the listing pages, which show the category and compare the owner."""
+    return Listings.objects.select_related("category")
+
+
+def archived_listing_detail():
+    """listing_detail() for listings auctions.archive has moved out of Listings."""
+    return ArchivedListings.objects.select_related("category")
+
+
+def listing_comments(listing):
+    """Paginated newest first through comment_thread_idx."""
+    return Comments.objects.filter(listing=listing).select_related("user")
+
+
+def listing_bids(listing):
+    """Paginated newest first by BID_KEYS through bid_listing_date_idx."""
+    return Bids.objects.filter(listing=listing).select_related("bidder")
+
+
+def categories_with_previews(preview_size=PREVIEW_SIZE):
+    """
+    Every category, with its statistics, and its newest `preview_size` active
+    listings (active_listings): two queries in total. Pages get these through
+    the cached auctions.directory.category_directory().
+    """
+    newest = active_listings().order_by("-publication_date", "-id")[:preview_size]
+    return (
+        Categories.objects.order_by("category_name")
+        .prefetch_related(Prefetch("listings", queryset=newest, to_attr="active_listings"))
+    )
@@ -0,0 +1,43 @@
+"""
+Move long closed auctions out of the live tables and into the archive.
+
+    python manage.py archive_listings                       # closed over AUCTIONS_ARCHIVE_AFTER_DAYS days ago
+    python manage.py archive_listings --older-than 30 --limit 100000
+    python manage.py archive_listings --vacuum              # then give the freed space back
+
+Each batch is committed as it goes, so it can be stopped at any point and
+run again to carry on where it left off. See auctions.archive.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from auctions.archive import BATCH_SIZE, archive_closed
+
+
+class Command(BaseCommand):
+    help = "Archive closed auctions, with their bids and comments, in resumable batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=float, default=settings.AUCTIONS_ARCHIVE_AFTER_DAYS,
+            help="Days since closing before a listing is archived",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--limit", type=int, help="Stop after about this many listings")
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards")
+
+    def handle(self, *args, **options):
+        def progress(total):
+            self.stdout.write(f"  {total} listings archived...")
+
+        archived = archive_closed(
+            timedelta(days=options["older_than"]), batch_size=options["batch_size"], limit=options["limit"],
+            progress=progress if options["verbosity"] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} listing(s)"))
+        if options["vacuum"]:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
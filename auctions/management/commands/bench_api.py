@@ -0,0 +1,59 @@
+"""
+Compare the JSON API with the HTML pages it replaces for clients.
+
+    python manage.py bench_api --iterations 200
+
+Requests each page/endpoint pair in-process through the test client against
+the configured database (seed it first with seed_auctions), plus the API's
+304 revalidation path, and prints requests/sec and response size for each.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from auctions.models import Listings
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON API serialisation against the HTML views"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, **options):
+        listing_id = Listings.objects.filter(is_active=True).order_by("-bid_count").values_list("id", flat=True).first()
+        if listing_id is None:
+            raise CommandError("No active listings; run seed_auctions first")
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            client = Client()
+            etag = client.get(reverse("api_listing", args=[listing_id]))["ETag"]
+            cases = [
+                ("index (html)", reverse("index"), {}),
+                ("feed (json)", reverse("api_listings"), {}),
+                ("listing (html)", reverse("listing", args=[listing_id]), {}),
+                ("listing (json)", reverse("api_listing", args=[listing_id]), {}),
+                ("listing (json, 304)", reverse("api_listing", args=[listing_id]), {"HTTP_IF_NONE_MATCH": etag}),
+                ("categories (html)", reverse("categories"), {}),
+                ("categories (json)", reverse("api_categories"), {}),
+            ]
+            for name, url, headers in cases:
+                self.run_case(client, name, url, headers, options["iterations"])
+
+    def run_case(self, client, name, url, headers, iterations):
+        client.get(url, **headers)  # Warm up
+        size = 0
+        start = time.perf_counter()
+        for _ in range(iterations):
+            # Measure rendering, not the listing page's fragment cache
+            cache.clear()
+            response = client.get(url, **headers)
+            size = len(response.content)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{name:<22} {iterations / elapsed:>8.0f} req/s  {elapsed / iterations * 1000:>7.2f} ms  "
+            f"{size:>7} bytes  (status {response.status_code})"
+        )
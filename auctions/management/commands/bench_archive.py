@@ -0,0 +1,105 @@
+"""
+Active-path latency before and after archiving closed auctions.
+
+    python manage.py seed_auctions --listings 1000000 --closed 0.9
+    python manage.py bench_archive --repeat 50
+
+Against an already seeded database, times the queries behind the pages
+that only show open auctions (the index feed, a category, search, a
+listing and its bids, a watchlist), archives every closed listing (see
+auctions.archive), VACUUMs, and times them again. Also prints row counts
+and, on SQLite, the size of the database. Destructive: run it against a
+scratch copy.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from auctions import loaders
+from auctions.archive import archive_closed
+from auctions.models import ArchivedListings, Bids, Categories, Comments, Listings, User
+from auctions.pagination import paginate
+from auctions.search import search_listings
+
+
+def database_size():
+    if connection.vendor != "sqlite":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA page_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        return pages * cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = "Time active listing queries before and after archiving closed auctions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--pages", type=int, default=10, help="Pages to walk through the index feed")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        active_ids = list(loaders.active_listings().values_list("id", flat=True)[:10000])
+        if not active_ids:
+            raise CommandError("No active listings: run seed_auctions first")
+        listing_ids = [rng.choice(active_ids) for _ in range(options["repeat"])]
+        categories = list(Categories.objects.all())
+        watcher = User.objects.filter(watchlist_items__is_active=True).first()
+
+        def feed():
+            cursor = None
+            for _ in range(options["pages"]):
+                cursor = paginate(loaders.active_listings(), cursor).next_cursor
+
+        def listing(i):
+            item = loaders.listing_detail().get(pk=listing_ids[i])
+            list(paginate(loaders.listing_bids(item), keys=loaders.BID_KEYS))
+
+        queries = {
+            f"index feed ({options['pages']} pages)": lambda i: feed(),
+            "category page": lambda i: list(paginate(loaders.category_listings(categories[i % len(categories)]))),
+            "search": lambda i: list(search_listings(rng.choice(["lamp", "vintage clock", "oak", "camera"]))),
+            "listing + bids": listing,
+            "watchlist": lambda i: list(loaders.watchlist_listings(watcher)) if watcher else None,
+            "active count": lambda i: loaders.active_listings().count(),
+        }
+
+        def measure():
+            results = {}
+            for name, query in queries.items():
+                query(0)  # Warm up
+                timings = []
+                for i in range(options["repeat"]):
+                    started = time.perf_counter()
+                    query(i)
+                    timings.append(time.perf_counter() - started)
+                results[name] = statistics.median(timings) * 1000
+            return results
+
+        def counts():
+            return (
+                f"{Listings.objects.count()} listings, {Bids.objects.count()} bids, "
+                f"{Comments.objects.count()} comments, {ArchivedListings.objects.count()} archived"
+            )
+
+        size = database_size()
+        self.stdout.write(f"Before: {counts()}" + (f", {size / 2 ** 20:.0f} MB" if size else ""))
+        before = measure()
+        started = time.perf_counter()
+        archived = archive_closed(timedelta(0))
+        elapsed = time.perf_counter() - started
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
+        size = database_size()
+        self.stdout.write(f"Archived {archived} listing(s) in {elapsed:.1f}s ({archived / max(elapsed, 1e-9):.0f}/s)")
+        self.stdout.write(f"After:  {counts()}" + (f", {size / 2 ** 20:.0f} MB" if size else ""))
+        after = measure()
+        for name in queries:
+            self.stdout.write(f"{name:<24} {before[name]:8.2f} ms -> {after[name]:8.2f} ms")
@@ -0,0 +1,167 @@
+"""
+Concurrent bidding stress test.
+
+    python manage.py bench_bids --bidders 32 --bids 200
+    python manage.py bench_bids --bidders 32 --processes 4   # like 4 gunicorn workers
+
+Creates a throwaway listing and bidders, lets every bidder hammer the listing
+from its own thread (and therefore its own database connection), optionally
+spread over several processes, then checks that no accepted bid was lost and
+that the price never went backwards. Reports the database profile in use
+(see auctions/db.py), so runs against SQLite and PostgreSQL can be compared.
+SQLite must be in WAL mode, as in production: DEBUG leaves it off unless
+AUCTIONS_SQLITE_WAL=1. Run it against a scratch database, not one holding
+real auctions.
+"""
+import multiprocessing
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+
+from auctions.bidding import CENT, place_bid
+from auctions.models import Bids, Listings, User
+
+
+def describe_profile():
+    settings = connection.settings_dict
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+        details = ", ".join(f"{name}={value}" for name, value in pragmas.items())
+    else:
+        details = f"server {connection.pg_version}, pool={bool(settings['OPTIONS'].get('pool'))}"
+    return f"{connection.vendor} ({details}, CONN_MAX_AGE={settings['CONN_MAX_AGE']})"
+
+
+def require_wal():
+    """
+    Refuse to measure SQLite outside WAL mode. Each bidder's connection gets
+    the configured journal mode, so it can't just be switched on here.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        mode = cursor.fetchone()[0]
+    if mode.lower() != "wal":
+        raise CommandError(f"SQLite is in {mode} mode, not WAL: run with AUCTIONS_SQLITE_WAL=1")
+
+
+def run_bidders(listing_id, users, per_bidder, seed, first, barrier):
+    """
+    One thread per user, each placing `per_bidder` bids once everyone is ready.
+    Returns (accepted amounts, lock errors, start time, end time).
+    """
+    accepted = [[] for _ in users]
+    errors = [0] * len(users)
+    bidders = barrier.parties
+    times = []
+
+    def run(index):
+        rng = random.Random(seed * 1000 + first + index)
+        barrier.wait()
+        times.append(time.time())
+        try:
+            for attempt in range(per_bidder):
+                # Amounts drift upwards over time but overlap between threads,
+                # so plenty of bids race for the same price band
+                cents = 100 + attempt * bidders + rng.randrange(bidders * 2)
+                try:
+                    result = place_bid(listing_id, users[index], Decimal(cents) * CENT)
+                except OperationalError:
+                    errors[index] += 1
+                    continue
+                if result.accepted:
+                    accepted[index].append(result.amount)
+        finally:
+            close_old_connections()
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(users))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [amount for amounts in accepted for amount in amounts], sum(errors), min(times), time.time()
+
+
+def _process_main(results, *args):
+    results.put(run_bidders(*args))
+
+
+class Command(BaseCommand):
+    help = "Stress test concurrent bid placement and report bids/sec"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bidders", type=int, default=16, help="Concurrent bidder threads, across all processes")
+        parser.add_argument("--bids", type=int, default=100, help="Bids placed by each bidder")
+        parser.add_argument("--processes", type=int, default=1, help="Worker processes to spread the bidders over")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark listing and users afterwards")
+
+    def handle(self, *args, **options):
+        bidders, per_bidder, processes = options["bidders"], options["bids"], options["processes"]
+        require_wal()
+        self.stdout.write(f"Database: {describe_profile()}")
+
+        tag = f"bench-{time.time_ns()}"
+        owner = User.objects.create_user(f"{tag}-owner")
+        users = User.objects.bulk_create(User(username=f"{tag}-{i}") for i in range(bidders))
+        listing = Listings.objects.create(title=tag, price=Decimal("1.00"), owner=owner)
+
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(bidders)
+        slices = [list(range(i, bidders, processes)) for i in range(processes)]
+        if processes == 1:
+            outcomes = [run_bidders(listing.id, users, per_bidder, options["seed"], 0, barrier)]
+        else:
+            # Children must open their own connections rather than share the parent's
+            connections.close_all()
+            results = context.Queue()
+            workers = [
+                context.Process(target=_process_main, args=(
+                    results, listing.id, [users[i] for i in indexes], per_bidder, options["seed"], indexes[0], barrier,
+                ))
+                for indexes in slices
+            ]
+            for worker in workers:
+                worker.start()
+            outcomes = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+
+        all_accepted = [amount for outcome in outcomes for amount in outcome[0]]
+        errors = sum(outcome[1] for outcome in outcomes)
+        elapsed = max(outcome[3] for outcome in outcomes) - min(outcome[2] for outcome in outcomes)
+        recorded = list(Bids.objects.filter(listing=listing).order_by("id").values_list("bid_amount", flat=True))
+        final_price = Listings.objects.values_list("price", flat=True).get(pk=listing.pk)
+
+        problems = []
+        if len(recorded) != len(all_accepted):
+            problems.append(f"{len(all_accepted)} bids accepted but {len(recorded)} recorded")
+        if any(later <= earlier for earlier, later in zip(recorded, recorded[1:])):
+            problems.append("recorded bids are not strictly increasing")
+        if all_accepted and final_price != max(all_accepted):
+            problems.append(f"final price {final_price} != highest accepted bid {max(all_accepted)}")
+
+        attempts = bidders * per_bidder
+        self.stdout.write(
+            f"{bidders} bidders in {processes} process(es), {attempts} attempts in {elapsed:.2f}s: "
+            f"{attempts / elapsed:.0f} bids/sec, {len(all_accepted)} accepted, "
+            f"{errors} lock errors, final price £{final_price}"
+        )
+
+        if not options["keep"]:
+            listing.delete()
+            User.objects.filter(username__startswith=tag).delete()
+
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("No lost or out-of-order bids"))
@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for the auction expiry worker.
+
+    python manage.py bench_expiry --listings 20000 --bid-ratio 0.5
+
+Seeds expired listings (some with a high bidder) with bulk_create, times
+close_due_listings over them and checks that every winner was assigned.
+Run it against a scratch database.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from auctions.closing import BATCH_SIZE, close_due_listings
+from auctions.models import Listings, User
+
+
+class Command(BaseCommand):
+    help = "Seed expired auctions and measure how fast they are closed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=20000)
+        parser.add_argument("--bid-ratio", type=float, default=0.5, help="Fraction of listings that have a high bidder")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        tag = f"bench-{time.time_ns()}"
+        seller = User.objects.create_user(f"{tag}-seller")
+        bidders = User.objects.bulk_create(User(username=f"{tag}-{i}") for i in range(100))
+        ended = timezone.now() - timedelta(minutes=1)
+
+        with transaction.atomic():
+            listings = Listings.objects.bulk_create(
+                (
+                    Listings(
+                        title=tag,
+                        price=Decimal("1.00"),
+                        owner=seller,
+                        ends_at=ended - timedelta(seconds=rng.randrange(86400)),
+                        high_bidder=rng.choice(bidders) if rng.random() < options["bid_ratio"] else None,
+                    )
+                    for _ in range(options["listings"])
+                ),
+                batch_size=1000,
+            )
+        expected = {listing.pk: listing.high_bidder_id or seller.pk for listing in listings}
+
+        start = time.perf_counter()
+        closed = close_due_listings(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - start
+        # A second pass must find nothing left to do
+        closed_again = close_due_listings(batch_size=options["batch_size"])
+
+        owners = dict(Listings.objects.filter(title=tag).values_list("id", "owner_id"))
+        still_open = Listings.objects.filter(title=tag, is_active=True).count()
+        self.stdout.write(f"Closed {closed} auction(s) in {elapsed:.2f}s: {closed / elapsed:.0f} closes/sec")
+
+        Listings.objects.filter(title=tag).delete()
+        User.objects.filter(username__startswith=tag).delete()
+
+        if still_open or closed_again or owners != expected:
+            raise CommandError("Expiry left auctions open, closed them twice or assigned the wrong owner")
+        self.stdout.write(self.style.SUCCESS("All expired auctions closed with the right owners"))
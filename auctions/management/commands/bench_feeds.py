@@ -0,0 +1,96 @@
+"""
+Feed latency benchmark: precomputed ranking columns versus live aggregates.
+
+    python manage.py seed_auctions --listings 1000000 --bids 5 --comments 2 --watchers 3
+    python manage.py bench_feeds --pages 5 --repeat 20
+
+Against an already seeded database, times the first --pages keyset pages of
+each feed (see auctions.ranking) and the equivalent live query: most
+watched as a Count over the watchlist table, trending as Counts of recent
+bids and comments. Prints the median ms per page and each feed's query
+plan, then times one decay pass in a transaction that is rolled back.
+Run it against a scratch database.
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from auctions import loaders, ranking
+from auctions.models import Listings
+from auctions.pagination import PAGE_SIZE, paginate
+
+
+def live_trending(now):
+    """Recent bids and comments counted per listing on every request, as the feed would be without hotness."""
+    since = now - timedelta(seconds=settings.AUCTIONS_HOTNESS_HALF_LIFE)
+    return (
+        loaders.active_listings()
+        .annotate(
+            recent_bids=Count("bids", filter=Q(bids__bid_date__gte=since), distinct=True),
+            recent_comments=Count("comments", filter=Q(comments__publication_date__gte=since), distinct=True),
+        )
+        .annotate(score=F("recent_bids") * ranking.BID_WEIGHT + F("recent_comments") * ranking.COMMENT_WEIGHT)
+        .filter(score__gt=0)
+        .order_by("-score", "-id")
+    )
+
+
+def live_most_watched():
+    return (
+        loaders.active_listings().annotate(watchers=Count("watchlist")).filter(watchers__gt=0).order_by("-watchers", "-id")
+    )
+
+
+class Command(BaseCommand):
+    help = "Time the trending, most watched and ending soon feeds against live aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=5, help="Pages to walk through each feed")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--live-repeat", type=int, default=3, help="Repeats of the (slow) live aggregates")
+
+    def handle(self, *args, **options):
+        if not Listings.objects.filter(is_active=True).exists():
+            raise CommandError("No active listings: run seed_auctions first")
+        now = timezone.now()
+        feeds = {
+            "trending": (loaders.trending_listings(), loaders.TRENDING_KEYS, True),
+            "most_watched": (loaders.most_watched_listings(), loaders.MOST_WATCHED_KEYS, True),
+            "ending_soon": (loaders.ending_soon_listings(now), loaders.ENDING_SOON_KEYS, False),
+        }
+        for name, (queryset, keys, descending) in feeds.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                cursor = None
+                for _ in range(options["pages"]):
+                    started = time.perf_counter()
+                    page = paginate(queryset, cursor, keys=keys, descending=descending)
+                    timings.append(time.perf_counter() - started)
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        break
+            self.stdout.write(f"{name:<13} {statistics.median(timings) * 1000:8.2f} ms/page  (precomputed)")
+            ordering = [f"-{key}" if descending else key for key in keys]
+            for line in queryset.order_by(*ordering)[:PAGE_SIZE].explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+        for name, queryset in (("trending", live_trending(now)), ("most_watched", live_most_watched())):
+            timings = []
+            for _ in range(options["live_repeat"]):
+                started = time.perf_counter()
+                list(queryset[:PAGE_SIZE + 1])
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f"{name:<13} {statistics.median(timings) * 1000:8.2f} ms/page  (live aggregate, first page)")
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            decayed = ranking.decay(now + timedelta(minutes=5))
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        self.stdout.write(f"One decay pass: {decayed} listing(s) in {elapsed:.2f}s (rolled back)")
@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for the notification worker.
+
+    python manage.py bench_notifications --events 50000 --listings 1000
+
+Seeds bids and their outbox events with bulk_create, then times
+deliver_pending over them with the in-memory email backend (so disk or SMTP
+speed doesn't count) and checks that every event was marked delivered.
+Run it against a scratch database.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auctions.models import Bids, Listings, OutboxEvents, User
+from auctions.notifications import BATCH_SIZE, deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Seed outbid events and measure how fast they are delivered"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=50000)
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        tag = f"bench-{time.time_ns()}"
+        seller = User.objects.create_user(f"{tag}-seller")
+        bidders = User.objects.bulk_create(
+            User(username=f"{tag}-{i}", email=f"{tag}-{i}@example.com") for i in range(options["users"])
+        )
+        with transaction.atomic():
+            listings = Listings.objects.bulk_create(
+                (Listings(title=tag, price=Decimal("1.00"), owner=seller) for _ in range(options["listings"])),
+                batch_size=1000,
+            )
+            bids, events = [], []
+            for i in range(options["events"]):
+                listing = listings[i % len(listings)]
+                listing.price += Decimal("1.00")
+                listing.high_bidder = rng.choice(bidders)
+                bids.append(Bids(listing=listing, bidder=listing.high_bidder, bid_amount=listing.price))
+                events.append(OutboxEvents(kind=OutboxEvents.BID, listing=listing, user=listing.high_bidder, amount=listing.price))
+            Listings.objects.bulk_update(listings, ["price", "high_bidder"], batch_size=1000)
+            Bids.objects.bulk_create(bids, batch_size=1000)
+            OutboxEvents.objects.bulk_create(events, batch_size=1000)
+
+        email = get_connection("django.core.mail.backends.locmem.EmailBackend")
+        start = time.perf_counter()
+        processed, sent = deliver_pending(batch_size=options["batch_size"], connection=email)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Delivered {processed} event(s) as {sent} email(s) in {elapsed:.2f}s: {processed / elapsed:.0f} events/sec"
+        )
+
+        undelivered = OutboxEvents.objects.filter(listing__title=tag, delivered_at__isnull=True).count()
+        Listings.objects.filter(title=tag).delete()
+        User.objects.filter(username__startswith=tag).delete()
+
+        if undelivered:
+            raise CommandError(f"{undelivered} event(s) were left undelivered")
+        self.stdout.write(self.style.SUCCESS("Every event was delivered"))
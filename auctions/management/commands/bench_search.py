@@ -0,0 +1,93 @@
+"""
+Search latency benchmark: FTS5 ranking versus the naive icontains filter.
+
+    python manage.py bench_search --listings 1000000 --queries 200
+
+Tops the database up to --listings rows of generated listings (so the corpus
+is reused between runs), then times the same random queries through
+search_listings and naive_search and prints the median and p95 in ms.
+Run it against a scratch database.
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.management.commands.seed_auctions import ADJECTIVES, NOUNS
+from auctions.models import Listings, User
+from auctions.search import naive_search, search_listings
+
+# seed_auctions' words, plus some more nouns so each one matches a smaller share of the corpus
+NOUNS = NOUNS + [
+    "compass", "globe", "bookcase", "stool", "painting", "sculpture", "console", "amplifier", "piano", "bench",
+]
+FILLER = ["good", "condition", "collection", "only", "barely", "used", "with", "original", "case", "spares", "repair"]
+SYLLABLES = ["ka", "lo", "mi", "ter", "van", "os", "ri", "zu", "bel", "qua", "dor", "fen", "gri", "hal", "jo", "nex"]
+
+
+def brand_names(rng, count=2000):
+    """Made-up maker names, so that the corpus has a long tail of selective terms like real listings do."""
+    names = set()
+    while len(names) < count:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randrange(2, 4))))
+    return sorted(names)
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 search latency against an icontains baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100000, help="Corpus size to seed up to")
+        parser.add_argument("--queries", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--skip-naive", action="store_true", help="Only time the FTS search")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        brands = brand_names(random.Random(options["seed"]))
+        self.seed_corpus(rng, brands, options["listings"])
+        # Mostly "maker + thing" searches, with some single keyword ones
+        queries = [
+            f"{rng.choice(brands)} {rng.choice(NOUNS)}" if rng.random() < 0.8 else rng.choice(brands)
+            for _ in range(options["queries"])
+        ]
+        self.report("fts5", [self.time(lambda q=q: list(search_listings(q))) for q in queries])
+        if not options["skip_naive"]:
+            self.report("icontains", [self.time(lambda q=q: list(naive_search(q).order_by("-publication_date", "-id")[:20])) for q in queries])
+
+    def seed_corpus(self, rng, brands, target):
+        missing = target - Listings.objects.count()
+        if missing <= 0:
+            return
+        seller, _ = User.objects.get_or_create(username="bench-seller")
+        vocabulary = ADJECTIVES + NOUNS + FILLER + brands
+        self.stdout.write(f"Seeding {missing} listings...")
+        batch = []
+        for i in range(missing):
+            batch.append(
+                Listings(
+                    title=f"{rng.choice(ADJECTIVES)} {rng.choice(brands)} {rng.choice(NOUNS)}",
+                    description=" ".join(rng.choice(vocabulary) for _ in range(rng.randrange(5, 30))),
+                    price=Decimal(rng.randrange(100, 100000)) / 100,
+                    owner=seller,
+                    is_active=rng.random() < 0.8,
+                )
+            )
+            if len(batch) == 10000 or i == missing - 1:
+                with transaction.atomic():
+                    Listings.objects.bulk_create(batch)
+                batch = []
+
+    @staticmethod
+    def time(func):
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+
+    def report(self, name, timings):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        self.stdout.write(f"{name:>10}: median {statistics.median(timings):.2f}ms, p95 {p95:.2f}ms over {len(timings)} queries")
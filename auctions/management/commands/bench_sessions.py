@@ -0,0 +1,68 @@
+"""
+Compare what an authenticated page view costs under each session/auth profile.
+
+    python manage.py bench_sessions --iterations 300
+
+Profiles:
+- db: database sessions and Django's AuthenticationMiddleware/ModelBackend
+  (a session read and a user read on every request)
+- cached_db: cached_db sessions and the cached user (auctions.accounts)
+- signed_cookies: the session in a signed cookie and the cached user
+
+Requests each page in-process through the test client as a signed-in user
+(created if need be) against the configured database, and prints queries and
+requests/sec per page view.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auctions.accounts import users
+from auctions.models import User
+
+PLAIN_MIDDLEWARE = [
+    "django.contrib.auth.middleware.AuthenticationMiddleware" if name == "auctions.accounts.CachedAuthenticationMiddleware" else name
+    for name in settings.MIDDLEWARE
+]
+PROFILES = {
+    "db": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "MIDDLEWARE": PLAIN_MIDDLEWARE,
+        "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+    },
+    "cached_db": {"SESSION_ENGINE": "django.contrib.sessions.backends.cached_db"},
+    "signed_cookies": {"SESSION_ENGINE": "django.contrib.sessions.backends.signed_cookies"},
+}
+
+
+class Command(BaseCommand):
+    help = "Measure queries and requests/sec of signed-in page views per session profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=300)
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username="bench-sessions")
+        pages = [("watchlist", reverse("watchlist")), ("my_profile", reverse("user_profile")), ("index", reverse("index"))]
+        for profile, overrides in PROFILES.items():
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], **overrides):
+                users.clear()
+                client = Client()
+                client.force_login(user)
+                results = []
+                for name, url in pages:
+                    client.get(url)  # Warm up
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        for _ in range(options["iterations"]):
+                            client.get(url)
+                        elapsed = time.perf_counter() - started
+                    results.append(
+                        f"{name} {len(queries) / options['iterations']:.1f} queries {options['iterations'] / elapsed:,.0f}/s"
+                    )
+                self.stdout.write(f"{profile:<15} " + "   ".join(results))
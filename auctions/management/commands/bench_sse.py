@@ -0,0 +1,134 @@
+"""
+Hold many concurrent live-price (server-sent events) connections in one process.
+
+    python manage.py bench_sse --connections 5000 --bids 20
+
+Drives the ASGI application directly (no network server needed): opens
+--connections event streams on one listing, places --bids bids and measures
+how long each takes to reach every watcher, counts the database queries made
+while the watchers sit idle, and reports memory per connection.
+Run it against a scratch database.
+"""
+import asyncio
+import resource
+import statistics
+import time
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from auctions.bidding import place_bid
+from auctions.models import Listings, User
+from auctions.pubsub import get_broker, listing_channel
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Watcher:
+    """One fake SSE client: records when each price event arrives."""
+
+    def __init__(self, loop):
+        self.events = 0
+        self.connected = loop.create_future()
+        self.arrived = asyncio.Event()
+
+    async def receive(self):
+        if not hasattr(self, "requested"):
+            self.requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()  # The client never hangs up on its own
+
+    async def send(self, message):
+        if message["type"] == "http.response.body" and b"event: price" in message.get("body", b""):
+            self.events += 1
+            if not self.connected.done():
+                self.connected.set_result(None)
+            else:
+                self.arrived.set()
+
+
+class Command(BaseCommand):
+    help = "Load test live price streaming with many idle watchers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=2000)
+        parser.add_argument("--bids", type=int, default=10)
+        parser.add_argument("--idle", type=float, default=2.0, help="Seconds to sit idle while counting queries")
+
+    def handle(self, *args, **options):
+        if not settings.AUCTIONS_ASYNC_VIEWS:
+            raise CommandError("Live prices are only served with AUCTIONS_ASYNC_VIEWS=1")
+        tag = f"bench-{time.time_ns()}"
+        seller = User.objects.create_user(f"{tag}-seller")
+        bidder = User.objects.create_user(f"{tag}-bidder")
+        listing = Listings.objects.create(title=tag, price=Decimal("1.00"), owner=seller)
+        counter = QueryCounter()
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]), connection.execute_wrapper(counter):
+                async_to_sync(self.run)(listing, bidder, counter, options)
+        finally:
+            listing.delete()
+            User.objects.filter(username__startswith=tag).delete()
+
+    async def run(self, listing, bidder, counter, options):
+        app = ASGIHandler()
+        loop = asyncio.get_running_loop()
+        path = reverse("listing_events", args=[listing.id])
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "query_string": b"", "headers": [],
+            "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+        }
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        watchers = [Watcher(loop) for _ in range(options["connections"])]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(app(dict(scope), watcher.receive, watcher.send)) for watcher in watchers]
+        await asyncio.gather(*(watcher.connected for watcher in watchers))
+        connect_time = time.perf_counter() - started
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        queries_before = counter.count
+        await asyncio.sleep(options["idle"])
+        idle_queries = counter.count - queries_before
+
+        fan_out = []
+        price = listing.price
+        for _ in range(options["bids"]):
+            for watcher in watchers:
+                watcher.arrived.clear()
+            price += Decimal("1.00")
+            start = time.perf_counter()
+            result = await sync_to_async(place_bid)(listing.id, bidder, price)
+            if not result.accepted:
+                raise CommandError("Benchmark bid was rejected")
+            await asyncio.gather(*(watcher.arrived.wait() for watcher in watchers))
+            fan_out.append((time.perf_counter() - start) * 1000)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        leftover = get_broker().subscriber_count(listing_channel(listing.id))
+
+        missing = sum(1 for watcher in watchers if watcher.events != options["bids"] + 1)
+        self.stdout.write(
+            f"{len(watchers)} connections opened in {connect_time:.2f}s, "
+            f"~{max(rss_after - rss_before, 0) / len(watchers):.1f} KB peak RSS each\n"
+            f"{idle_queries} database queries in {options['idle']:.0f}s idle\n"
+            f"bid fan-out to all watchers: median {statistics.median(fan_out):.1f}ms, max {max(fan_out):.1f}ms"
+        )
+        if missing or leftover or idle_queries:
+            raise CommandError(f"{missing} watcher(s) missed updates, {leftover} subscription(s) leaked, {idle_queries} idle queries")
+        self.stdout.write(self.style.SUCCESS("Every watcher saw every bid"))
@@ -0,0 +1,115 @@
+"""
+Compare what first and repeat visits to a page cost with and without the static pipeline.
+
+    python manage.py bench_static --visits 50
+
+Drives two WSGI applications in-process, each with a browser-like client
+that caches by Cache-Control and revalidates with ETag/Last-Modified:
+
+- before: plain StaticFilesStorage, files served the way runserver serves
+  them (Last-Modified, no Cache-Control)
+- after: collectstatic into a temporary STATIC_ROOT with
+  CompressedManifestStaticFilesStorage, served by CompressedStaticFiles
+
+For each it reports requests made, bytes transferred (headers and bodies)
+and the page's time to first byte. Third-party assets (the Bootstrap CDN) are
+not counted.
+"""
+import re
+import statistics
+import tempfile
+import time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.staticfiles.handlers import StaticFilesHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from auctions.staticfiles import CompressedStaticFiles
+
+PLAIN = {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}
+PIPELINE = {"BACKEND": "auctions.staticfiles.CompressedManifestStaticFilesStorage"}
+
+
+class Browser:
+    """Fetches pages and the static assets they reference, keeping an HTTP cache."""
+
+    def __init__(self, application):
+        self.application = application
+        self.cache = {}  # url -> (fresh until, validator headers)
+
+    def request(self, url, headers=()):
+        environ = {"PATH_INFO": url, "REQUEST_METHOD": "GET", "HTTP_ACCEPT_ENCODING": "br, gzip", "wsgi.input": BytesIO()}
+        environ.update(headers)
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = dict(response_headers)
+
+        started = time.perf_counter()
+        chunks = iter(self.application(environ, start_response))
+        first = next(chunks, b"")
+        ttfb = time.perf_counter() - started
+        body = first + b"".join(chunks)
+        sent = len(response["status"]) + sum(len(k) + len(v) + 4 for k, v in response["headers"].items()) + len(body)
+        return response["status"], response["headers"], body, sent, ttfb
+
+    def fetch_asset(self, url):
+        """Returns (requests made, bytes transferred)."""
+        fresh_until, validators = self.cache.get(url, (0, {}))
+        if time.time() < fresh_until:
+            return 0, 0
+        status, headers, _, sent, _ = self.request(url, validators)
+        match = re.search(r"max-age=(\d+)", headers.get("Cache-Control", ""))
+        # A 304 may leave out the validators, which then stay as they were
+        validators = dict(validators)
+        if "ETag" in headers:
+            validators["HTTP_IF_NONE_MATCH"] = headers["ETag"]
+        if "Last-Modified" in headers:
+            validators["HTTP_IF_MODIFIED_SINCE"] = headers["Last-Modified"]
+        if status.startswith(("200", "304")):
+            # Without a max-age it is revalidated on every visit
+            self.cache[url] = (time.time() + int(match.group(1)) if match else 0, validators)
+        return 1, sent
+
+    def visit(self, page):
+        """Returns (requests made, bytes transferred, page TTFB)."""
+        _, _, body, sent, ttfb = self.request(page)
+        requests = 1
+        for url in re.findall(rf'(?:href|src)="({re.escape(settings.STATIC_URL)}[^"]+)"', body.decode()):
+            made, transferred = self.fetch_asset(url)
+            requests += made
+            sent += transferred
+        return requests, sent, ttfb
+
+
+class Command(BaseCommand):
+    help = "Measure first and repeat visit bytes and TTFB with and without the static asset pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--visits", type=int, default=50, help="Repeat visits to time")
+        parser.add_argument("--page", default="/")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as root, override_settings(DEBUG=False, ALLOWED_HOSTS=["*"], STATIC_ROOT=root):
+            with override_settings(STORAGES={**settings.STORAGES, "staticfiles": PLAIN}):
+                self.report("before", StaticFilesHandler(WSGIHandler()), options)
+            with override_settings(STORAGES={**settings.STORAGES, "staticfiles": PIPELINE}):
+                call_command("collectstatic", interactive=False, verbosity=0)
+                self.report("after", CompressedStaticFiles(WSGIHandler()), options)
+
+    def report(self, label, application, options):
+        browser = Browser(application)
+        first_requests, first_bytes, _ = browser.visit(options["page"])
+        visits = [browser.visit(options["page"]) for _ in range(options["visits"])]
+        self.stdout.write(
+            f"{label:>6}: first visit {first_requests} requests, {first_bytes} bytes; "
+            f"repeat visit {visits[-1][0]} requests, {visits[-1][1]} bytes; "
+            f"page TTFB median {statistics.median(ttfb for _, _, ttfb in visits) * 1000:.2f}ms"
+        )
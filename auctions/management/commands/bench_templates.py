@@ -0,0 +1,105 @@
+"""
+Render the hot pages with a fixed context and report renders/sec per template backend.
+
+    python manage.py bench_templates --seconds 2
+
+Backends compared:
+- django-uncached: Django templates re-read and re-parsed on every render
+- django: Django templates through the cached loader (the TEMPLATES setting)
+- jinja2: the Jinja2 versions in auctions/jinja2 (if jinja2 is installed)
+
+Contexts are built from unsaved model instances, so nothing touches the
+database, and fragment caching is switched off so every render does the whole
+page. Numbers are for the template engine alone.
+"""
+import importlib.util
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management.base import BaseCommand
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from auctions.cache import FRAGMENT_TIMEOUT
+from auctions.models import Bids, Categories, Comments, Listings, User
+from auctions.pagination import KeysetPage, PAGE_SIZE
+from auctions.views import HOT_TEMPLATE_NAMES
+from auctions.watchlists import WatchedIds
+
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def fixed_contexts():
+    """Template name -> context, shaped like the views' contexts."""
+    now = timezone.now()
+    seller, bidder = User(id=1, username="seller"), User(id=2, username="bidder")
+    category = Categories(id=1, category_name="Lamps")
+    listings = [
+        Listings(
+            id=i, title=f"Listing {i}", description="A perfectly ordinary lamp, barely used " * 3,
+            price=Decimal("12.50") + i, owner=seller, category=category, bid_count=i % 7,
+            publication_date=now - timedelta(minutes=i),
+            **({"thumbnail": f"{i:064x}"} if i % 2 else {"photo": f"https://example.com/{i}.jpg"}),
+        )
+        for i in range(1, PAGE_SIZE + 1)
+    ]
+    listing = listings[0]
+    listing.ends_at = now + timedelta(days=3)
+    bids = [Bids(id=i, bid_amount=Decimal("10") + i, bidder=bidder, listing=listing, bid_date=now - timedelta(hours=i)) for i in range(50)]
+    comments = [Comments(id=i, content=f"Comment {i}", user=bidder, listing=listing, publication_date=now) for i in range(50)]
+    watched = WatchedIds(range(1, PAGE_SIZE + 1, 3))
+    page = KeysetPage(listings, "next-page")
+    return {
+        "auctions/index.html": {"listings": listings, "page": page, "watched": watched},
+        "auctions/category.html": {"category": category, "listings": listings, "page": page, "watched": watched},
+        "auctions/listing.html": {
+            "listing": listing, "is_owner": False, "is_watchlist": True, "fragment_timeout": FRAGMENT_TIMEOUT,
+            "bids": KeysetPage(bids, "next-bids"), "comments": KeysetPage(comments, "next-comments"),
+        },
+    }
+
+
+def backends():
+    django_options = settings.TEMPLATES[0]["OPTIONS"]
+    uncached = {**django_options, "loaders": ["django.template.loaders.app_directories.Loader"], "debug": False}
+    cached = {**django_options, "debug": False}
+    engines = {
+        "django-uncached": DjangoTemplates({"NAME": "uncached", "DIRS": [], "APP_DIRS": False, "OPTIONS": uncached}),
+        "django": DjangoTemplates({"NAME": "cached", "DIRS": [], "APP_DIRS": False, "OPTIONS": cached}),
+    }
+    if importlib.util.find_spec("jinja2"):
+        from django.template.backends.jinja2 import Jinja2
+
+        jinja_options = next(engine["OPTIONS"] for engine in settings.TEMPLATES if engine.get("NAME") == "jinja2")
+        engines["jinja2"] = Jinja2({"NAME": "jinja", "DIRS": [], "APP_DIRS": True, "OPTIONS": {**jinja_options, "auto_reload": False}})
+    return engines
+
+
+class Command(BaseCommand):
+    help = "Report renders/sec of the hot pages for each template backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=2.0, help="How long to render each page per backend")
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        contexts = fixed_contexts()
+        with override_settings(DEBUG=False, CACHES=DUMMY_CACHE):
+            for name in HOT_TEMPLATE_NAMES:
+                results = []
+                for label, engine in backends().items():
+                    template = engine.get_template(name)
+                    rendered, started = 0, time.perf_counter()
+                    while time.perf_counter() - started < options["seconds"]:
+                        template.render(dict(contexts[name]), request)
+                        rendered += 1
+                    results.append(f"{label} {rendered / (time.perf_counter() - started):,.0f}/s")
+                self.stdout.write(f"{name:<24} " + "   ".join(results))
@@ -0,0 +1,53 @@
+"""
+Worker that makes thumbnails of listing photos.
+
+    python manage.py build_thumbnails                  # run forever, polling every 5s
+    python manage.py build_thumbnails --once           # thumbnail everything pending and exit
+    python manage.py build_thumbnails --workers 0      # render in this process
+
+Photos are fetched by a pool of threads and rendered by a pool of processes;
+see auctions.thumbnails.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions.thumbnails import BATCH_SIZE, build_pending
+
+
+class Command(BaseCommand):
+    help = "Fetch listing photos and render their thumbnails"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep between passes")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Rendering processes (0: none)")
+
+    def handle(self, *args, **options):
+        executor = None
+        if options["workers"]:
+            # Forked, so the workers start without setting Django up again
+            executor = ProcessPoolExecutor(options["workers"], mp_context=multiprocessing.get_context("fork"))
+        try:
+            while True:
+                close_old_connections()
+                started = time.perf_counter()
+                listings, fetched, failed = build_pending(options["batch_size"], executor)
+                if listings or fetched:
+                    self.stdout.write(
+                        f"Thumbnailed {listings} listing(s) from {fetched} photo(s) fetched, "
+                        f"{failed} failed, in {time.perf_counter() - started:.2f}s"
+                    )
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor:
+                executor.shutdown()
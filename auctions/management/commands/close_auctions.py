@@ -0,0 +1,36 @@
+"""
+Worker that closes auctions once their end time has passed.
+
+    python manage.py close_auctions              # run forever, polling every 5s
+    python manage.py close_auctions --once       # close whatever is due and exit
+
+Safe to run more than one copy: see auctions.closing.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions.closing import BATCH_SIZE, close_due_listings
+
+
+class Command(BaseCommand):
+    help = "Close expired auctions in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep between passes")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                closed = close_due_listings(batch_size=options["batch_size"])
+                if closed:
+                    self.stdout.write(f"Closed {closed} auction(s)")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,41 @@
+"""
+Worker that decays listing hotness scores, for the trending feed.
+
+    python manage.py decay_hotness              # run forever, a pass every 5 minutes
+    python manage.py decay_hotness --once       # one pass and exit, e.g. from cron
+    python manage.py decay_hotness --rebuild    # recompute scores and watcher counts first
+
+Each pass decays by the time since the last one, however long that was, so
+the interval only sets how fine grained the decay is. Safe to run more
+than one copy: see auctions.ranking.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions.ranking import decay, rebuild
+
+
+class Command(BaseCommand):
+    help = "Decay the hotness scores behind the trending feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+        parser.add_argument("--interval", type=float, default=300.0, help="Seconds to sleep between passes")
+        parser.add_argument("--rebuild", action="store_true", help="Recompute every score and watcher count first")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            self.stdout.write(f"Rebuilt: {rebuild()} warm listing(s)")
+        try:
+            while True:
+                close_old_connections()
+                updated = decay()
+                if updated:
+                    self.stdout.write(f"Decayed {updated} listing(s)")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
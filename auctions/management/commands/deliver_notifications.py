@@ -0,0 +1,38 @@
+"""
+Worker that emails outbid and auction-won notifications from the outbox.
+
+    python manage.py deliver_notifications              # run forever, polling every 2s
+    python manage.py deliver_notifications --once       # drain the outbox and exit
+
+Run a single copy: see auctions.notifications.
+"""
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions.notifications import BATCH_SIZE, deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver pending notifications in batches, one email per user per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep between passes")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        try:
+            while True:
+                close_old_connections()
+                events, emails = deliver_pending(options["batch_size"], connection)
+                if events:
+                    self.stdout.write(f"Processed {events} event(s), sent {emails} email(s)")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
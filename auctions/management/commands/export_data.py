@@ -0,0 +1,42 @@
+"""
+Write an export of closed sales, bids or a user's activity (see auctions.exports).
+
+    python manage.py export_data sales --since 2024-01-01 --until 2024-03-31 > q1.csv
+    python manage.py export_data bids --format ndjson --gzip --category Lamps -o bids.ndjson.gz
+    python manage.py export_data activity --user alice
+
+Streams like the web export, so memory use doesn't grow with the export.
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.exports import CONTENT_TYPES, DATASETS, export, parse_filters
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON export of sales, bids or user activity"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=sorted(CONTENT_TYPES), default="csv")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output")
+        parser.add_argument("--since", default="", help="ISO date or datetime (inclusive)")
+        parser.add_argument("--until", default="", help="ISO date or datetime (a bare date includes the whole day)")
+        parser.add_argument("--category", default="", help="Category name")
+        parser.add_argument("--user", default="", help="Username")
+        parser.add_argument("-o", "--output", help="File to write instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options["since"], options["until"], options["category"], options["user"])
+            blocks = export(options["dataset"], options["format"], options["gzip"], **filters)
+            output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+            try:
+                for block in blocks:
+                    output.write(block)
+            finally:
+                if options["output"]:
+                    output.close()
+        except ValueError as e:
+            raise CommandError(e)
@@ -0,0 +1,53 @@
+"""
+Import listings for a seller from a CSV or NDJSON file (see auctions.imports).
+
+    python manage.py import_listings items.csv --user alice
+    python manage.py import_listings - --format ndjson --user alice --dry-run < items.ndjson
+
+Prints how many listings were created and the lines that were skipped. If
+the file can't be read to the end, the listings before the unreadable line
+are kept and reported before the error.
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.imports import BATCH_SIZE, FORMATS, UnreadableFile, guess_format, import_listings
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Bulk-create listings for a user from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument("--user", required=True, help="Username of the seller")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file's extension")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Check every row without creating anything")
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options["user"]).first()
+        if owner is None:
+            raise CommandError(f"No such user: {options['user']!r}")
+        failure = None
+        try:
+            format = options["format"] or guess_format(options["path"])
+            file = sys.stdin.buffer if options["path"] == "-" else open(options["path"], "rb")
+            try:
+                summary = import_listings(file, format, owner, batch_size=options["batch_size"], dry_run=options["dry_run"])
+            finally:
+                if file is not sys.stdin.buffer:
+                    file.close()
+        except UnreadableFile as e:
+            # Report what was imported before the file became unreadable first
+            summary, failure = e.summary, e
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        for row in summary["errors"]:
+            problems = "; ".join(f"{field}: {' '.join(messages)}" for field, messages in row["errors"].items())
+            self.stderr.write(f"line {row['line']}: {problems}")
+        verb = "Would create" if summary["dry_run"] else "Created"
+        self.stdout.write(f"{verb} {summary['created']} listing(s); skipped {summary['invalid']} invalid row(s)")
+        if failure:
+            raise CommandError(failure)
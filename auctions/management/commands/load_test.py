@@ -0,0 +1,156 @@
+"""
+In-process load driver.
+
+    python manage.py load_test --requests 5000 --mix browse=40,view=35,bid=10,comment=5,watch=10 --output run.json
+
+Replays a weighted mix of user actions through the Django test client against
+the configured database (typically one filled by seed_auctions), with a pool
+of logged-in virtual users. Popular listings are picked more often, in
+proportion to their bid counts. Prints, or writes, a JSON report with
+per-URL p50/p95/p99 latency and query counts, so runs on different commits
+can be diffed.
+"""
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.conf import settings
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from auctions.models import Categories, Listings, User
+from auctions.perf import percentile
+
+DEFAULT_MIX = "browse=40,view=35,bid=10,comment=5,watch=10"
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in Command.actions:
+            raise CommandError(f"Unknown action {name!r}; choose from {', '.join(Command.actions)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = "Replay a realistic traffic mix in-process and report per-URL latency and query counts"
+
+    actions = ("browse", "view", "bid", "comment", "watch")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=50, help="Virtual logged-in users")
+        parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+        parser.add_argument("--sample", type=int, default=10000, help="Active listings to draw traffic from")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+
+    def handle(self, *args, **options):
+        # The test client talks to the app as "testserver"
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            self.run(options)
+
+    def run(self, options):
+        self.rng = random.Random(options["seed"])
+        listings = list(
+            Listings.objects.filter(is_active=True).order_by("-bid_count", "id").values_list("id", "price", "bid_count")[: options["sample"]]
+        )
+        users = list(User.objects.filter(is_active=True).order_by("id")[: options["users"]])
+        if not listings or not users:
+            raise CommandError("Nothing to load test; run seed_auctions first")
+        self.listing_ids = [listing_id for listing_id, _, _ in listings]
+        self.weights = [bids + 1 for _, _, bids in listings]
+        self.prices = {listing_id: price for listing_id, price, _ in listings}
+        self.category_names = list(Categories.objects.values_list("category_name", flat=True))
+        self.clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+
+        timings = defaultdict(list)
+        queries = defaultdict(list)
+        names, weights = zip(*options["mix"].items())
+        started = time.perf_counter()
+        for _ in range(options["requests"]):
+            action = self.rng.choices(names, weights)[0]
+            client = self.rng.choice(self.clients)
+            method, path, data = getattr(self, f"do_{action}")()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                getattr(client, method)(path, data)
+                elapsed = (time.perf_counter() - start) * 1000
+            name = resolve(path.split("?")[0]).url_name
+            timings[name].append(elapsed)
+            queries[name].append(len(captured))
+        total = time.perf_counter() - started
+
+        report = {
+            "revision": self.revision(),
+            "requests": options["requests"],
+            "seconds": round(total, 3),
+            "requests_per_second": round(options["requests"] / total, 1),
+            "mix": options["mix"],
+            "urls": {
+                name: {
+                    "count": len(values),
+                    "p50_ms": round(percentile(sorted(values), 0.50), 3),
+                    "p95_ms": round(percentile(sorted(values), 0.95), 3),
+                    "p99_ms": round(percentile(sorted(values), 0.99), 3),
+                    "mean_queries": round(statistics.mean(queries[name]), 2),
+                    "max_queries": max(queries[name]),
+                }
+                for name, values in sorted(timings.items())
+            },
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def pick_listing(self):
+        return self.rng.choices(self.listing_ids, self.weights)[0]
+
+    def do_browse(self):
+        if self.category_names and self.rng.random() < 0.4:
+            return "get", reverse("category", args=[self.rng.choice(self.category_names)]), None
+        if self.rng.random() < 0.1:
+            return "get", reverse("categories"), None
+        return "get", reverse("index"), None
+
+    def do_view(self):
+        return "get", reverse("listing", args=[self.pick_listing()]), None
+
+    def do_bid(self):
+        listing_id = self.pick_listing()
+        # Our view of the price goes stale as other bids land, so some bids are outbid, as in real life
+        amount = self.prices[listing_id] + Decimal(self.rng.randrange(1, 500)) / 100
+        self.prices[listing_id] = amount
+        return "post", reverse("bid", args=[listing_id]), {"up_bid": str(amount)}
+
+    def do_comment(self):
+        return "post", reverse("add_comment", args=[self.pick_listing()]), {"content": "Load test comment"}
+
+    def do_watch(self):
+        name = "add_to_watchlist" if self.rng.random() < 0.7 else "remove_from_watchlist"
+        return "post", reverse(name, args=[self.pick_listing()]), None
+
+    @staticmethod
+    def revision():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,46 @@
+"""
+Print the slowest views and worst N+1 offenders recorded by PerfMiddleware.
+
+    python manage.py perf_report --top 10
+    python manage.py perf_report --dir /var/run/auctions-perf --json
+
+Server processes keep their records in memory, so to report on them set
+AUCTIONS_PERF_SNAPSHOT_DIR and point --dir at it (that is the default).
+Without a snapshot directory only the current process's records are used,
+which is what you want after e.g. load_test in the same process.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from auctions.perf import buffer, read_snapshots, summarize
+
+
+class Command(BaseCommand):
+    help = "Summarise recorded request timings: slowest views and repeated queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--dir", default=getattr(settings, "AUCTIONS_PERF_SNAPSHOT_DIR", None))
+        parser.add_argument("--json", action="store_true", help="Print the raw summary as JSON")
+
+    def handle(self, *args, **options):
+        records = read_snapshots(options["dir"]) if options["dir"] else list(buffer)
+        summary = summarize(records, top=options["top"])
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(f"{summary['requests']} requests recorded\n")
+        self.stdout.write("Slowest views (by p95):")
+        for view in summary["slowest"]:
+            self.stdout.write(
+                f"  {view['view']:<28} n={view['count']:<6} p50={view['p50_ms']:>8.2f}ms p95={view['p95_ms']:>8.2f}ms "
+                f"template={view['mean_template_ms']:>7.2f}ms queries={view['mean_queries']:>6.2f} sql={view['mean_sql_ms']:>7.2f}ms"
+            )
+        self.stdout.write("\nRepeated queries (possible N+1):")
+        for view in summary["n_plus_one"]:
+            self.stdout.write(f"  {view['view']:<28} {view['max_duplicates']} repeats: {view['worst_sql'][:160]}")
+        if not summary["n_plus_one"]:
+            self.stdout.write("  none")
@@ -0,0 +1,56 @@
+"""
+Rebuild (or just check) the denormalised bid statistics on Listings.
+
+    python manage.py rebuild_bid_stats            # recompute every listing
+    python manage.py rebuild_bid_stats --verify   # report drift, change nothing
+
+Listings are processed in primary key ranges so that each UPDATE touches a
+bounded number of rows.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from auctions.bidding import bid_stats_from_bids
+from auctions.models import Listings
+
+
+class Command(BaseCommand):
+    help = "Recompute Listings.bid_count, high_bidder and last_bid_at from the Bids table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Only report listings whose counters are wrong")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Listings.objects.aggregate(last=Max("id"))["last"] or 0
+        expressions = bid_stats_from_bids()
+        touched = 0
+        for start in range(0, last_id, batch_size):
+            batch = Listings.objects.filter(id__gt=start, id__lte=start + batch_size)
+            if options["verify"]:
+                touched += self.find_drift(batch, expressions)
+            else:
+                with transaction.atomic():
+                    touched += batch.update(**expressions)
+
+        if options["verify"]:
+            if touched:
+                raise CommandError(f"{touched} listing(s) have stale bid statistics")
+            self.stdout.write(self.style.SUCCESS("All bid statistics are up to date"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt bid statistics for {touched} listing(s)"))
+
+    def find_drift(self, batch, expressions):
+        annotated = batch.annotate(**{f"expected_{name}": expr for name, expr in expressions.items()})
+        drifted = annotated.exclude(
+            Q(bid_count=F("expected_bid_count"))
+            & (Q(high_bidder=F("expected_high_bidder")) | Q(high_bidder__isnull=True, expected_high_bidder__isnull=True))
+            & (Q(last_bid_at=F("expected_last_bid_at")) | Q(last_bid_at__isnull=True, expected_last_bid_at__isnull=True))
+        )
+        count = 0
+        for listing_id, title in drifted.values_list("id", "title"):
+            self.stdout.write(f"Listing {listing_id} ({title}) has stale bid statistics")
+            count += 1
+        return count
@@ -0,0 +1,38 @@
+"""
+Rebuild (or just check) the materialised category statistics.
+
+    python manage.py rebuild_category_stats            # recompute every category
+    python manage.py rebuild_category_stats --verify   # report drift, change nothing
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from auctions.directory import category_stats, rebuild_category_stats
+from auctions.models import Categories
+
+
+class Command(BaseCommand):
+    help = "Recompute Categories.active_count, min_price and max_price from the Listings table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Only report categories whose statistics are wrong")
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            updated = rebuild_category_stats()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {updated} categories"))
+            return
+
+        annotated = Categories.objects.annotate(**{f"expected_{name}": expr for name, expr in category_stats().items()})
+        drifted = annotated.exclude(
+            Q(active_count=F("expected_active_count"))
+            & (Q(min_price=F("expected_min_price")) | Q(min_price__isnull=True, expected_min_price__isnull=True))
+            & (Q(max_price=F("expected_max_price")) | Q(max_price__isnull=True, expected_max_price__isnull=True))
+        )
+        count = 0
+        for category_id, name in drifted.values_list("id", "category_name"):
+            self.stdout.write(f"Category {category_id} ({name}) has stale statistics")
+            count += 1
+        if count:
+            raise CommandError(f"{count} category(ies) have stale statistics")
+        self.stdout.write(self.style.SUCCESS("All category statistics are up to date"))
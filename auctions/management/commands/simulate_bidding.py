@@ -0,0 +1,52 @@
+"""
+Replay the same seeded auctions with manual and with proxy bidding, and compare.
+
+    python manage.py simulate_bidding --auctions 20 --bidders 10 --seed 0
+
+See auctions.simulation. Everything happens in one transaction that is
+rolled back at the end, so the database is left as it was.
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.models import Listings, User
+from auctions.simulation import bid_stream, replay_manual, replay_proxy
+
+
+class Command(BaseCommand):
+    help = "Compare Bids rows and requests of manual and proxy bidding on replayed auctions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--auctions", type=int, default=20)
+        parser.add_argument("--bidders", type=int, default=10)
+        parser.add_argument("--spread", type=Decimal, default=Decimal("20.00"), help="Range of valuations above the start price")
+        parser.add_argument("--step", type=Decimal, default=Decimal("0.01"), help="How much manual bidders outbid by")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seller = User.objects.create_user("simulate-seller")
+            users = User.objects.bulk_create(User(username=f"simulate-{i}") for i in range(options["bidders"]))
+            totals = {"manual": [0, 0, 0.0], "proxy": [0, 0, 0.0]}
+            same_winner = 0
+            for n in range(options["auctions"]):
+                stream = bid_stream(options["seed"] * 100000 + n, options["bidders"], Decimal("10.00"), options["spread"])
+                outcomes = {}
+                for mode in totals:
+                    listing = Listings.objects.create(title=f"Simulated {n}", price=Decimal("10.00"), owner=seller)
+                    started = time.perf_counter()
+                    if mode == "manual":
+                        outcomes[mode] = replay_manual(listing.pk, users, stream, options["step"])
+                    else:
+                        outcomes[mode] = replay_proxy(listing.pk, users, stream)
+                    totals[mode][0] += outcomes[mode].requests
+                    totals[mode][1] += outcomes[mode].rows
+                    totals[mode][2] += time.perf_counter() - started
+                same_winner += outcomes["manual"].winner == outcomes["proxy"].winner
+            transaction.set_rollback(True)
+        for mode, (requests, rows, elapsed) in totals.items():
+            self.stdout.write(f"{mode:<7} {requests:>8} bid requests {rows:>8} Bids rows {elapsed:>7.2f}s")
+        self.stdout.write(f"Same winner in {same_winner} of {options['auctions']} auctions")
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0003_listing_bid_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listings',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(fields=['is_active', 'ends_at'], name='listing_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0005_listing_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listings',
+            name='listing_active_feed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listings',
+            name='listing_expiry_idx',
+        ),
+        migrations.AddField(
+            model_name='listings',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['publication_date', 'id'], name='listing_active_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['ends_at'], name='listing_expiry_idx'),
+        ),
+    ]
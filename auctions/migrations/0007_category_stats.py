@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_category_stats(apps, schema_editor):
+    Categories = apps.get_model("auctions", "Categories")
+    Listings = apps.get_model("auctions", "Listings")
+    active = Listings.objects.filter(category=OuterRef("pk"), is_active=True).order_by()
+    prices = active.values("price")
+    Categories.objects.update(
+        active_count=Coalesce(Subquery(active.values("category").annotate(n=Count("id")).values("n")), 0),
+        min_price=Subquery(prices.order_by("price")[:1]),
+        max_price=Subquery(prices.order_by("-price")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_listing_version_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categories',
+            name='active_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categories',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='categories',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'price'], name='listing_category_price_idx'),
+        ),
+        migrations.RunPython(fill_category_stats, migrations.RunPython.noop),
+    ]
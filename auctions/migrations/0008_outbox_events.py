@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_category_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvents',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bid', 'Bid'), ('won', 'Won')], max_length=3)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'outbox event',
+                'verbose_name_plural': 'outbox events',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bids',
+            index=models.Index(fields=['listing', 'bid_amount'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddField(
+            model_name='outboxevents',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.listings'),
+        ),
+        migrations.AddField(
+            model_name='outboxevents',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevents',
+            index=models.Index(condition=models.Q(('delivered_at__isnull', True)), fields=['id'], name='outbox_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='outboxevents',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'won')), fields=('listing',), name='outbox_one_win_per_listing'),
+        ),
+    ]
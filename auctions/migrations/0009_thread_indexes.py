@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0008_outbox_events'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='bids',
+            options={'verbose_name': 'bid', 'verbose_name_plural': 'bids'},
+        ),
+        migrations.RemoveIndex(
+            model_name='bids',
+            name='bid_listing_amount_idx',
+        ),
+        migrations.AlterField(
+            model_name='bids',
+            name='listing',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='auctions.listings'),
+        ),
+        migrations.AlterField(
+            model_name='comments',
+            name='listing',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='auctions.listings'),
+        ),
+        migrations.AddIndex(
+            model_name='bids',
+            index=models.Index(fields=['listing', '-bid_amount'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bids',
+            index=models.Index(fields=['listing', '-bid_date', '-id'], name='bid_listing_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(fields=['listing', 'publication_date'], name='comment_thread_idx'),
+        ),
+    ]
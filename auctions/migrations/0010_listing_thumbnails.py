@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_thread_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Photos',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+                ('digest', models.CharField(blank=True, max_length=64)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'photo',
+                'verbose_name_plural': 'photos',
+            },
+        ),
+        migrations.AddField(
+            model_name='listings',
+            name='thumbnail',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('thumbnail', ''), models.Q(('photo', ''), _negated=True)), fields=['id'], name='listing_thumbnail_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_closed_listings(apps, schema_editor):
+    Listings = apps.get_model("auctions", "Listings")
+    closed = Listings.objects.filter(is_active=False)
+    # The real closing time was never recorded; the end time or last bid is the best guess
+    closed.update(closed_at=Coalesce(F("ends_at"), F("last_bid_at"), F("publication_date")))
+    # Unsold listings still belong to their seller. Sold ones went to the winner,
+    # and who sold them is lost
+    closed.filter(high_bidder__isnull=True).update(seller=F("owner"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_listing_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listings',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listings',
+            name='seller',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['closed_at', 'id'], name='listing_closed_idx'),
+        ),
+        migrations.RunPython(fill_closed_listings, migrations.RunPython.noop),
+    ]
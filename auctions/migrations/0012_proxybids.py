@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_listing_closed_at_seller'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyBids',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('set_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bidder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to=settings.AUTH_USER_MODEL)),
+                ('listing', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to='auctions.listings')),
+            ],
+            options={
+                'verbose_name': 'proxy bid',
+                'verbose_name_plural': 'proxy bids',
+                'indexes': [models.Index(fields=['listing', '-max_amount', 'set_at'], name='proxy_bid_listing_max_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='proxybids',
+            constraint=models.UniqueConstraint(fields=('listing', 'bidder'), name='proxy_bid_unique'),
+        ),
+    ]
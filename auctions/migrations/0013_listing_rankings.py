@@ -0,0 +1,100 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:29
+
+from collections import defaultdict
+from datetime import timedelta
+from math import log2
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import django.utils.timezone
+
+# Copied from auctions.ranking as it stood, so later changes there can't change this migration
+BID_WEIGHT = 3.0
+COMMENT_WEIGHT = 1.0
+FLOOR = 0.05
+
+
+def decay_factor(seconds):
+    return 0.5 ** (seconds / settings.AUCTIONS_HOTNESS_HALF_LIFE)
+
+
+def recent_hotness(bids, comments, now):
+    scores = defaultdict(float)
+    for weight, events in ((BID_WEIGHT, bids), (COMMENT_WEIGHT, comments)):
+        for listing_id, when in events:
+            scores[listing_id] += weight * decay_factor((now - when).total_seconds())
+    return scores
+
+
+def cooling_period():
+    return timedelta(seconds=settings.AUCTIONS_HOTNESS_HALF_LIFE * log2(max(BID_WEIGHT, COMMENT_WEIGHT) / FLOOR))
+
+
+def fill_rankings(apps, schema_editor):
+    Listings = apps.get_model("auctions", "Listings")
+    Watch = Listings.watchlist.through
+    watchers = Watch.objects.filter(listings_id=OuterRef("pk")).order_by().values("listings_id")
+    Listings.objects.update(watch_count=Coalesce(Subquery(watchers.annotate(n=Count("id")).values("n")), 0))
+    # Recent bids and comments; when the current watchers started watching was never recorded
+    now = timezone.now()
+    since = now - cooling_period()
+    scores = recent_hotness(
+        apps.get_model("auctions", "Bids").objects.filter(bid_date__gte=since).values_list("listing_id", "bid_date"),
+        apps.get_model("auctions", "Comments").objects.filter(publication_date__gte=since)
+        .values_list("listing_id", "publication_date"),
+        now,
+    )
+    warm = [Listings(pk=listing_id, hotness=score) for listing_id, score in scores.items() if score >= FLOOR]
+    Listings.objects.bulk_update(warm, ["hotness"], batch_size=1000)
+    apps.get_model("auctions", "Rankings").objects.create(pk=1, decayed_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_proxybids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rankings',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decayed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'ranking',
+                'verbose_name_plural': 'rankings',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='listings',
+            name='listing_expiry_idx',
+        ),
+        migrations.AddField(
+            model_name='listings',
+            name='hotness',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listings',
+            name='watch_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['ends_at', 'id'], name='listing_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-hotness', '-id'], name='listing_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-watch_count', '-id'], name='listing_most_watched_idx'),
+        ),
+        migrations.RunPython(fill_rankings, migrations.RunPython.noop),
+    ]
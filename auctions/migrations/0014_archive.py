@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_listing_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedListings',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=64)),
+                ('description', models.TextField(blank=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('photo', models.URLField(blank=True)),
+                ('thumbnail', models.CharField(blank=True, max_length=64)),
+                ('publication_date', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bid_count', models.PositiveIntegerField(default=0)),
+                ('bidder_count', models.PositiveIntegerField(default=0)),
+                ('first_bid_at', models.DateTimeField(blank=True, null=True)),
+                ('last_bid_at', models.DateTimeField(blank=True, null=True)),
+                ('bids', models.BinaryField(blank=True, default=b'')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.categories')),
+                ('high_bidder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_listings', to=settings.AUTH_USER_MODEL)),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'archived listing',
+                'verbose_name_plural': 'archived listings',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedComments',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.CharField(max_length=200)),
+                ('publication_date', models.DateTimeField()),
+                ('listing', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='auctions.archivedlistings')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'archived comment',
+                'verbose_name_plural': 'archived comments',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedlistings',
+            index=models.Index(fields=['closed_at', 'id'], name='archived_listing_closed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedcomments',
+            index=models.Index(fields=['listing', 'publication_date'], name='archived_comment_thread_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'publication_date', 'id'], name='listing_category_feed_idx'),
+        ),
+    ]
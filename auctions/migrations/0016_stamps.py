@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+def create_directory_stamp(apps, schema_editor):
+    # So bumping it is always a single UPDATE (see auctions.stamps)
+    apps.get_model("auctions", "Stamps").objects.get_or_create(key="directory")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_listing_category_feed_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stamps',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'stamp',
+                'verbose_name_plural': 'stamps',
+            },
+        ),
+        migrations.RunPython(create_directory_stamp, migrations.RunPython.noop),
+    ]
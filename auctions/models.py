@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -7,7 +9,14 @@ class User(AbstractUser):
 
 
 class Categories(models.Model):
+    """
+    A listing category, with statistics over its active listings that
+    auctions.directory keeps up to date as listings change.
+    """
     category_name = models.CharField(max_length=24)
+    active_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(decimal_places=2, max_digits=8, blank=True, null=True, editable=False)
+    max_price = models.DecimalField(decimal_places=2, max_digits=8, blank=True, null=True, editable=False)
 
     class Meta:
         verbose_name = "category"
@@ -25,8 +34,15 @@ class Listings(models.Model):
     - Owner - either seller or new owner
     - Current bid value
     - Listing category
-    - Photo (optional)
-    - Status of Listing (open/closed)
+    - Photo (optional), and the digest of its thumbnails once the
+      build_thumbnails worker has made them (see auctions.thumbnails)
+    - Status of Listing (open/closed); once closed, when it closed and who
+      sold it (owner passes to the winner)
+    - End time (optional); auctions past it are closed by the close_auctions worker
+    - Bid statistics (count, current leader, time of last bid), kept up to
+      date by auctions.bidding so nothing has to aggregate Bids to show them
+    - Watcher count and a time-decayed activity score ("hotness"), kept up
+      to date by auctions.ranking for the trending and most watched feeds
     """
 
     # Note to self: Django automatically makes a primary key called id
@@ -34,6 +50,7 @@ class Listings(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(default=0, decimal_places=2, max_digits=8)
     photo = models.URLField(blank=True)
+    thumbnail = models.CharField(max_length=64, blank=True, editable=False)
     category = models.ForeignKey(
         Categories,
         on_delete=models.SET_NULL,
@@ -49,14 +66,83 @@ class Listings(models.Model):
         User, blank=True, related_name="watchlist_items"
     )
     publication_date = models.DateTimeField(auto_now_add=True)
-    
+    bid_count = models.PositiveIntegerField(default=0)
+    high_bidder = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name="leading_listings", blank=True, null=True
+    )
+    last_bid_at = models.DateTimeField(blank=True, null=True)
+    ends_at = models.DateTimeField(blank=True, null=True)
+    # Set by auctions.closing
+    closed_at = models.DateTimeField(blank=True, null=True, editable=False)
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="+", blank=True, null=True, editable=False)
+    # Bumped whenever anything shown on the listing page changes (the listing
+    # itself, a bid or a comment); drives fragment caching and API ETags
+    version = models.PositiveBigIntegerField(default=1, editable=False)
+    watch_count = models.PositiveIntegerField(default=0, editable=False)
+    hotness = models.FloatField(default=0, editable=False)
+
     class Meta:
         verbose_name = "listing"
         verbose_name_plural = "listings"
+        # Partial indexes over open listings only: Django filters booleans as a bare
+        # "WHERE is_active", which SQLite matches against an index's WHERE clause
+        # but not against a leading is_active column
+        indexes = [
+            # Backs the keyset paginated feed of active listings, newest first
+            models.Index(fields=["publication_date", "id"], condition=Q(is_active=True), name="listing_active_feed_idx"),
+            # The same for each category's page
+            models.Index(fields=["category", "publication_date", "id"], condition=Q(is_active=True), name="listing_category_feed_idx"),
+            # Lets the expiry worker find due auctions without scanning every open listing,
+            # and serves the ending soon feed (the id is the feed's keyset tiebreaker)
+            models.Index(fields=["ends_at", "id"], condition=Q(is_active=True), name="listing_expiry_idx"),
+            # Cheapest and dearest open listing per category, for the category statistics
+            models.Index(fields=["category", "price"], condition=Q(is_active=True), name="listing_category_price_idx"),
+            # The thumbnail worker's queue: listings with a photo but no thumbnails yet
+            models.Index(fields=["id"], condition=Q(thumbnail="") & ~Q(photo=""), name="listing_thumbnail_queue_idx"),
+            # Closed sales in the order they closed, for exports (see auctions.exports)
+            models.Index(fields=["closed_at", "id"], condition=Q(is_active=False), name="listing_closed_idx"),
+            # The trending and most watched feeds (see auctions.ranking). Descending ids spelled
+            # out as in bid_listing_date_idx
+            models.Index(fields=["-hotness", "-id"], condition=Q(is_active=True), name="listing_trending_idx"),
+            models.Index(fields=["-watch_count", "-id"], condition=Q(is_active=True), name="listing_most_watched_idx"),
+        ]
 
     def __str__(self):
         return f"Title: {self.title} by {self.owner}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # Bump the stored version, which this instance may be behind
+        self.version = F("version") + 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=["version"])
+
+    @classmethod
+    def bump_version(cls, listing_id):
+        cls.objects.filter(pk=listing_id).update(version=F("version") + 1)
+
+
+class Photos(models.Model):
+    """
+    A listing photo URL the thumbnail worker has fetched, so each URL is only
+    fetched once. `digest` names its thumbnails; it is blank, with the reason
+    in `error`, when the photo could not be fetched or decoded.
+    """
+    url = models.URLField(unique=True)
+    digest = models.CharField(max_length=64, blank=True)
+    error = models.CharField(max_length=200, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "photo"
+        verbose_name_plural = "photos"
+
+    def __str__(self):
+        return self.url
+
 
 class Bids(models.Model):
     """
@@ -66,19 +152,52 @@ class Bids(models.Model):
     bidder = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="user_bids", blank=True, null=True
     )
-    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name="bids")
-    bid_date = models.DateTimeField(auto_now_add=True)
+    # Not indexed on its own: the composite indexes below all start with it
+    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name="bids", db_index=False)
+    # Not auto_now_add, so place_bid can stamp the bid and Listings.last_bid_at with the same time
+    bid_date = models.DateTimeField(default=timezone.now, editable=False)
 
     # Some metadata
+    # No default ordering: every query that needs one says so and has an index for it
     class Meta:
         verbose_name = "bid"
         verbose_name_plural = "bids"
-        ordering = ["-bid_date"] # Shows more recent(?) first
+        indexes = [
+            # Highest bids first: the winner, and the bid a new bid superseded (see auctions.notifications)
+            models.Index(fields=["listing", "-bid_amount"], name="bid_listing_amount_idx"),
+            # Bid history pages, newest first. The id tiebreaker has to be spelled out: SQLite
+            # appends the rowid ascending, which would leave "-bid_date, -id" half sorted
+            models.Index(fields=["listing", "-bid_date", "-id"], name="bid_listing_date_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.bid_amount} for {self.listing} by {self.user}"
+        return f"{self.bid_amount} for {self.listing} by {self.bidder}"
 
 
+class ProxyBids(models.Model):
+    """
+    A bidder's hidden maximum for a listing. auctions.bidding bids for them,
+    one increment at a time, as others bid, up to this amount. Never shown
+    to anyone else. Of two equal maximums the one set first wins.
+    """
+    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name="proxy_bids", db_index=False)
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name="proxy_bids")
+    max_amount = models.DecimalField(decimal_places=2, max_digits=8)
+    # When max_amount was last set
+    set_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "proxy bid"
+        verbose_name_plural = "proxy bids"
+        constraints = [models.UniqueConstraint(fields=["listing", "bidder"], name="proxy_bid_unique")]
+        indexes = [
+            # A listing's highest maximums, earliest first among equals
+            models.Index(fields=["listing", "-max_amount", "set_at"], name="proxy_bid_listing_max_idx"),
+        ]
+
+    def __str__(self):
+        return f"Up to {self.max_amount} for {self.listing} by {self.bidder}"
+
 
 class Comments(models.Model):
     """A model to track all the comments left on various listings.
@@ -90,13 +209,142 @@ class Comments(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE)
     content = models.CharField(max_length=200, blank=False)
+    # Indexed through comment_thread_idx
     listing = models.ForeignKey(
-        Listings, on_delete=models.CASCADE)
+        Listings, on_delete=models.CASCADE, db_index=False)
     publication_date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = "comment"
         verbose_name_plural = "comments"
+        indexes = [
+            # Comment pages, newest first
+            models.Index(fields=["listing", "publication_date"], name="comment_thread_idx"),
+        ]
+
+    def __str__(self):
+        return f"Comment by {self.user} on {self.listing}"
+
+
+class ArchivedListings(models.Model):
+    """
+    A closed listing moved out of Listings by auctions.archive, under the
+    same id. Its bids are summarised: counts and first/last bid times, plus
+    the history packed into `bids` (see auctions.archive.pack_bids).
+    """
+    title = models.CharField(max_length=64)
+    description = models.TextField(blank=True)
+    price = models.DecimalField(decimal_places=2, max_digits=8)
+    photo = models.URLField(blank=True)
+    thumbnail = models.CharField(max_length=64, blank=True)
+    category = models.ForeignKey(Categories, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+    # The winner if there was one, otherwise the seller, as in Listings
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_listings", blank=True, null=True)
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="+", blank=True, null=True)
+    high_bidder = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="+", blank=True, null=True)
+    publication_date = models.DateTimeField()
+    ends_at = models.DateTimeField(blank=True, null=True)
+    closed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    bid_count = models.PositiveIntegerField(default=0)
+    bidder_count = models.PositiveIntegerField(default=0)
+    first_bid_at = models.DateTimeField(blank=True, null=True)
+    last_bid_at = models.DateTimeField(blank=True, null=True)
+    bids = models.BinaryField(blank=True, default=b"")
+
+    class Meta:
+        verbose_name = "archived listing"
+        verbose_name_plural = "archived listings"
+        indexes = [
+            # Archived sales in the order they closed, for exports (see auctions.exports)
+            models.Index(fields=["closed_at", "id"], name="archived_listing_closed_idx"),
+        ]
+
+    def __str__(self):
+        return f"Title: {self.title} by {self.owner} (archived)"
+
+
+class ArchivedComments(models.Model):
+    """A comment on an archived listing, moved from Comments under the same id."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    content = models.CharField(max_length=200)
+    # Indexed through archived_comment_thread_idx
+    listing = models.ForeignKey(ArchivedListings, on_delete=models.CASCADE, related_name="comments", db_index=False)
+    publication_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "archived comment"
+        verbose_name_plural = "archived comments"
+        indexes = [
+            # Comment pages, newest first, as comment_thread_idx
+            models.Index(fields=["listing", "publication_date"], name="archived_comment_thread_idx"),
+        ]
+
+    def __str__(self):
+        return f"Comment by {self.user} on {self.listing}"
+
+
+class Rankings(models.Model):
+    """
+    A single row of bookkeeping for auctions.ranking: when the hotness
+    scores were last decayed.
+    """
+    decayed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "ranking"
+        verbose_name_plural = "rankings"
+
+    def __str__(self):
+        return f"Decayed at {self.decayed_at}"
+
+
+class Stamps(models.Model):
+    """
+    A version stamp of something each process caches for itself (see
+    auctions.stamps), bumped whenever it changes.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "stamp"
+        verbose_name_plural = "stamps"
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+
+class OutboxEvents(models.Model):
+    """
+    Things users should be told about, waiting for the deliver_notifications
+    worker (see auctions.notifications):
+    - "bid": `user` bid `amount` on `listing`; whoever held the previous high
+      bid is told they were outbid
+    - "won": `user` won `listing` for `amount`
+    """
+    BID = "bid"
+    WON = "won"
+    KIND_CHOICES = [(BID, "Bid"), (WON, "Won")]
+
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES)
+    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name="+")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    amount = models.DecimalField(decimal_places=2, max_digits=8)
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "outbox event"
+        verbose_name_plural = "outbox events"
+        indexes = [
+            # The worker's queue: undelivered events in insertion order
+            models.Index(fields=["id"], condition=Q(delivered_at__isnull=True), name="outbox_pending_idx"),
+        ]
+        constraints = [
+            # A listing is won once, however many closers race to close it
+            models.UniqueConstraint(fields=["listing"], condition=Q(kind="won"), name="outbox_one_win_per_listing"),
+        ]
 
     def __str__(self):
-        return f"Comment by {self.user} on {self.listing}"
\ No newline at end of file
+        return f"{self.kind} {self.amount} on {self.listing_id} by {self.user_id}"
@@ -0,0 +1,116 @@
+"""
+Outbid and auction-won notifications.
+
+Writers only append to the OutboxEvents table, in the same transaction as the
+change they describe: place_bid adds one "bid" row (a plain INSERT, nothing is
+read), close_listings adds a "won" row per listing that closed with a bidder.
+
+The deliver_notifications worker drains the outbox in batches. For each bid
+event it looks up who the bid superseded (the bidder of the next lower bid on
+the listing, via bid_listing_amount_idx), drops notices that no longer apply
+(people outbidding themselves, or who have since retaken the lead), keeps
+only the latest notice per user and listing, and sends each user one email
+per batch. Events are marked delivered after the emails are handed to the
+backend, so a crash in between means a repeat email, never a lost one. Run a
+single worker.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, When
+from django.utils import timezone
+
+from .models import Bids, OutboxEvents, User
+
+BATCH_SIZE = 5000
+
+
+def record_bid(listing_id, bidder_id, amount, now):
+    OutboxEvents.objects.create(kind=OutboxEvents.BID, listing_id=listing_id, user_id=bidder_id, amount=amount, created_at=now)
+
+
+def record_wins(listings):
+    """`listings`: (listing id, winner id, price) for listings that just closed."""
+    OutboxEvents.objects.bulk_create(
+        (OutboxEvents(kind=OutboxEvents.WON, listing_id=pk, user_id=winner, amount=price) for pk, winner, price in listings),
+        # Already recorded by whoever else closed the listing
+        ignore_conflicts=True,
+    )
+
+
+def pending_events(batch_size=BATCH_SIZE):
+    """The oldest undelivered events, with who each one should go to."""
+    superseded = (
+        Bids.objects.filter(listing=OuterRef("listing"), bid_amount__lt=OuterRef("amount"))
+        .order_by("-bid_amount")
+        .values("bidder")[:1]
+    )
+    return list(
+        OutboxEvents.objects.filter(delivered_at__isnull=True)
+        .order_by("id")
+        .annotate(
+            recipient=Case(
+                When(kind=OutboxEvents.WON, then=F("user")),
+                default=Subquery(superseded),
+                output_field=IntegerField(),
+            ),
+            title=F("listing__title"),
+            leader=F("listing__high_bidder"),
+        )
+        .values("id", "kind", "listing_id", "user_id", "amount", "recipient", "title", "leader")[:batch_size]
+    )
+
+
+def coalesce(events):
+    """
+    {recipient id: {(kind, listing id): event}}, keeping the latest event per
+    user and listing and dropping outbid notices that no longer apply.
+    """
+    notices = defaultdict(dict)
+    for event in events:
+        recipient = event["recipient"]
+        if event["kind"] == OutboxEvents.BID and recipient in (None, event["user_id"], event["leader"]):
+            continue
+        notices[recipient][event["kind"], event["listing_id"]] = event
+    return notices
+
+
+def _line(event):
+    if event["kind"] == OutboxEvents.WON:
+        return f"You won \"{event['title']}\" for £{event['amount']}."
+    return f"You were outbid on \"{event['title']}\": the price is now £{event['amount']}."
+
+
+def build_messages(notices):
+    users = User.objects.filter(pk__in=list(notices), email__gt="").values_list("pk", "username", "email")
+    messages = []
+    for pk, username, email in users:
+        lines = [_line(event) for event in sorted(notices[pk].values(), key=lambda event: event["id"])]
+        subject = lines[0] if len(lines) == 1 else f"{len(lines)} updates on your auctions"
+        body = f"Hi {username},\n\n" + "\n".join(lines) + "\n"
+        messages.append(EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email]))
+    return messages
+
+
+def deliver_batch(batch_size=BATCH_SIZE, connection=None):
+    """Deliver one batch. Returns (events processed, emails sent)."""
+    events = pending_events(batch_size)
+    if not events:
+        return 0, 0
+    messages = build_messages(coalesce(events))
+    sent = (connection or get_connection()).send_messages(messages) if messages else 0
+    OutboxEvents.objects.filter(pk__in=[event["id"] for event in events]).update(delivered_at=timezone.now())
+    return len(events), sent or 0
+
+
+def deliver_pending(batch_size=BATCH_SIZE, connection=None):
+    """Deliver everything that is pending. Returns (events processed, emails sent)."""
+    connection = connection or get_connection()
+    processed = sent = 0
+    while True:
+        events, emails = deliver_batch(batch_size, connection)
+        if not events:
+            return processed, sent
+        processed += events
+        sent += emails
@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Rather than paging with OFFSET, which makes the database walk and throw away
+every earlier row, each page is fetched with a WHERE clause that starts just
+after the last row of the previous page. With a matching index the cost of a
+page is the same whether it is the first or the thousandth.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the page after it (if any)."""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    """Turn the key values of a row into an opaque, URL safe string."""
+    plain = [v.isoformat() if isinstance(v, datetime.datetime) else str(v) for v in values]
+    return base64.urlsafe_b64encode(json.dumps(plain).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length, fields=None):
+    """
+    The inverse of encode_cursor. Returns None for anything malformed.
+    Given the model `fields` the values are keys of, converts each value to
+    its field's type, and a value that doesn't convert is malformed too.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    if fields is not None:
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if any(value is None for value in values):
+            return None
+    return values
+
+
+def after(keys, values, descending=True):
+    """
+    Q object for rows that sort after `values` when ordering descending by `keys`,
+    i.e. (k1 < v1) OR (k1 = v1 AND k2 < v2) OR ..., or with > when ascending.
+    """
+    lookup = "lt" if descending else "gt"
+    condition = Q()
+    for i, key in enumerate(keys):
+        step = Q(**{f"{key}__{lookup}": values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            step &= Q(**{prev_key: prev_value})
+        condition |= step
+    return condition
+
+
+def paginate(queryset, cursor=None, page_size=PAGE_SIZE, keys=("publication_date", "id"), descending=True):
+    """
+    Return a KeysetPage of `queryset` ordered newest first by `keys` (or
+    smallest first if not `descending`).
+    An invalid cursor is treated as a request for the first page.
+    """
+    rows = list(_window(queryset, cursor, page_size, keys, descending))
+    return _page(rows, page_size, keys)
+
+
+async def apaginate(queryset, cursor=None, page_size=PAGE_SIZE, keys=("publication_date", "id"), descending=True):
+    """paginate() for async views."""
+    rows = [row async for row in _window(queryset, cursor, page_size, keys, descending)]
+    return _page(rows, page_size, keys)
+
+
+def _window(queryset, cursor, page_size, keys, descending):
+    values = decode_cursor(cursor, len(keys), [queryset.model._meta.get_field(key) for key in keys])
+    if values is not None:
+        queryset = queryset.filter(after(keys, values, descending))
+    queryset = queryset.order_by(*(f"-{key}" if descending else key for key in keys))
+    # One extra row tells us whether there is another page without a COUNT query
+    return queryset[: page_size + 1]
+
+
+def _page(rows, page_size, keys):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([_key_value(last, key) for key in keys])
+    return KeysetPage(rows, next_cursor)
+
+
+def _key_value(row, key):
+    if isinstance(row, dict):
+        return row[key]
+    return getattr(row, key)
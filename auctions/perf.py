@@ -0,0 +1,238 @@
+"""
+Lightweight request profiling.
+
+PerfMiddleware records, for every request, the URL name, wall time, template
+render time, number and total time of SQL queries, and how many of those
+queries repeated an earlier statement in the same request (the usual sign of
+an N+1 loop). Records go into a bounded in-memory ring buffer per process;
+/_perf and the perf_report command summarise them.
+
+The per-request overhead is a context variable lookup per query and a deque
+append, so it is meant to stay on in production. Settings:
+
+- AUCTIONS_PERF_ENABLED: turn recording on or off (default on)
+- AUCTIONS_PERF_BUFFER_SIZE: how many recent requests to keep (default 5000)
+- AUCTIONS_PERF_SNAPSHOT_DIR: if set, each process periodically writes its
+  buffer there so perf_report can read it from outside the server
+- AUCTIONS_PERF_SNAPSHOT_EVERY: requests between snapshots (default 1000)
+"""
+import contextvars
+import json
+import os
+import statistics
+import time
+from collections import Counter, defaultdict, deque, namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist, engines
+from django.template.backends.django import DjangoTemplates
+
+PerfRecord = namedtuple(
+    "PerfRecord",
+    ["url_name", "method", "status", "total_ms", "template_ms", "queries", "sql_ms", "duplicates", "worst_sql", "at"],
+)
+
+_current = contextvars.ContextVar("auctions_perf_request", default=None)
+buffer = deque(maxlen=getattr(settings, "AUCTIONS_PERF_BUFFER_SIZE", 5000))
+
+
+class _RequestStats:
+    __slots__ = ("queries", "sql_time", "template_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time and count one statement."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; only records while a request is being profiled."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class PerfMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "AUCTIONS_PERF_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.snapshot_dir = getattr(settings, "AUCTIONS_PERF_SNAPSHOT_DIR", None)
+        self.snapshot_every = getattr(settings, "AUCTIONS_PERF_SNAPSHOT_EVERY", 1000)
+        self.since_snapshot = 0
+        # Connections are per thread (and async views query from a worker thread), so
+        # the wrapper goes on every connection and the request is found via a context variable
+        connection_created.connect(_install, dispatch_uid="auctions.perf")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.store(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.store(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def store(self, request, response, stats, total):
+        match = request.resolver_match
+        worst_sql, worst_count = stats.statements.most_common(1)[0] if stats.statements else ("", 0)
+        buffer.append(PerfRecord(
+            url_name=match.view_name if match else "<unresolved>",
+            method=request.method,
+            status=response.status_code,
+            total_ms=total * 1000,
+            template_ms=stats.template_time * 1000,
+            queries=stats.queries,
+            sql_ms=stats.sql_time * 1000,
+            duplicates=stats.queries - len(stats.statements),
+            worst_sql=worst_sql if worst_count > 1 else "",
+            at=time.time(),
+        ))
+        if self.snapshot_dir:
+            self.since_snapshot += 1
+            if self.since_snapshot >= self.snapshot_every:
+                self.since_snapshot = 0
+                write_snapshot(self.snapshot_dir)
+
+
+class TimedTemplatesMixin:
+    """For template backends: render time is added to the current request's record."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class TimedDjangoTemplates(TimedTemplatesMixin, DjangoTemplates):
+    """The standard Django template backend, timed."""
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+def warm_templates(names):
+    """
+    Load `names` into every template engine that has them, so they are parsed
+    and compiled before the first request instead of during it.
+    """
+    for engine in engines.all():
+        for name in names:
+            try:
+                engine.get_template(name)
+            except TemplateDoesNotExist:
+                pass
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(records, top=10):
+    """
+    Group records by view. Returns the `top` slowest views (by p95 wall time)
+    and the `top` worst N+1 offenders (by most repeated statements in one request).
+    """
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record.url_name].append(record)
+
+    views = []
+    for name, rows in by_view.items():
+        totals = sorted(row.total_ms for row in rows)
+        worst = max(rows, key=lambda row: row.duplicates)
+        views.append({
+            "view": name,
+            "count": len(rows),
+            "p50_ms": round(percentile(totals, 0.50), 2),
+            "p95_ms": round(percentile(totals, 0.95), 2),
+            "max_ms": round(totals[-1], 2),
+            "mean_template_ms": round(statistics.mean(row.template_ms for row in rows), 2),
+            "mean_queries": round(statistics.mean(row.queries for row in rows), 2),
+            "mean_sql_ms": round(statistics.mean(row.sql_ms for row in rows), 2),
+            "max_duplicates": worst.duplicates,
+            "worst_sql": worst.worst_sql,
+        })
+    slowest = sorted(views, key=lambda view: view["p95_ms"], reverse=True)[:top]
+    offenders = sorted((v for v in views if v["max_duplicates"]), key=lambda v: v["max_duplicates"], reverse=True)[:top]
+    return {"requests": len(records), "slowest": slowest, "n_plus_one": offenders}
+
+
+def write_snapshot(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"perf-{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump([record._asdict() for record in list(buffer)], f)
+    os.replace(path + ".tmp", path)
+
+
+def read_snapshots(directory):
+    records = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("perf-") and name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                records.extend(PerfRecord(**row) for row in json.load(f))
+    return records
@@ -0,0 +1,105 @@
+"""
+Publish/subscribe for live listing updates.
+
+Publishers (bid placement, which may run in any thread) call publish();
+server-sent event streams call subscribe() from the event loop and wait on
+an asyncio queue, so an idle watcher costs a queue and a suspended task, and
+never polls the database.
+
+The broker class comes from the AUCTIONS_PUBSUB_BACKEND setting. The default
+LocalBroker only fans out within one process; a multi-process deployment
+swaps in a broker with the same two methods backed by a shared service.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+QUEUE_SIZE = 16
+
+
+class LocalBroker:
+    """In-process fan-out. Safe to publish from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:  # The subscriber's loop has shut down
+                pass
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            # A slow reader only needs the latest state, so drop the oldest update
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def subscribe(self, channel):
+        """
+        A Subscription to messages published to `channel` from now on. Use it
+        as an async context manager from inside the event loop.
+        """
+        return Subscription(self, channel)
+
+    def _add(self, channel, subscriber):
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+
+    def _remove(self, channel, subscriber):
+        with self._lock:
+            self._subscribers[channel].discard(subscriber)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class Subscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    async def __aenter__(self):
+        self.subscriber = (asyncio.get_running_loop(), self.queue)
+        self.broker._add(self.channel, self.subscriber)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self.channel, self.subscriber)
+
+    async def get(self, timeout=None):
+        """The next message, or None if nothing arrives within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, "AUCTIONS_PUBSUB_BACKEND", "auctions.pubsub.LocalBroker"))()
+    return _broker
+
+
+def listing_channel(listing_id):
+    return f"listing:{listing_id}"
@@ -0,0 +1,134 @@
+"""
+Trending, most watched and ending soon, from columns kept up to date as
+things happen rather than aggregated when a feed is shown.
+
+Listings.hotness is a time-decayed activity score. Each bid, comment and
+new watcher adds its weight (BID_WEIGHT, COMMENT_WEIGHT, WATCH_WEIGHT) in
+the same transaction that records it: bids in auctions.bidding's UPDATE,
+comments and watchers through the functions below. The decay_hotness worker
+then halves every score each AUCTIONS_HOTNESS_HALF_LIFE seconds, a pass at a
+time (decay). Between passes new events count for slightly more than older
+ones should, by at most one pass's worth of decay. Scores that cool below
+FLOOR drop to zero, so a pass only touches listings with recent activity.
+
+Listings.watch_count is the number of watchers. Losing a watcher lowers it
+but not the hotness the watch earned.
+
+Each feed (see auctions.loaders) is one range scan of a partial index over
+active listings, paginated by keyset like every other list.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from math import log2
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Bids, Comments, Listings, Rankings
+
+BID_WEIGHT = 3.0
+COMMENT_WEIGHT = 1.0
+WATCH_WEIGHT = 2.0
+# A single comment cools below this in a little over four half-lives
+FLOOR = 0.05
+
+
+def decay_factor(seconds):
+    """What a score is multiplied by over `seconds`."""
+    return 0.5 ** (seconds / settings.AUCTIONS_HOTNESS_HALF_LIFE)
+
+
+def comment_added(listing_id):
+    """Heat up a listing for a new comment, and bump its version, in one UPDATE."""
+    Listings.objects.filter(pk=listing_id).update(
+        version=F("version") + 1, hotness=F("hotness") + COMMENT_WEIGHT,
+    )
+
+
+def watchers_added(listing_ids, count=1):
+    """`count` new watchers for each of `listing_ids`."""
+    if count:
+        Listings.objects.filter(pk__in=listing_ids).update(
+            watch_count=F("watch_count") + count, hotness=F("hotness") + WATCH_WEIGHT * count,
+        )
+
+
+def watchers_removed(listing_ids, count=1):
+    """`count` fewer watchers for each of `listing_ids`."""
+    if count:
+        # Never below zero, in case a count has drifted (see rebuild_watch_counts)
+        Listings.objects.filter(pk__in=listing_ids).update(watch_count=Greatest(F("watch_count") - count, 0))
+
+
+def decay(now=None):
+    """
+    Decay every active listing's score for the time since the last pass.
+    Returns how many listings were updated. Passes run one at a time, so
+    more than one worker never decays the same interval twice.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        clock, created = Rankings.objects.select_for_update().get_or_create(pk=1, defaults={"decayed_at": now})
+        elapsed = (now - clock.decayed_at).total_seconds()
+        if created or elapsed <= 0:
+            return 0
+        factor = decay_factor(elapsed)
+        hot = Listings.objects.filter(is_active=True, hotness__gt=0)
+        # factor underflows to zero after months without a pass
+        updated = (hot.filter(hotness__lt=FLOOR / factor) if factor else hot).update(hotness=0)
+        updated += hot.update(hotness=F("hotness") * factor)
+        clock.decayed_at = now
+        clock.save(update_fields=["decayed_at"])
+    return updated
+
+
+def recent_hotness(bids, comments, now):
+    """
+    {listing id: hotness} from (listing id, time) pairs of bids and comments,
+    decayed to `now`. Current watchers are not included: when they started
+    watching isn't recorded.
+    """
+    scores = defaultdict(float)
+    for weight, events in ((BID_WEIGHT, bids), (COMMENT_WEIGHT, comments)):
+        for listing_id, when in events:
+            scores[listing_id] += weight * decay_factor((now - when).total_seconds())
+    return scores
+
+
+def cooling_period():
+    """How long the heaviest single event takes to cool below FLOOR."""
+    return timedelta(seconds=settings.AUCTIONS_HOTNESS_HALF_LIFE * log2(max(BID_WEIGHT, COMMENT_WEIGHT) / FLOOR))
+
+
+def rebuild(now=None, batch_size=1000):
+    """
+    Recompute every watch count from the watchlists and every score from the
+    bids and comments still warm enough to count, and restart the decay
+    clock. For after bulk loads, or to correct drift.
+    """
+    now = now or timezone.now()
+    since = now - cooling_period()
+    scores = recent_hotness(
+        Bids.objects.filter(bid_date__gte=since).values_list("listing_id", "bid_date").iterator(),
+        Comments.objects.filter(publication_date__gte=since).values_list("listing_id", "publication_date").iterator(),
+        now,
+    )
+    with transaction.atomic():
+        rebuild_watch_counts()
+        Listings.objects.filter(hotness__gt=0).update(hotness=0)
+        warm = [Listings(pk=listing_id, hotness=score) for listing_id, score in scores.items() if score >= FLOOR]
+        Listings.objects.bulk_update(warm, ["hotness"], batch_size=batch_size)
+        Rankings.objects.update_or_create(pk=1, defaults={"decayed_at": now})
+    return len(warm)
+
+
+def rebuild_watch_counts():
+    Watch = Listings.watchlist.through
+    watchers = Watch.objects.filter(listings_id=OuterRef("pk")).order_by().values("listings_id")
+    Listings.objects.update(
+        watch_count=Coalesce(Subquery(watchers.annotate(n=Count("id")).values("n")), 0),
+    )
+
@@ -0,0 +1,136 @@
+"""
+Full-text search over listing titles and descriptions.
+
+On SQLite the text lives in an FTS5 index (auctions_listings_fts) that uses
+auctions_listings as its external content table, kept in sync by triggers, so
+rows written with bulk_create or raw SQL are indexed as well. Matches are
+ranked by bm25 with titles weighted above descriptions, and paged with a
+(score, id) cursor. Other databases fall back to a plain icontains filter.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Listings
+from .pagination import PAGE_SIZE, KeysetPage, decode_cursor, encode_cursor, paginate
+
+FTS_TABLE = "auctions_listings_fts"
+BM25 = f"bm25({FTS_TABLE}, 10.0, 1.0)"
+
+CREATE_INDEX = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, content='auctions_listings', content_rowid='id', tokenize='porter unicode61'
+    )""",
+]
+
+# Table rebuilds done by later migrations drop triggers, so these are also
+# re-created after every migrate (see auctions.signals)
+CREATE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON auctions_listings BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON auctions_listings BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title, description ON auctions_listings BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+REBUILD_INDEX = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+DROP_INDEX = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install_triggers(using_connection=connection):
+    if using_connection.vendor != "sqlite":
+        return
+    with using_connection.cursor() as cursor:
+        for statement in CREATE_TRIGGERS:
+            cursor.execute(statement)
+
+
+def match_expression(query):
+    """
+    Turn free text into a safe FTS5 query: every word must match, and the last
+    one may be a prefix (so results appear while a word is still being typed).
+    """
+    words = re.findall(r"\w+", query or "")
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_listings(query, category=None, min_price=None, max_price=None, active_only=True, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return a KeysetPage of listings matching `query`, best match first.
+    `category` is a category name; prices are inclusive bounds.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return KeysetPage([], None)
+    if connection.vendor != "sqlite":
+        return _search_without_fts(query, category, min_price, max_price, active_only, cursor, page_size)
+
+    where = [f"{FTS_TABLE} MATCH %s"]
+    params = [expression]
+    if active_only:
+        where.append("l.is_active")
+    if category:
+        where.append("l.category_id IN (SELECT id FROM auctions_categories WHERE category_name = %s)")
+        params.append(category)
+    if min_price is not None:
+        where.append("l.price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("l.price <= %s")
+        params.append(max_price)
+    values = decode_cursor(cursor, 2)
+    if values is not None:
+        try:
+            score, last_id = float(values[0]), int(values[1])
+        except (TypeError, ValueError):
+            pass
+        else:
+            where.append(f"(-{BM25} < %s OR (-{BM25} = %s AND l.id < %s))")
+            params += [score, score, last_id]
+
+    sql = (
+        f"SELECT l.*, -{BM25} AS score FROM {FTS_TABLE} JOIN auctions_listings l ON l.id = {FTS_TABLE}.rowid "
+        f"WHERE {' AND '.join(where)} ORDER BY score DESC, l.id DESC LIMIT %s"
+    )
+    rows = list(Listings.objects.raw(sql, params + [page_size + 1]))
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1].score, rows[-1].id])
+    return KeysetPage(rows, next_cursor)
+
+
+def naive_search(query, category=None, min_price=None, max_price=None, active_only=True):
+    """The unindexed icontains filter that search_listings replaces (kept as the benchmark baseline)."""
+    listings = Listings.objects.all()
+    for word in re.findall(r"\w+", query or ""):
+        listings = listings.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    if active_only:
+        listings = listings.filter(is_active=True)
+    if category:
+        listings = listings.filter(category__category_name=category)
+    if min_price is not None:
+        listings = listings.filter(price__gte=min_price)
+    if max_price is not None:
+        listings = listings.filter(price__lte=max_price)
+    return listings
+
+
+def _search_without_fts(query, category, min_price, max_price, active_only, cursor, page_size):
+    return paginate(naive_search(query, category, min_price, max_price, active_only), cursor, page_size)
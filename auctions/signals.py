@@ -0,0 +1,148 @@
+"""
+Signal receivers that keep listing versions, category statistics, watcher
+counts and hotness, cached watchlists and users, and the search index in
+step with the database, push new bids to live listing watchers, and tune
+new database connections.
+"""
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import directory, ranking, watchlists
+from .accounts import users
+from .db import apply_sqlite_pragmas
+from .models import Bids, Categories, Comments, Listings, User
+from .pubsub import get_broker, listing_channel
+from .search import FTS_TABLE, install_triggers
+
+
+@receiver([post_save, post_delete], sender=Comments)
+def comment_changed(sender, instance, created=False, **kwargs):
+    if created:
+        ranking.comment_added(instance.listing_id)
+    else:
+        Listings.bump_version(instance.listing_id)
+
+
+@receiver([post_save, post_delete], sender=Bids)
+def bid_changed(sender, instance, raw=False, **kwargs):
+    # Bids placed through auctions.bidding bump the version in the same UPDATE that accepts them
+    if raw or getattr(instance, "_version_bumped", False):
+        return
+    Listings.bump_version(instance.listing_id)
+
+
+@receiver(pre_save, sender=Listings)
+def remember_listing_stats(sender, instance, **kwargs):
+    # What the stored row counted towards, which may differ from this (possibly stale) instance
+    stored = (
+        None if instance._state.adding
+        else Listings.objects.filter(pk=instance.pk).values_list("category_id", "is_active", "price", "photo").first()
+    )
+    instance._stored_stats = stored and stored[:3]
+    if stored and stored[3] != instance.photo:
+        # A new photo needs new thumbnails (see auctions.thumbnails)
+        instance.thumbnail = ""
+
+
+@receiver(post_save, sender=Listings)
+def update_category_stats(sender, instance, raw=False, **kwargs):
+    """Saves of single listings (new listings, admin edits); bulk paths call auctions.directory themselves."""
+    if raw:
+        return
+    before = getattr(instance, "_stored_stats", None)
+    category_id, is_active, price = after = (instance.category_id, instance.is_active, instance.price)
+    if before == after:
+        return
+    if before and before[1] and is_active and before[0] == category_id:
+        directory.prices_changed(Q(pk=category_id))
+        return
+    if before and before[1]:
+        directory.listings_removed([before[0]])
+    if is_active:
+        directory.listing_added(category_id, price)
+
+
+@receiver(post_delete, sender=Listings)
+def listing_deleted(sender, instance, **kwargs):
+    if instance.is_active:
+        directory.listings_removed([instance.category_id])
+
+
+@receiver([post_save, post_delete], sender=Categories)
+def category_changed(sender, **kwargs):
+    directory.directory_changed()
+
+
+@receiver(m2m_changed, sender=Listings.watchlist.through)
+def watchlist_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # user.watchlist_items changed: only that user's watchlist
+        if action in ("post_add", "post_remove", "post_clear"):
+            watchlists.forget([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        watchlists.forget(pk_set)
+    elif action == "pre_clear":
+        # listing.watchlist.clear() doesn't say whose watchlists it emptied
+        watchlists.forget(instance.watchlist.values_list("pk", flat=True))
+    watch_counts_changed(instance, action, reverse, pk_set)
+
+
+def watch_counts_changed(instance, action, reverse, pk_set):
+    """
+    Watcher counts (see auctions.ranking). post_add's pk_set holds only the
+    newly added rows, but pre_remove's holds whatever was asked for, so
+    removals count what is actually there before it goes.
+    """
+    Watch = Listings.watchlist.through
+    if reverse:
+        # A user's watchlist: pk_set holds listings
+        if action == "post_add":
+            ranking.watchers_added(pk_set)
+        elif action in ("pre_remove", "pre_clear"):
+            watched = Watch.objects.filter(user_id=instance.pk)
+            if action == "pre_remove":
+                watched = watched.filter(listings_id__in=pk_set)
+            ranking.watchers_removed(list(watched.values_list("listings_id", flat=True)))
+    elif action == "post_add":
+        ranking.watchers_added([instance.pk], len(pk_set))
+    elif action == "pre_remove":
+        ranking.watchers_removed([instance.pk], Watch.objects.filter(listings_id=instance.pk, user_id__in=pk_set).count())
+    elif action == "post_clear":
+        Listings.objects.filter(pk=instance.pk).update(watch_count=0)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    users.forget(instance.pk)
+
+
+@receiver(post_save, sender=Bids)
+def bid_placed(sender, instance, created, **kwargs):
+    if not created:
+        return
+    message = {
+        "listing": instance.listing_id,
+        "price": str(instance.bid_amount),
+        "high_bidder": instance.bidder.username if instance.bidder_id else None,
+        "bid_date": instance.bid_date.isoformat(),
+    }
+    # Only tell watchers once the bid is committed and visible to everyone else
+    transaction.on_commit(lambda: get_broker().publish(listing_channel(instance.listing_id), message))
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    """SQLite table rebuilds in later migrations drop the FTS triggers; put them back."""
+    if sender.name != "auctions":
+        return
+    connection = connections[using]
+    if FTS_TABLE in connection.introspection.table_names():
+        install_triggers(connection)
+
+
+@receiver(connection_created)
+def tune_connection(sender, connection, **kwargs):
+    apply_sqlite_pragmas(connection)
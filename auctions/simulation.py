@@ -0,0 +1,57 @@
+"""
+Deterministic replays of a competitive auction, by hand and with proxy bids.
+
+bid_stream() draws each bidder's valuation (the most they will pay) and the
+order they turn up in from a seed. Then:
+- replay_manual: bidders keep coming back in that order, each outbidding
+  the leader by `step` until the price passes their valuation
+- replay_proxy: each bidder sets their valuation as a maximum, once
+
+Both go through auctions.bidding against a real listing. Each reports the
+bid requests made, the Bids rows written, and the final price and winner.
+Used by the simulate_bidding command and the tests.
+"""
+import random
+from collections import namedtuple
+from decimal import Decimal
+
+from .bidding import CENT, place_bid, place_max_bid
+from .models import Bids, Listings
+
+Replay = namedtuple("Replay", ["requests", "rows", "price", "winner"])
+
+
+def bid_stream(seed, bidders, start_price, spread=Decimal("20.00")):
+    """[(bidder index, valuation)] in arrival order; valuations lie within `spread` above `start_price`."""
+    rng = random.Random(seed)
+    cents = int(spread * 100)
+    valuations = [start_price + Decimal(rng.randrange(1, cents + 1)) / 100 for _ in range(bidders)]
+    order = list(range(bidders))
+    rng.shuffle(order)
+    return [(index, valuations[index]) for index in order]
+
+
+def _outcome(listing_id, requests):
+    price, winner = Listings.objects.filter(pk=listing_id).values_list("price", "high_bidder").get()
+    return Replay(requests, Bids.objects.filter(listing_id=listing_id).count(), price, winner)
+
+
+def replay_manual(listing_id, users, stream, step=CENT):
+    price = Listings.objects.filter(pk=listing_id).values_list("price", flat=True).get()
+    leader, requests, bidding = None, 0, True
+    while bidding:
+        bidding = False
+        for index, valuation in stream:
+            amount = price + step
+            if index == leader or amount > valuation:
+                continue
+            requests += 1
+            if place_bid(listing_id, users[index], amount).accepted:
+                price, leader, bidding = amount, index, True
+    return _outcome(listing_id, requests)
+
+
+def replay_proxy(listing_id, users, stream):
+    for index, valuation in stream:
+        place_max_bid(listing_id, users[index], valuation)
+    return _outcome(listing_id, len(stream))
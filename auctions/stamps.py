@@ -0,0 +1,34 @@
+"""
+Version stamps in the database, for data each process caches for itself.
+
+The default cache is per process, so deleting a cache entry only reaches
+the process that made the change. Instead, whatever caches something keeps
+it under its stamp's current value, read from the Stamps table (one primary
+key lookup), and every change bumps the stamp in the same transaction. Every
+process sees the new stamp as soon as the change commits, and its copy under
+the old stamp is simply never asked for again.
+"""
+import random
+
+from .models import Stamps
+
+
+def read(key):
+    """The current version of `key`; 0 until it is first bumped."""
+    return Stamps.objects.filter(key=key).values_list("version", flat=True).first() or 0
+
+
+def bump(keys):
+    """
+    Give every key in `keys` a new version; one UPDATE once they all have a
+    row. Versions are random rather than counted, so one rolled back with
+    its transaction can't come round again for a different change.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    stamps = Stamps.objects.filter(key__in=keys)
+    if stamps.update(version=random.getrandbits(63)) < len(keys):
+        # A key's first change. Bumping the others twice does no harm: a stamp only has to move
+        Stamps.objects.bulk_create((Stamps(key=key) for key in keys), ignore_conflicts=True)
+        stamps.update(version=random.getrandbits(63))
@@ -0,0 +1,189 @@
+"""
+Static files with hashed names, precompressed, served without Django.
+
+CompressedManifestStaticFilesStorage is ManifestStaticFilesStorage (every
+file collected under a name containing a hash of its contents, and
+{% static %} pointing at those names) that also writes a .gz and, if the
+brotli package is installed, a .br copy of each text file at collectstatic
+time. No request ever spends time compressing.
+
+CompressedStaticFiles wraps the WSGI application (see commerce/wsgi.py), and
+ASGICompressedStaticFiles the ASGI one (commerce/asgi.py). Each indexes
+STATIC_ROOT once at startup and answers requests under STATIC_URL straight
+from that index, before Django's request handling, middleware or database
+connection get involved. It picks the best precompressed variant
+the client accepts, and answers If-None-Match with a 304. Hashed names never
+change content, so they are sent with "Cache-Control: immutable" and a
+repeat visitor doesn't ask for them again. Anything else under STATIC_URL
+gets a short max-age.
+"""
+import asyncio
+import gzip
+import json
+import mimetypes
+import os
+from http import HTTPStatus
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (".css", ".js", ".mjs", ".svg", ".json", ".map", ".txt", ".xml", ".html")
+# Best first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+SHORT_LIVED = "public, max-age=60"
+CHUNK_SIZE = 64 * 1024
+
+
+def _compress(path):
+    """Write the .gz (and .br) variants of `path` where they are meaningfully smaller."""
+    with open(path, "rb") as f:
+        data = f.read()
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                _compress(self.path(name))
+
+
+class StaticFile:
+    __slots__ = ("path", "size", "etag", "content_type", "cache_control", "variants")
+
+    def __init__(self, path, cache_control):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.cache_control = cache_control
+        # encoding -> (path, size)
+        self.variants = {
+            encoding: (path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)
+        }
+
+
+def accepted_encodings(header):
+    """The content codings an Accept-Encoding header allows."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip("0.") == "":
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressedStaticFiles:
+    """WSGI middleware serving the files collected in STATIC_ROOT."""
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = self.scan()
+
+    def scan(self):
+        if not self.root or not os.path.isdir(self.root):
+            return {}
+        try:
+            with open(os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)) as f:
+                hashed = set(json.load(f)["paths"].values())
+        except (OSError, ValueError, KeyError):
+            hashed = set()
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if name.endswith(suffixes) and os.path.exists(path.rsplit(".", 1)[0]):
+                    continue  # A variant of another file
+                files[relative] = StaticFile(path, IMMUTABLE if relative in hashed else SHORT_LIVED)
+        return files
+
+    def lookup(self, path):
+        """The StaticFile a request path names, or None if it's not one of ours."""
+        if not path.startswith(self.prefix):
+            return None
+        return self.files.get(path[len(self.prefix):])
+
+    def respond(self, file, method, accept_encoding, if_none_match):
+        """(status, headers, path of the body or None) for a request for `file`."""
+        if method not in ("GET", "HEAD"):
+            return 405, [("Allow", "GET, HEAD"), ("Content-Length", "0")], None
+        headers = [("Cache-Control", file.cache_control), ("Vary", "Accept-Encoding")]
+        accepted = accepted_encodings(accept_encoding)
+        encoding = next((encoding for encoding in file.variants if encoding in accepted), None)
+        body, size = file.variants[encoding] if encoding else (file.path, file.size)
+        # Each encoding is a different representation, with its own tag
+        etag = file.etag[:-1] + (f"-{encoding}" if encoding else "") + '"'
+        headers.append(("ETag", etag))
+        if etag in if_none_match:
+            return 304, headers, None
+        headers += [("Content-Type", file.content_type), ("Content-Length", str(size))]
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+        return 200, headers, None if method == "HEAD" else body
+
+    def __call__(self, environ, start_response):
+        file = self.lookup(environ.get("PATH_INFO", ""))
+        if file is None:
+            return self.application(environ, start_response)
+        status, headers, body = self.respond(
+            file, environ["REQUEST_METHOD"], environ.get("HTTP_ACCEPT_ENCODING", ""), environ.get("HTTP_IF_NONE_MATCH", ""),
+        )
+        start_response(f"{status} {HTTPStatus(status).phrase}", headers)
+        if body is None:
+            return []
+        return environ.get("wsgi.file_wrapper", FileWrapper)(open(body, "rb"))
+
+
+class ASGICompressedStaticFiles(CompressedStaticFiles):
+    """The same, as ASGI middleware (see commerce/asgi.py)."""
+
+    async def __call__(self, scope, receive, send):
+        file = self.lookup(scope["path"]) if scope["type"] == "http" else None
+        if file is None:
+            return await self.application(scope, receive, send)
+        request_headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        status, headers, body = self.respond(
+            file, scope["method"], request_headers.get("accept-encoding", ""), request_headers.get("if-none-match", ""),
+        )
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        if body is None:
+            return await send({"type": "http.response.body"})
+        with open(body, "rb") as f:
+            while True:
+                # Off the event loop: a slow disk shouldn't hold up other requests
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
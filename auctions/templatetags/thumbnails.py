@@ -0,0 +1,36 @@
+from django import template
+
+from ..thumbnails import SIZES, thumbnail_url
+
+register = template.Library()
+
+
+def photo_context(listing, width, css_class="", lazy=True):
+    """The context for auctions/_photo.html; shared with the Jinja2 templates (see auctions.jinja)."""
+    context = {
+        "listing": listing,
+        "width": width,
+        "height": width * SIZES[0][1] // SIZES[0][0],
+        "css_class": css_class,
+        "loading": "lazy" if lazy else "eager",
+    }
+    if listing.thumbnail:
+        def srcset(extension):
+            return ", ".join(f"{thumbnail_url(listing.thumbnail, w, extension)} {w}w" for w, _ in SIZES)
+        context.update(
+            webp_srcset=srcset("webp"),
+            jpeg_srcset=srcset("jpg"),
+            # The smallest variant that still fills the box, for browsers without srcset
+            src=thumbnail_url(listing.thumbnail, next((w for w, _ in SIZES if w >= width), SIZES[-1][0]), "jpg"),
+        )
+    return context
+
+
+@register.inclusion_tag("auctions/_photo.html")
+def listing_photo(listing, width, css_class="", lazy=True):
+    """
+    A listing's photo shown `width` CSS pixels wide, from its thumbnails once
+    they are built (the browser picks the variant from the srcset), otherwise
+    from the original URL. Both are loaded lazily unless `lazy` is False.
+    """
+    return photo_context(listing, width, css_class, lazy)
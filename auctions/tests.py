@@ -1,3 +1,1585 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import resource
+import tempfile
+import threading
+import urllib.request
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.templatetags.static import static
+from django.db import connection
+from django.http import HttpResponse
+from django.template import engines
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image
+
+from . import accounts, archive, async_views, db, exports, imports, perf, ranking, staticfiles, thumbnails, views
+from .bidding import ACCEPTED, INVALID, OUTBID, OVERTAKEN, increment, place_bid, place_max_bid
+from .closing import close_due_listings, close_listings
+from .directory import category_directory, directory_changed, price_raised, rebuild_category_stats
+from .forms import CreateListingForm
+from . import loaders
+from .loaders import active_listings
+from .models import (
+    ArchivedComments, ArchivedListings, User, Categories, Bids, Listings, Comments, OutboxEvents, Photos, ProxyBids, Rankings,
+)
+from .notifications import deliver_pending
+from .pagination import PAGE_SIZE, after, decode_cursor, encode_cursor
+from .pubsub import LocalBroker
+from .search import search_listings
+from .simulation import bid_stream, replay_manual, replay_proxy
+from .staticfiles import CompressedStaticFiles
+from .watchlists import Watch, add_to_watchlist, is_watching, remove_from_watchlist, watched_ids
+
+
+def make_listings(owner, count, category=None, **kwargs):
+    listings = Listings.objects.bulk_create(
+        Listings(title=f"Item {i}", description="", price=Decimal("1.00"), owner=owner, category=category, **kwargs)
+        for i in range(count)
+    )
+    if category:
+        rebuild_category_stats([category.pk])
+    return listings
+
+
+class IndexFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.categories = Categories.objects.bulk_create(Categories(category_name=f"Cat {i}") for i in range(30))
+        for category in cls.categories:
+            make_listings(cls.seller, 2, category=category)
+        make_listings(cls.seller, 5, is_active=False)
+
+    def test_query_count_does_not_depend_on_categories(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_pages_cover_every_active_listing_once(self):
+        seen = []
+        cursor = ""
+        while True:
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse("index"), {"cursor": cursor})
+            page = response.context["page"]
+            seen.extend(listing.id for listing in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        active = Listings.objects.filter(is_active=True).order_by("-publication_date", "-id")
+        self.assertEqual(seen, list(active.values_list("id", flat=True)))
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse("index"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page"]), 20)
+
+    def test_cursor_with_bad_values_falls_back_to_first_page(self):
+        cursor = encode_cursor(["garbage", "x"])
+        for name in ("index", "trending", "most_watched", "ending_soon", "api_listings"):
+            self.assertEqual(self.client.get(reverse(name), {"cursor": cursor}).status_code, 200)
+        category = reverse("category", args=[self.categories[0].category_name])
+        self.assertEqual(self.client.get(category, {"cursor": cursor}).status_code, 200)
+
+    def test_cursor_round_trip(self):
+        listing = Listings.objects.first()
+        values = [listing.publication_date, listing.id]
+        self.assertEqual(decode_cursor(encode_cursor(values), 2), [listing.publication_date.isoformat(), str(listing.id)])
+        fields = [Listings._meta.get_field("publication_date"), Listings._meta.get_field("id")]
+        self.assertEqual(decode_cursor(encode_cursor(values), 2, fields), values)
+
+
+class BidServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pass")
+        cls.listing = Listings.objects.create(title="Lamp", price=Decimal("10.00"), owner=cls.seller)
+
+    def test_higher_bid_is_accepted_and_recorded(self):
+        result = place_bid(self.listing.id, self.bidder, "12.50")
+        self.assertTrue(result.accepted)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.price, Decimal("12.50"))
+        self.assertEqual(Bids.objects.get().bid_amount, Decimal("12.50"))
+
+    def test_equal_or_lower_bid_is_outbid(self):
+        for amount in ("10.00", "9.99"):
+            self.assertEqual(place_bid(self.listing.id, self.bidder, amount).status, OUTBID)
+        self.assertFalse(Bids.objects.exists())
+
+    def test_closed_listing_rejects_bids(self):
+        Listings.objects.filter(pk=self.listing.pk).update(is_active=False)
+        self.assertFalse(place_bid(self.listing.id, self.bidder, "50").accepted)
+
+    def test_invalid_amounts(self):
+        for amount in ("", "abc", "-1", "0", "nan", "inf", "1000000"):
+            self.assertEqual(place_bid(self.listing.id, self.bidder, amount).status, INVALID)
+
+    def test_each_write_bumps_the_version_once(self):
+        version = Listings.objects.get(pk=self.listing.pk).version
+        place_bid(self.listing.id, self.bidder, "12.50")
+        self.assertEqual(Listings.objects.get(pk=self.listing.pk).version, version + 1)
+        # Bids written without auctions.bidding (admin, shell) still bump it
+        bid = Bids.objects.create(bid_amount=Decimal("13.00"), bidder=self.bidder, listing=self.listing)
+        bid.delete()
+        self.assertEqual(Listings.objects.get(pk=self.listing.pk).version, version + 3)
+        # Saving a stale instance bumps the stored version rather than its own
+        self.listing.save()
+        self.assertEqual(self.listing.version, version + 4)
+
+    def test_bid_is_rounded_to_pennies(self):
+        self.assertEqual(place_bid(self.listing.id, self.bidder, "10.005").amount, Decimal("10.01"))
+
+    def test_bid_view_reports_outbid(self):
+        self.client.force_login(self.bidder)
+        response = self.client.post(reverse("bid", args=[self.listing.id]), {"up_bid": "5"}, follow=True)
+        self.assertContains(response, "Your bid must be higher than the current price.")
+
+
+class BidStatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        cls.listing = Listings.objects.create(title="Clock", price=Decimal("5.00"), owner=cls.seller)
+
+    def test_bid_updates_statistics(self):
+        place_bid(self.listing.id, self.alice, "6")
+        place_bid(self.listing.id, self.bob, "7")
+        place_bid(self.listing.id, self.alice, "6.50")  # outbid, must not count
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.high_bidder, self.bob)
+        self.assertEqual(self.listing.last_bid_at, Bids.objects.latest("bid_date").bid_date)
+
+    def test_closing_uses_high_bidder_without_touching_bids(self):
+        place_bid(self.listing.id, self.alice, "6")
+        self.client.force_login(self.seller)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("closed_listing", args=[self.listing.id]))
+        self.assertFalse(any("auctions_bids" in query["sql"] for query in queries))
+        self.listing.refresh_from_db()
+        self.assertFalse(self.listing.is_active)
+        self.assertEqual(self.listing.owner, self.alice)
+
+    def test_rebuild_and_verify_command(self):
+        place_bid(self.listing.id, self.alice, "6")
+        place_bid(self.listing.id, self.bob, "8")
+        call_command("rebuild_bid_stats", "--verify", stdout=StringIO())
+        Listings.objects.update(bid_count=0, high_bidder=None, last_bid_at=None)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_bid_stats", "--verify", stdout=StringIO())
+        call_command("rebuild_bid_stats", "--batch-size", "1", stdout=StringIO())
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.bid_count, self.listing.high_bidder), (2, self.bob))
+        call_command("rebuild_bid_stats", "--verify", stdout=StringIO())
+
+
+class AuctionExpiryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pass")
+        now = timezone.now()
+        cls.sold = Listings.objects.create(title="Sold", owner=cls.seller, ends_at=now + timedelta(hours=1))
+        cls.unsold = Listings.objects.create(title="Unsold", owner=cls.seller, ends_at=now - timedelta(hours=1))
+        cls.running = Listings.objects.create(title="Running", owner=cls.seller, ends_at=now + timedelta(days=1))
+        cls.open_ended = Listings.objects.create(title="Open ended", owner=cls.seller)
+
+    def test_due_auctions_are_closed_once_with_winners(self):
+        place_bid(self.sold.id, self.bidder, "3")
+        later = timezone.now() + timedelta(hours=2)
+        # fetch a batch; read its categories, close it, queue the winner (in a savepoint),
+        # move the directory stamp on; find nothing more
+        with self.assertNumQueries(9):
+            self.assertEqual(close_due_listings(now=later, batch_size=10), 2)
+        self.assertEqual(close_due_listings(now=later), 0)
+        active = dict(Listings.objects.values_list("title", "is_active"))
+        self.assertEqual(active, {"Sold": False, "Unsold": False, "Running": True, "Open ended": True})
+        self.assertEqual(Listings.objects.get(pk=self.sold.pk).owner, self.bidder)
+        self.assertEqual(Listings.objects.get(pk=self.unsold.pk).owner, self.seller)
+
+    def test_bids_after_end_time_are_rejected(self):
+        self.assertFalse(place_bid(self.unsold.id, self.bidder, "3").accepted)
+
+    def test_worker_command_runs_a_single_pass(self):
+        out = StringIO()
+        call_command("close_auctions", "--once", stdout=out)
+        self.assertIn("Closed 1 auction(s)", out.getvalue())
+
+    def test_new_listing_duration_sets_end_time(self):
+        self.client.force_login(self.seller)
+        self.client.post(reverse("new_listing"), {"title": "Vase", "description": "Blue", "starting_bid": "4", "duration": "3"})
+        ends_at = Listings.objects.get(title="Vase").ends_at
+        self.assertAlmostEqual(ends_at, timezone.now() + timedelta(days=3), delta=timedelta(minutes=1))
+
+
+class ListingPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.viewer = User.objects.create_user("viewer", "viewer@example.com", "pass")
+        cls.listing = Listings.objects.create(title="Kettle", price=Decimal("2.00"), owner=cls.seller)
+        Comments.objects.bulk_create(Comments(user=cls.viewer, listing=cls.listing, content=f"Comment {i}") for i in range(5))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_page_skips_listing_children(self):
+        url = reverse("listing", args=[self.listing.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, "Comment 4")
+        self.assertEqual(len(queries), 1)
+
+    def test_comments_and_bids_invalidate_fragments(self):
+        url = reverse("listing", args=[self.listing.id])
+        self.client.get(url)
+        Comments.objects.create(user=self.viewer, listing=self.listing, content="Fresh comment")
+        self.assertContains(self.client.get(url), "Fresh comment")
+        place_bid(self.listing.id, self.viewer, "9.00")
+        self.assertContains(self.client.get(url), "£ 9.00")
+
+    def test_per_user_state_is_not_cached(self):
+        url = reverse("listing", args=[self.listing.id])
+        self.client.force_login(self.seller)
+        self.assertContains(self.client.get(url), "End Auction")
+        self.client.force_login(self.viewer)
+        response = self.client.get(url)
+        self.assertNotContains(response, "End Auction")
+        self.assertContains(response, "Add to Watchlist")
+        self.listing.watchlist.add(self.viewer)
+        self.assertContains(self.client.get(url), "Remove from Watchlist")
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.lighting = Categories.objects.create(category_name="Lighting")
+        cls.brass = Listings.objects.create(title="Brass lamp", description="Desk lamp", price=Decimal("30"), owner=cls.seller, category=cls.lighting)
+        cls.cheap = Listings.objects.create(title="Paper lamp", description="Shade", price=Decimal("5"), owner=cls.seller, category=cls.lighting)
+        cls.closed = Listings.objects.create(title="Old lamp", description="", price=Decimal("10"), owner=cls.seller, is_active=False)
+        cls.mention = Listings.objects.create(title="Table", description="Comes with a lamp", price=Decimal("50"), owner=cls.seller)
+
+    def ids(self, page):
+        return [listing.id for listing in page]
+
+    def test_title_matches_rank_above_description_matches(self):
+        results = self.ids(search_listings("lamp"))
+        self.assertEqual(set(results), {self.brass.id, self.cheap.id, self.mention.id})
+        self.assertEqual(results[-1], self.mention.id)
+
+    def test_filters(self):
+        self.assertEqual(self.ids(search_listings("lamp", category="Lighting", min_price=Decimal("10"))), [self.brass.id])
+        self.assertEqual(self.ids(search_listings("lamp", max_price=Decimal("6"))), [self.cheap.id])
+        self.assertIn(self.closed.id, self.ids(search_listings("lamp", active_only=False)))
+
+    def test_index_follows_updates_and_deletes(self):
+        Listings.objects.filter(pk=self.cheap.pk).update(title="Paper kite")
+        self.assertEqual(self.ids(search_listings("kite")), [self.cheap.id])
+        self.cheap.delete()
+        self.assertEqual(self.ids(search_listings("kite")), [])
+
+    def test_cursor_pagination_and_prefix_match(self):
+        first = search_listings("la", page_size=2)
+        second = search_listings("la", page_size=2, cursor=first.next_cursor)
+        self.assertFalse(second.has_next)
+        self.assertEqual(len(set(self.ids(first)) | set(self.ids(second))), 3)
+
+    def test_search_view_ignores_fts_syntax(self):
+        response = self.client.get(reverse("search"), {"q": 'lamp") *(', "min_price": "20", "max_price": "40"})
+        self.assertEqual([listing.id for listing in response.context["listings"]], [self.brass.id])
+
+
+class SeedAndLoadTests(TestCase):
+    def test_seed_is_consistent_and_deterministic(self):
+        options = ["--users", "20", "--listings", "30", "--batch-size", "7", "--skew", "2"]
+        call_command("seed_auctions", *options, stdout=StringIO())
+        self.assertEqual(Listings.objects.count(), 30)
+        call_command("rebuild_bid_stats", "--verify", stdout=StringIO())
+        first = list(Bids.objects.order_by("id").values_list("bid_amount", flat=True))
+        with self.assertRaises(CommandError):
+            call_command("seed_auctions", *options, stdout=StringIO())
+        Listings.objects.all().delete()
+        User.objects.all().delete()
+        call_command("seed_auctions", *options, stdout=StringIO())
+        self.assertEqual(list(Bids.objects.order_by("id").values_list("bid_amount", flat=True)), first)
+
+    def test_load_test_reports_per_url_stats(self):
+        call_command("seed_auctions", "--users", "10", "--listings", "20", "--closed", "0", stdout=StringIO())
+        out = StringIO()
+        call_command("load_test", "--requests", "40", "--users", "3", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(sum(url["count"] for url in report["urls"].values()), 40)
+        for stats in report["urls"].values():
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+
+
+class PerfMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "pass", is_staff=True)
+        cls.categories = Categories.objects.bulk_create(Categories(category_name=f"Cat {i}") for i in range(3))
+
+    def setUp(self):
+        perf.buffer.clear()
+
+    def record_n_plus_one(self):
+        """Push a request that repeats one statement per category through the middleware."""
+        def view(request):
+            for category in Categories.objects.all():
+                list(category.listings.all())
+            return HttpResponse()
+        perf.PerfMiddleware(view)(RequestFactory().get("/"))
+
+    def test_records_queries_and_templates(self):
+        self.client.get(reverse("categories"))
+        record = perf.buffer[-1]
+        self.assertEqual(record.url_name, "categories")
+        self.assertGreater(record.template_ms, 0)
+        self.assertEqual((record.queries, record.duplicates), (3, 0))
+
+    def test_records_repeated_statements(self):
+        self.record_n_plus_one()
+        record = perf.buffer[-1]
+        self.assertEqual((record.queries, record.duplicates), (4, 2))
+        self.assertIn("auctions_listings", record.worst_sql)
+
+    def test_perf_page_is_staff_only(self):
+        self.record_n_plus_one()
+        self.assertEqual(self.client.get(reverse("perf")).status_code, 302)
+        self.client.force_login(self.staff)
+        summary = self.client.get(reverse("perf"), {"format": "json"}).json()
+        self.assertEqual(summary["n_plus_one"][0]["view"], "<unresolved>")
+        self.assertContains(self.client.get(reverse("perf")), "Slowest views")
+        for top in ("abc", "0", "-3"):
+            self.assertEqual(self.client.get(reverse("perf"), {"top": top}).status_code, 400)
+
+    def test_report_command_reads_snapshots(self):
+        self.record_n_plus_one()
+        with tempfile.TemporaryDirectory() as directory:
+            perf.write_snapshot(directory)
+            out = StringIO()
+            call_command("perf_report", "--dir", directory, stdout=out)
+        self.assertIn("<unresolved>", out.getvalue())
+        self.assertIn("2 repeats", out.getvalue())
+
+    @override_settings(AUCTIONS_PERF_ENABLED=False)
+    def test_can_be_switched_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            perf.PerfMiddleware(lambda request: None)
+
+
+class ConstantQueryPageTests(TestCase):
+    """Page query counts must not grow with the amount of data behind them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+
+    def setUp(self):
+        cache.clear()
+
+    def add_data(self, n):
+        categories = Categories.objects.bulk_create(Categories(category_name=f"Cat {n}-{i}") for i in range(n))
+        listings = []
+        for category in categories:
+            listings += make_listings(self.seller, n, category=category)
+            listings += make_listings(self.buyer, 1, category=category, is_active=False)
+        for listing in listings:
+            listing.watchlist.add(self.buyer)
+            Comments.objects.create(user=self.buyer, listing=listing, content="Hello")
+        return categories[0], listings[0], listings[-1]
+
+    def assertConstantQueries(self, url, num, user=None):
+        if user:
+            self.client.force_login(user)
+            # Signed-in pages then find the user in auctions.accounts.users
+            self.client.get(reverse("categories"))
+        for n in (1, 4):
+            category, listing, closed = self.add_data(n)
+            cache.clear()
+            # bulk_create skips the signals that would move the directory on
+            directory_changed()
+            with self.assertNumQueries(num):
+                self.client.get(url(category, listing, closed))
+
+    def test_categories(self):
+        # directory stamp + category directory (categories + previews, cold)
+        self.assertConstantQueries(lambda category, listing, closed: reverse("categories"), 3)
+
+    def test_category(self):
+        # directory stamp + category directory (categories + previews, cold) + listings
+        self.assertConstantQueries(lambda category, listing, closed: reverse("category", args=[category.category_name]), 4)
+
+    def test_watchlist(self):
+        # session + listings
+        self.assertConstantQueries(lambda category, listing, closed: reverse("watchlist"), 2, user=self.buyer)
+
+    def test_user_profile(self):
+        # session + closed, archived and active listings
+        self.assertConstantQueries(lambda category, listing, closed: reverse("user_profile"), 4, user=self.seller)
+
+    def test_listing(self):
+        # session + listing + watchlist stamp + watchlist ids + first bid page + first comment page
+        self.assertConstantQueries(lambda category, listing, closed: reverse("listing", args=[listing.id]), 6, user=self.buyer)
+
+    def test_closed_listing(self):
+        # listing + first bid page + first comment page
+        self.assertConstantQueries(lambda category, listing, closed: reverse("closed_listing", args=[closed.id]), 3)
+
+
+class JsonApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        cls.books = Categories.objects.create(category_name="Books")
+        cls.listing = Listings.objects.create(title="Atlas", price=Decimal("3.00"), owner=cls.seller, category=cls.books)
+        make_listings(cls.seller, 3, category=cls.books)
+        Comments.objects.create(user=cls.buyer, listing=cls.listing, content="Which edition?")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_listing_detail_and_revalidation(self):
+        url = reverse("api_listing", args=[self.listing.id])
+        place_bid(self.listing.id, self.buyer, "4")
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual((data["title"], data["category"], data["price"]), ("Atlas", "Books", "4.00"))
+        self.assertEqual(data["bids"][0]["bidder_name"], "buyer")
+        self.assertEqual(data["comments"][0]["content"], "Which edition?")
+
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(any("auctions_bids" in q["sql"] or "auctions_comments" in q["sql"] for q in queries))
+
+        Comments.objects.create(user=self.buyer, listing=self.listing, content="First, thanks")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_and_categories(self):
+        feed = self.client.get(reverse("api_listings"))
+        self.assertEqual(len(feed.json()["results"]), 4)
+        self.assertEqual(self.client.get(reverse("api_listings"), HTTP_IF_NONE_MATCH=feed["ETag"]).status_code, 304)
+        categories = self.client.get(reverse("api_categories")).json()["results"]
+        self.assertEqual(categories, [{"id": self.books.id, "category_name": "Books", "active_count": 4,
+                                       "min_price": "1.00", "max_price": "3.00"}])
+
+    def test_watchlist_requires_login(self):
+        self.assertEqual(self.client.get(reverse("api_watchlist")).status_code, 401)
+        self.listing.watchlist.add(self.buyer)
+        self.client.force_login(self.buyer)
+        results = self.client.get(reverse("api_watchlist")).json()["results"]
+        self.assertEqual([row["id"] for row in results], [self.listing.id])
+
+    def test_missing_listing(self):
+        self.assertEqual(self.client.get(reverse("api_listing", args=[999])).status_code, 404)
+
+
+class ListingThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        cls.listing = Listings.objects.create(title="Clock", price=Decimal("1.00"), owner=cls.seller)
+        Comments.objects.bulk_create(Comments(user=cls.buyer, listing=cls.listing, content=f"Comment {i}") for i in range(45))
+        for amount in range(2, 47):
+            place_bid(cls.listing.id, cls.buyer, amount)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_listing_page_embeds_first_pages_only(self):
+        response = self.client.get(reverse("listing", args=[self.listing.id]))
+        content = response.content.decode()
+        self.assertEqual(content.count('class="comment-content"'), PAGE_SIZE)
+        self.assertEqual(content.count("£46.00</td>"), 1)
+        self.assertEqual(content.count("</td></tr>"), PAGE_SIZE)
+        self.assertIn(reverse("listing_comments", args=[self.listing.id]) + "?cursor=", content)
+        self.assertIn(reverse("listing_bids", args=[self.listing.id]) + "?cursor=", content)
+
+    def test_thread_pages_cover_everything_once(self):
+        for thread, total in (("comments", 45), ("bids", 45)):
+            seen, cursor = [], ""
+            while cursor is not None:
+                response = self.client.get(reverse(f"listing_{thread}", args=[self.listing.id]), {"cursor": cursor})
+                page = response.context[thread]
+                seen += [item.id for item in page]
+                cursor = page.next_cursor
+            self.assertEqual(len(seen), total)
+            self.assertEqual(len(set(seen)), total)
+
+    def test_api_thread_pages(self):
+        data = self.client.get(reverse("api_listing", args=[self.listing.id])).json()
+        self.assertEqual([bid["bid_amount"] for bid in data["bids"][:2]], ["46.00", "45.00"])
+        self.assertIsNone(data["bids_next_cursor"])  # 45 of each fit in one API page
+        bids = self.client.get(reverse("api_listing_bids", args=[self.listing.id])).json()
+        self.assertEqual(bids["results"], data["bids"])
+        self.assertEqual(self.client.get(reverse("api_listing_bids", args=[999])).status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn("TEMP B-TREE", plan)  # i.e. no sort step
+
+    def test_thread_pages_use_their_indexes(self):
+        cursor = encode_cursor([timezone.now(), 10])
+        bids = loaders.listing_bids(1).filter(after(loaders.BID_KEYS, decode_cursor(cursor, 2)))
+        self.assertUsesIndex(bids.order_by("-bid_date", "-id")[:21], "bid_listing_date_idx")
+        comments = loaders.listing_comments(1).filter(after(("publication_date", "id"), decode_cursor(cursor, 2)))
+        self.assertUsesIndex(comments.order_by("-publication_date", "-id")[:21], "comment_thread_idx")
+        self.assertUsesIndex(Bids.objects.filter(listing=1, bid_amount__lt=5).order_by("-bid_amount")[:1], "bid_listing_amount_idx")
+
+    def test_active_feed_uses_partial_index(self):
+        self.assertUsesIndex(active_listings().order_by("-publication_date", "-id")[:21], "listing_active_feed_idx")
+        self.assertUsesIndex(loaders.category_listings(1).order_by("-publication_date", "-id")[:21], "listing_category_feed_idx")
+
+    def test_expiry_scan_uses_partial_index(self):
+        self.assertUsesIndex(Listings.objects.filter(is_active=True, ends_at__lte=timezone.now()).order_by("ends_at"), "listing_expiry_idx")
+
+    def test_feeds_use_partial_indexes(self):
+        cursor = decode_cursor(encode_cursor([2.5, 10]), 2)
+        trending = loaders.trending_listings().filter(after(loaders.TRENDING_KEYS, cursor))
+        self.assertUsesIndex(trending.order_by("-hotness", "-id")[:21], "listing_trending_idx")
+        self.assertUsesIndex(loaders.most_watched_listings().order_by("-watch_count", "-id")[:21], "listing_most_watched_idx")
+        ending = loaders.ending_soon_listings(timezone.now())
+        self.assertUsesIndex(ending.filter(after(loaders.ENDING_SOON_KEYS, [timezone.now(), 10], descending=False)).order_by("ends_at", "id")[:21], "listing_expiry_idx")
+
+
+class CategoryDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pass")
+        cls.lighting = Categories.objects.create(category_name="Lighting")
+        cls.books = Categories.objects.create(category_name="Books")
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, price, category=None):
+        return Listings.objects.create(title="Lamp", price=Decimal(price), owner=self.seller, category=category or self.lighting)
+
+    def assertStats(self, category, active_count, min_price, max_price):
+        category.refresh_from_db()
+        self.assertEqual(
+            (category.active_count, category.min_price, category.max_price),
+            (active_count, min_price and Decimal(min_price), max_price and Decimal(max_price)),
+        )
+
+    def test_statistics_follow_listing_changes(self):
+        cheap, dear = self.create("5.00"), self.create("20.00")
+        self.assertStats(self.lighting, 2, "5.00", "20.00")
+        place_bid(cheap.id, self.bidder, "8.00")
+        self.assertStats(self.lighting, 2, "8.00", "20.00")
+        close_listings([dear.id])
+        self.assertStats(self.lighting, 1, "8.00", "8.00")
+        cheap.refresh_from_db()
+        cheap.category = self.books
+        cheap.save()
+        self.assertStats(self.lighting, 0, None, None)
+        self.assertStats(self.books, 1, "8.00", "8.00")
+        cheap.delete()
+        self.assertStats(self.books, 0, None, None)
+
+    def test_bids_only_write_the_category_when_its_range_moves(self):
+        cheap, middle, dear = self.create("5.00"), self.create("10.00"), self.create("20.00")
+
+        def raise_price(listing, amount):
+            Listings.objects.filter(pk=listing.pk).update(price=Decimal(amount))
+            return price_raised(listing.id, Decimal(amount))
+
+        self.assertEqual(raise_price(middle, "12.00"), 0)
+        self.assertEqual(raise_price(cheap, "6.00"), 1)
+        self.assertEqual(raise_price(dear, "25.00"), 1)
+        self.assertStats(self.lighting, 3, "6.00", "25.00")
+
+    def test_incremental_statistics_match_a_rebuild(self):
+        listings = [self.create(price) for price in ("3.00", "9.50", "1.25")]
+        place_bid(listings[2].id, self.bidder, "4.00")
+        close_listings([listings[1].id])
+        expected = list(Categories.objects.values_list("active_count", "min_price", "max_price"))
+        rebuild_category_stats()
+        self.assertEqual(list(Categories.objects.values_list("active_count", "min_price", "max_price")), expected)
+        call_command("rebuild_category_stats", "--verify", stdout=StringIO())
+
+    def test_warm_directory_only_reads_its_stamp(self):
+        self.create("5.00")
+        self.client.get(reverse("categories"))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("categories"))
+        self.assertContains(response, "1 active, £5.00 to £5.00")
+        # One stamp read each for the field, validating the choice and rendering the choices
+        with self.assertNumQueries(3):
+            form = CreateListingForm(data={"title": "Book", "description": "Old", "starting_bid": "2", "category": self.books.pk})
+            self.assertTrue(form.is_valid())
+            form.as_p()
+        self.assertEqual(form.cleaned_data["category"].pk, self.books.pk)
+        self.assertFalse(CreateListingForm(data={"title": "Book", "description": "Old", "starting_bid": "2", "category": 999}).is_valid())
+
+    def test_changes_invalidate_the_directory(self):
+        self.assertEqual([c.active_count for c in category_directory()], [0, 0])
+        self.create("5.00", category=self.books)
+        self.assertEqual([c.active_count for c in category_directory()], [1, 0])
+        # The stamp is in the database, where every process sees it, not in this process's cache
+        cache.clear()
+        Categories.objects.create(category_name="Art")
+        self.assertEqual([c.category_name for c in category_directory()], ["Art", "Books", "Lighting"])
+
+
+class WatchlistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        cls.listings = make_listings(cls.seller, 5)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.buyer)
+
+    def bulk(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("bulk_watchlist"), data, content_type="application/json")
+
+    def test_bulk_add_and_remove(self):
+        ids = [listing.id for listing in self.listings]
+        response = self.bulk(add=ids[:4] + [999])
+        self.assertEqual(response.json(), {"added": ids[:4], "removed": 0, "count": 4})
+        response = self.bulk(add=[ids[4]], remove=ids[:2])
+        self.assertEqual(response.json(), {"added": [ids[4]], "removed": 2, "count": 3})
+        self.assertEqual(sorted(self.buyer.watchlist_items.values_list("id", flat=True)), ids[2:])
+        self.assertEqual(self.bulk(add="everything").status_code, 400)
+        for pk in (0, -1, 2**32, 2**63):
+            self.assertEqual(self.bulk(remove=[pk]).status_code, 400)
+
+    def test_remove_selected_from_watchlist_page(self):
+        self.listings[0].watchlist.add(self.buyer)
+        response = self.client.post(reverse("bulk_watchlist"), {"remove": [self.listings[0].id]})
+        self.assertRedirects(response, reverse("watchlist"))
+        self.assertFalse(self.buyer.watchlist_items.exists())
+
+    def test_membership_is_cached_and_ignores_other_watchers(self):
+        popular = self.listings[0]
+        others = User.objects.bulk_create(User(username=f"fan{i}") for i in range(500))
+        Watch.objects.bulk_create(Watch(user_id=user.pk, listings_id=popular.pk) for user in others)
+        self.bulk(add=[popular.id])
+        watched_ids(self.buyer)
+        # Only the watchlist stamp, once a call
+        with self.assertNumQueries(2):
+            self.assertTrue(is_watching(self.buyer, popular.id))
+            self.assertFalse(is_watching(self.buyer, self.listings[1].id))
+        self.assertContains(self.client.get(reverse("index")), "Watching", count=1)
+
+    def test_related_manager_changes_invalidate(self):
+        # The stamps are in the database, where every process sees them, not in this process's cache
+        self.assertFalse(is_watching(self.buyer, self.listings[0].id))
+        self.buyer.watchlist_items.add(self.listings[0])
+        self.assertTrue(is_watching(self.buyer, self.listings[0].id))
+        self.listings[0].watchlist.clear()
+        self.assertFalse(is_watching(self.buyer, self.listings[0].id))
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pass")
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        cls.lamp = Listings.objects.create(title="Lamp", price=Decimal("1.00"), owner=cls.seller)
+        cls.vase = Listings.objects.create(title="Vase", price=Decimal("1.00"), owner=cls.seller)
+
+    def inbox(self, user):
+        return [message for message in mail.outbox if message.to == [user.email]]
+
+    def test_outbid_notices_are_coalesced_per_user(self):
+        for listing in (self.lamp, self.vase):
+            place_bid(listing.id, self.alice, "2")
+            place_bid(listing.id, self.bob, "3")
+            place_bid(listing.id, self.bob, "4")  # Raising your own bid outbids nobody
+        place_bid(self.lamp.id, self.alice, "5")
+        place_bid(self.lamp.id, self.bob, "6")
+        self.assertEqual(deliver_pending(), (8, 1))
+        [to_alice] = self.inbox(self.alice)
+        self.assertEqual(to_alice.subject, "2 updates on your auctions")
+        self.assertIn('outbid on "Lamp": the price is now £6.00', to_alice.body)
+        self.assertIn('outbid on "Vase": the price is now £3.00', to_alice.body)
+        self.assertEqual(to_alice.body.count("Lamp"), 1)
+        self.assertEqual(self.inbox(self.bob), [])  # Outbid at £5, but back in the lead
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_no_notice_once_the_lead_is_retaken(self):
+        place_bid(self.lamp.id, self.alice, "2")
+        place_bid(self.lamp.id, self.bob, "3")
+        place_bid(self.lamp.id, self.alice, "4")
+        deliver_pending()
+        self.assertEqual(len(self.inbox(self.alice)), 0)
+        self.assertEqual(len(self.inbox(self.bob)), 1)
+
+    def test_winner_is_notified_once(self):
+        place_bid(self.lamp.id, self.alice, "2")
+        deliver_pending()
+        mail.outbox.clear()
+        self.assertEqual(close_listings([self.lamp.id]), 1)
+        close_listings([self.lamp.id])
+        close_listings([self.vase.id])  # No bids, nobody to tell
+        self.assertEqual(deliver_pending(), (1, 1))
+        self.assertEqual(mail.outbox[0].subject, 'You won "Lamp" for £2.00.')
+
+    def test_bid_appends_one_event(self):
+        place_bid(self.lamp.id, self.alice, "2")
+        event = OutboxEvents.objects.get()
+        self.assertEqual((event.kind, event.user, event.amount), (OutboxEvents.BID, self.alice, Decimal("2.00")))
+
+    def test_worker_command(self):
+        place_bid(self.lamp.id, self.alice, "2")
+        place_bid(self.lamp.id, self.bob, "3")
+        out = StringIO()
+        call_command("deliver_notifications", "--once", stdout=out)
+        self.assertIn("Processed 2 event(s), sent 1 email(s)", out.getvalue())
+
+
+class LivePriceTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = Listings.objects.create(title="Lamp", price=Decimal("10.00"), owner=self.seller)
+        self.factory = AsyncRequestFactory()
+
+    def bid_and_commit(self, amount):
+        # Runs on the test's own connection, where on_commit callbacks are captured
+        with self.captureOnCommitCallbacks(execute=True):
+            return place_bid(self.listing.id, self.bidder, amount)
+
+    async def test_broker_fans_out_to_subscribers(self):
+        broker = LocalBroker()
+        async with broker.subscribe("a") as first, broker.subscribe("a") as second, broker.subscribe("b") as other:
+            self.assertEqual(broker.subscriber_count("a"), 2)
+            broker.publish("a", {"price": "11.00"})
+            self.assertEqual(await first.get(timeout=1), {"price": "11.00"})
+            self.assertEqual(await second.get(timeout=1), {"price": "11.00"})
+            self.assertIsNone(await other.get(timeout=0.01))
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_async_index_and_listing(self):
+        request = self.factory.get(reverse("index"))
+        request.user = AnonymousUser()
+        response = await async_views.index(request)
+        self.assertContains(response, "Lamp")
+        request = self.factory.get(reverse("listing", args=[self.listing.id]))
+        request.user = AnonymousUser()
+        response = await async_views.listing(request, self.listing.id)
+        self.assertContains(response, 'id="listing-price"')
+
+    async def test_async_bid(self):
+        request = self.factory.post(reverse("bid", args=[self.listing.id]), {"up_bid": "12.00"})
+        request.user = AnonymousUser()
+        self.assertEqual((await async_views.bid(request, self.listing.id)).status_code, 302)
+        request.user = self.bidder
+        await async_views.bid(request, self.listing.id)
+        await self.listing.arefresh_from_db()
+        self.assertEqual(self.listing.price, Decimal("12.00"))
+        self.assertEqual(self.listing.high_bidder_id, self.bidder.id)
+
+    @override_settings(AUCTIONS_ASYNC_VIEWS=True)
+    async def test_stream_pushes_accepted_bids(self):
+        response = await async_views.listing_events(self.factory.get("/"), self.listing.id)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertIn('"price": "10.00"', (await anext(stream)).decode())
+        await sync_to_async(self.bid_and_commit)("15.50")
+        event = (await asyncio.wait_for(anext(stream), timeout=1)).decode()
+        self.assertTrue(event.startswith("event: price"))
+        self.assertIn('"high_bidder": "bidder"', event)
+
+    @override_settings(AUCTIONS_ASYNC_VIEWS=True)
+    async def test_stream_for_closed_listing_ends(self):
+        await Listings.objects.filter(pk=self.listing.id).aupdate(is_active=False)
+        response = await async_views.listing_events(self.factory.get("/"), self.listing.id)
+        events = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].startswith(b"event: closed"))
+
+    async def test_no_stream_under_wsgi(self):
+        with self.settings(AUCTIONS_ASYNC_VIEWS=True):
+            response = await async_views.listing_events(RequestFactory().get("/"), self.listing.id)
+        self.assertEqual(response.status_code, 204)
+        response = await self.async_client.get(reverse("listing", args=[self.listing.id]))
+        self.assertNotContains(response, "EventSource")
+
+
+class DbProfileTests(TestCase):
+    def test_sqlite_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], {"NORMAL": 1, "FULL": 2}[settings.AUCTIONS_SQLITE_PRAGMAS["synchronous"]])
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_router_sends_listing_reads_to_replica(self):
+        router = db.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Listings))
+        with db.reading_from(db.REPLICA):
+            self.assertEqual(router.db_for_read(Listings), db.REPLICA)
+            self.assertEqual(router.db_for_read(Bids), db.REPLICA)
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Listings), db.DEFAULT)
+        self.assertFalse(router.allow_migrate(db.REPLICA, "auctions"))
+
+    def test_read_from_replica_skips_writes_and_pinned_clients(self):
+        @db.read_from_replica
+        def view(request):
+            return HttpResponse(db.ReplicaRouter().db_for_read(Listings) or db.DEFAULT)
+
+        factory = RequestFactory()
+        with mock.patch("auctions.db.replica_configured", return_value=True):
+            self.assertEqual(view(factory.get("/")).content, b"replica")
+            self.assertEqual(view(factory.post("/")).content, b"default")
+            factory.cookies[db.PIN_COOKIE] = "1"
+            self.assertEqual(view(factory.get("/")).content, b"default")
+        self.assertEqual(view(RequestFactory().get("/")).content, b"default")
+
+    def test_pin_middleware(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            db.ReplicaPinMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+        with mock.patch("auctions.db.replica_configured", return_value=True):
+            middleware = db.ReplicaPinMiddleware(lambda request: HttpResponse())
+        self.assertIn(db.PIN_COOKIE, middleware(factory.post("/")).cookies)
+        self.assertNotIn(db.PIN_COOKIE, middleware(factory.get("/")).cookies)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(AUCTIONS_THUMBNAIL_DIR=os.path.join(self.directory, "thumbnails")))
+        self.photo = self.make_photo("photo.jpg", (1200, 800))
+        self.seller = User.objects.create_user("seller")
+        self.fetched = []
+
+    def make_photo(self, name, size):
+        path = os.path.join(self.directory, name)
+        Image.new("RGB", size, "orange").save(path)
+        return f"file://{path}"
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        return thumbnails.fetch_file(url)
+
+    def test_each_photo_is_fetched_once_and_stored_by_content(self):
+        first, second = make_listings(self.seller, 2, photo=self.photo)
+        copy = Listings.objects.create(title="Copy", owner=self.seller, photo=self.make_photo("copy.png", (300, 300)))
+        self.assertEqual(thumbnails.build_pending(fetcher=self.fetch), (3, 2, 0))
+        self.assertEqual(sorted(self.fetched), sorted([self.photo, copy.photo]))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        copy.refresh_from_db()
+        self.assertEqual(first.thumbnail, second.thumbnail)
+        self.assertEqual(first.version, 2)
+        self.assertNotEqual(first.thumbnail, copy.thumbnail)
+        name = thumbnails.thumbnail_name(first.thumbnail, 320, "webp")
+        with Image.open(os.path.join(settings.AUCTIONS_THUMBNAIL_DIR, name)) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (320, 240)))
+
+        # A later listing with a known photo needs no fetch
+        later = Listings.objects.create(title="Later", owner=self.seller, photo=self.photo)
+        self.assertEqual(thumbnails.build_pending(fetcher=self.fetch), (1, 0, 0))
+        self.assertEqual(len(self.fetched), 2)
+        later.refresh_from_db()
+        self.assertEqual(later.thumbnail, first.thumbnail)
+
+    def test_failed_photos_are_not_retried(self):
+        missing = Listings.objects.create(title="Missing", owner=self.seller, photo="file:///nonexistent.jpg")
+        with open(os.path.join(self.directory, "junk.jpg"), "w") as f:
+            f.write("not an image")
+        Listings.objects.create(title="Junk", owner=self.seller, photo=f"file://{self.directory}/junk.jpg")
+        self.assertEqual(thumbnails.build_pending(fetcher=self.fetch), (0, 2, 2))
+        self.assertEqual(thumbnails.build_pending(fetcher=self.fetch), (0, 0, 0))
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(Photos.objects.get(url=missing.photo).digest, "")
+        self.assertIn("Not a usable image", Photos.objects.get(url__endswith="junk.jpg").error)
+
+    def test_fetcher_refuses_internal_addresses(self):
+        for url in ("http://127.0.0.1:8000/photo.jpg", "http://169.254.169.254/latest/meta-data", "http://[::ffff:10.0.0.1]/"):
+            with self.assertRaisesMessage(thumbnails.FetchError, "non-public address"):
+                thumbnails.fetch_url(url)
+        request = urllib.request.Request("https://example.com/photo.jpg")
+        with self.assertRaises(thumbnails.FetchError):
+            thumbnails.HTTPRedirectHandler().redirect_request(request, None, 302, "Found", {}, "ftp://10.0.0.1/photo.jpg")
+
+    def test_changing_the_photo_resets_the_thumbnail(self):
+        listing = Listings.objects.create(title="Lamp", owner=self.seller, photo=self.photo)
+        thumbnails.build_pending(fetcher=self.fetch)
+        listing.refresh_from_db()
+        listing.description = "Still the same photo"
+        listing.save()
+        self.assertNotEqual(listing.thumbnail, "")
+        listing.photo = self.make_photo("new.jpg", (640, 480))
+        listing.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.thumbnail, "")
+
+    def test_pages_use_lazy_srcset_and_thumbnails_are_cached_forever(self):
+        listing = Listings.objects.create(title="Lamp", owner=self.seller, photo=self.photo)
+        pending = Listings.objects.create(title="Pending", owner=self.seller, photo="https://example.com/big.jpg")
+        thumbnails.build_pending(fetcher=self.fetch)
+        listing.refresh_from_db()
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f"{listing.thumbnail}-320.webp 320w")
+        self.assertContains(response, 'loading="lazy"', count=2)
+        self.assertContains(response, f'src="{pending.photo}"')
+
+        response = self.client.get(thumbnails.thumbnail_url(listing.thumbnail, 160, "jpg"))
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(self.client.get(thumbnails.thumbnail_url("0" * 64, 160, "jpg")).status_code, 404)
+
+        row = self.client.get(reverse("api_listing", args=[listing.id])).json()
+        self.assertTrue(row["thumbnail"].endswith(f"{listing.thumbnail}-320.jpg"))
+
+    def test_command_renders_in_a_process_pool(self):
+        Listings.objects.create(title="Lamp", owner=self.seller, photo=self.photo)
+        out = StringIO()
+        with override_settings(AUCTIONS_THUMBNAIL_FETCHER="auctions.thumbnails.fetch_file"):
+            call_command("build_thumbnails", "--once", "--workers", "2", stdout=out)
+        self.assertIn("Thumbnailed 1 listing(s) from 1 photo(s) fetched, 0 failed", out.getvalue())
+
+
+@override_settings(STORAGES={**settings.STORAGES, "staticfiles": {"BACKEND": "auctions.staticfiles.CompressedManifestStaticFilesStorage"}})
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.root))
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def setUp(self):
+        self.url = static("auctions/styles.css")
+        self.app = CompressedStaticFiles(lambda environ, start_response: [b"from django"], root=self.root)
+        with open(os.path.join(os.path.dirname(__file__), "static", "auctions", "styles.css"), "rb") as f:
+            self.original = f.read()
+
+    def get(self, url, **headers):
+        environ = {"PATH_INFO": url, "REQUEST_METHOD": "GET", **headers}
+        response = {}
+
+        def start_response(status, headers):
+            response.update(headers, status=status)
+
+        body = b"".join(self.app(environ, start_response))
+        return response, body
+
+    def test_collectstatic_writes_hashed_compressed_files(self):
+        self.assertRegex(self.url, r"^/static/auctions/styles\.[0-9a-f]{12}\.css$")
+        path = os.path.join(self.root, self.url[len("/static/"):])
+        with gzip.open(path + ".gz") as f:
+            self.assertEqual(f.read(), self.original)
+        self.assertEqual(os.path.exists(path + ".br"), staticfiles.brotli is not None)
+        self.assertContains(self.client.get(reverse("index")), f'href="{self.url}"')
+
+    def test_serves_best_encoding_with_immutable_caching(self):
+        response, body = self.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["status"], "200 OK")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "text/css; charset=utf-8")
+        self.assertEqual(gzip.decompress(body), self.original)
+        self.assertEqual(int(response["Content-Length"]), len(body))
+
+        response, body = self.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"], HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual((response["status"], body), ("304 Not Modified", b""))
+
+        response, body = self.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(body, self.original)
+
+    def test_unhashed_names_are_short_lived_and_the_rest_goes_to_django(self):
+        response, _ = self.get("/static/auctions/styles.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+        self.assertEqual(self.get("/static/auctions/missing.css")[1], b"from django")
+        self.assertEqual(self.get("/listing/1/")[1], b"from django")
+
+    async def test_asgi_serves_the_same_files(self):
+        async def django(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"from django"})
+
+        app = staticfiles.ASGICompressedStaticFiles(django, root=self.root)
+
+        async def get(path, headers=()):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {"type": "http", "method": "GET", "path": path, "headers": [(k.encode(), v.encode()) for k, v in headers]}
+            await app(scope, None, send)
+            return messages[0], b"".join(message.get("body", b"") for message in messages[1:])
+
+        start, body = await get(self.url, [("accept-encoding", "gzip")])
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-encoding", b"gzip"), start["headers"])
+        self.assertEqual(gzip.decompress(body), self.original)
+        etag = dict(start["headers"])[b"etag"].decode()
+        start, body = await get(self.url, [("accept-encoding", "gzip"), ("if-none-match", etag)])
+        self.assertEqual((start["status"], body), (304, b""))
+        self.assertEqual((await get("/static/auctions/missing.css"))[1], b"from django")
+
+
+class HotTemplateTests(TestCase):
+    """The Jinja2 versions of the hot pages must render what the Django templates do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.buyer = User.objects.create_user("buyer")
+        cls.category = Categories.objects.create(category_name="Lamps")
+        cls.listing = Listings.objects.create(
+            title="Lamp <b>", description="Bright & warm", price=Decimal("10.00"), owner=cls.seller,
+            category=cls.category, photo="https://example.com/lamp.jpg", ends_at=timezone.now() + timedelta(days=1),
+        )
+        Listings.objects.create(title="Shade", price=Decimal("3.00"), owner=cls.seller, category=cls.category, thumbnail="ab" * 32)
+        place_bid(cls.listing.id, cls.buyer, "12.50")
+        Comments.objects.create(user=cls.buyer, listing=cls.listing, content="Does it <blink>?")
+
+    def setUp(self):
+        cache.clear()
+
+    def pages(self):
+        return [reverse("index"), reverse("category", args=["Lamps"]), reverse("listing", args=[self.listing.id])]
+
+    def normalized(self, url):
+        return " ".join(self.client.get(url).content.decode().split())
+
+    def test_jinja2_renders_the_same_pages(self):
+        self.client.force_login(self.buyer)
+        for url in self.pages():
+            with self.subTest(url=url):
+                expected = self.normalized(url)
+                with override_settings(AUCTIONS_HOT_TEMPLATES="jinja2"):
+                    actual = self.normalized(url)
+                # CSRF tokens are masked differently on every render
+                pattern = r'name="csrfmiddlewaretoken" value="[^"]+"'
+                self.assertEqual(re.sub(pattern, "", actual), re.sub(pattern, "", expected))
+                self.assertIn("Lamp &lt;b&gt;", actual)
+
+    @override_settings(AUCTIONS_HOT_TEMPLATES="jinja2")
+    def test_jinja2_listing_caches_fragments(self):
+        url = reverse("listing", args=[self.listing.id])
+        # listing + watchlist ids (anonymous: none) + first bid page + first comment page
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, "Does it &lt;blink&gt;?")
+
+    def test_templates_are_compiled_ahead(self):
+        perf.warm_templates(views.HOT_TEMPLATE_NAMES)
+        loader = engines.all()[0].engine.template_loaders[0]
+        self.assertTrue(set(views.HOT_TEMPLATE_NAMES) <= set(loader.get_template_cache))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.buyer = User.objects.create_user("buyer")
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.lamps = Categories.objects.create(category_name="Lamps")
+        cls.chairs = Categories.objects.create(category_name="Chairs")
+        cls.lamp = Listings.objects.create(title="Lamp, brass", price=Decimal("10.00"), owner=cls.seller, category=cls.lamps)
+        cls.chair = Listings.objects.create(title="Chair", price=Decimal("5.00"), owner=cls.seller, category=cls.chairs)
+        place_bid(cls.lamp.id, cls.buyer, "12.50")
+        Comments.objects.create(user=cls.buyer, listing=cls.chair, content="Is it sturdy?")
+        close_listings([cls.lamp.id, cls.chair.id])
+
+    def rows(self, response):
+        return list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+
+    def test_closing_records_the_seller_and_time(self):
+        self.lamp.refresh_from_db()
+        self.assertEqual((self.lamp.owner, self.lamp.seller), (self.buyer, self.seller))
+        self.assertIsNotNone(self.lamp.closed_at)
+
+    def test_sales_csv_and_filters(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("export", args=["sales", "csv"]))
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("attachment; filename=\"sales-", response["Content-Disposition"])
+        rows = self.rows(response)
+        self.assertEqual(tuple(rows[0]), exports.SALES_COLUMNS)
+        self.assertEqual(rows[1][:7], [str(self.lamp.id), "Lamp, brass", "Lamps", "seller", "buyer", "12.50", "1"])
+        self.assertEqual(rows[2][3:5], ["seller", ""])
+        self.assertEqual(len(self.rows(self.client.get(reverse("export", args=["sales", "csv"]), {"category": "Chairs"}))), 2)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.rows(self.client.get(reverse("export", args=["sales", "csv"]), {"since": tomorrow}))), 1)
+        self.assertEqual(self.client.get(reverse("export", args=["sales", "csv"]), {"since": "soon"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("export", args=["sales", "xml"])).status_code, 400)
+
+    def test_ndjson_gzip_and_activity(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse("export", args=["activity", "ndjson"]), {"gzip": "1", "user": "seller"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith('.ndjson.gz"'))
+        lines = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+        # Non-staff always get their own activity, whatever ?user= says
+        self.assertEqual(sorted(line["activity"] for line in lines), ["bid", "comment", "won"])
+        bid = next(line for line in lines if line["activity"] == "bid")
+        self.assertEqual((bid["listing_id"], bid["amount"]), (self.lamp.id, "12.50"))
+
+    def test_command(self):
+        out = tempfile.NamedTemporaryFile(suffix=".csv")
+        self.addCleanup(out.close)
+        call_command("export_data", "bids", "--user", "buyer", "--output", out.name)
+        with open(out.name) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[1][1:5], [str(self.lamp.id), "Lamp, brass", "buyer", "12.50"])
+        with self.assertRaises(CommandError):
+            call_command("export_data", "activity")
+
+    def test_memory_stays_flat_for_a_million_bids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000) "
+                "INSERT INTO auctions_bids (bid_amount, bidder_id, listing_id, bid_date) "
+                "SELECT 10 + i %% 1000, %s, %s, %s FROM n",
+                [self.buyer.id, self.lamp.id, timezone.now()],
+            )
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rows = size = 0
+        for block in exports.export("bids", "csv", compress=True):
+            size += len(block)
+        for block in exports.export("bids", "ndjson"):
+            rows += block.count(b"\n")
+        grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before  # KiB on Linux
+        self.assertEqual(rows, 1000001)
+        self.assertGreater(size, 0)
+        self.assertLess(grown, 50 * 1024)
+
+
+class AccountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", "alice@example.com", "correct horse")
+
+    def setUp(self):
+        accounts.users.clear()
+
+    def test_signed_in_pages_use_the_cached_user(self):
+        self.assertTrue(self.client.login(username="alice", password="correct horse"))
+        self.client.get(reverse("categories"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("watchlist"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("auctions_user" in query["sql"] for query in queries.captured_queries))
+
+    def test_password_change_signs_out_other_sessions(self):
+        self.client.login(username="alice", password="correct horse")
+        self.client.get(reverse("categories"))
+        stale = accounts.users.get(self.user.pk)
+        self.user.set_password("new password")
+        self.user.save()
+        self.assertIsNone(accounts.users.get(self.user.pk))
+        self.assertEqual(self.client.get(reverse("watchlist")).status_code, 302)
+        # A row cached before the change doesn't match a new session's hash, so it's reloaded rather than signing out
+        self.client.login(username="alice", password="new password")
+        accounts.users.set(stale)
+        self.assertEqual(self.client.get(reverse("watchlist")).status_code, 200)
+        self.assertEqual(accounts.users.get(self.user.pk).password, self.user.password)
+
+    def test_register_and_login_hash_in_the_pool(self):
+        with mock.patch.object(accounts.passwords, "run", wraps=accounts.passwords.run) as run:
+            response = self.client.post(reverse("register"), {
+                "username": "bob", "email": "bob@EXAMPLE.com", "password": "s3cret!", "confirmation": "s3cret!",
+            })
+            self.assertRedirects(response, reverse("index"))
+            self.client.logout()
+            self.assertRedirects(self.client.post(reverse("login"), {"username": "bob", "password": "s3cret!"}), reverse("index"))
+            self.client.post(reverse("login"), {"username": "nobody", "password": "s3cret!"})
+        self.assertEqual(run.call_count, 3)
+        bob = User.objects.get(username="bob")
+        self.assertEqual(bob.email, "bob@example.com")
+        self.assertTrue(bob.check_password("s3cret!"))
+
+    def test_sign_in_storm_is_turned_away(self):
+        pool = accounts.PasswordHasherPool(1, 0)
+        started, release = threading.Event(), threading.Event()
+
+        def hash_slowly():
+            started.set()
+            release.wait()
+
+        busy = threading.Thread(target=pool.run, args=(hash_slowly,), kwargs={"timeout": 1})
+        busy.start()
+        self.addCleanup(busy.join)
+        self.addCleanup(release.set)
+        started.wait()
+        with self.assertRaises(accounts.PasswordHashingBusy):
+            pool.run(len, "", timeout=0.01)
+        with mock.patch.object(accounts, "passwords", pool), mock.patch.object(accounts.settings, "AUCTIONS_PASSWORD_WAIT", 0.01):
+            response = self.client.post(reverse("login"), {"username": "alice", "password": "correct horse"})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "5")
+            # The admin's sign-in calls authenticate() itself
+            response = self.client.post(reverse("admin:login"), {"username": "alice", "password": "correct horse"})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "5")
+
+
+class ImportTests(TestCase):
+    CSV = (
+        "title,description,photo,starting_bid,category,duration\n"
+        "Lamp,Brass,https://example.com/lamp.jpg,12.50,Lamps,3\n"
+        ",No title,,5,,\n"
+        "Chair,\"Oak, with\nnew legs\",,7.25,,\n"
+        "Shade,Silk,not a url,1,Hats,2\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.lamps = Categories.objects.create(category_name="Lamps")
+        Listings.objects.create(title="Old lamp", price=Decimal("20.00"), owner=cls.seller, category=cls.lamps)
+
+    def test_csv_import_reports_bad_rows(self):
+        summary = imports.import_listings(BytesIO(self.CSV.encode()), "csv", self.seller, batch_size=1)
+        self.assertEqual((summary["created"], summary["invalid"]), (2, 2))
+        self.assertEqual([row["line"] for row in summary["errors"]], [3, 6])
+        self.assertEqual(list(summary["errors"][0]["errors"]), ["title"])
+        self.assertEqual(sorted(summary["errors"][1]["errors"]), ["category", "duration", "photo"])
+        lamp = Listings.objects.get(title="Lamp")
+        self.assertEqual((lamp.owner, lamp.category, lamp.price), (self.seller, self.lamps, Decimal("12.50")))
+        self.assertAlmostEqual(lamp.ends_at - lamp.publication_date, timedelta(days=3), delta=timedelta(seconds=5))
+        self.assertEqual(Listings.objects.get(title="Chair").description, "Oak, with\nnew legs")
+        # Statistics kept up as the listing form would
+        stats = Categories.objects.filter(pk=self.lamps.pk).values_list("active_count", "min_price", "max_price").get()
+        self.assertEqual(stats, (2, Decimal("12.50"), Decimal("20.00")))
+
+    def test_ndjson_upload(self):
+        self.client.force_login(self.seller)
+        lines = [{"title": "Lamp", "description": "Brass", "starting_bid": 9.5, "category": "Lamps"}, "oops", {"title": "Bare"}]
+        upload = SimpleUploadedFile("items.ndjson", "\n".join(json.dumps(line) for line in lines).encode())
+        response = self.client.post(reverse("import_listings"), {"file": upload}, HTTP_ACCEPT="application/json")
+        summary = response.json()
+        self.assertEqual((summary["created"], summary["invalid"]), (1, 2))
+        self.assertEqual(summary["errors"][0], {"line": 2, "errors": {"__all__": ["Not a JSON object."]}})
+        self.assertTrue(Listings.objects.filter(title="Lamp", owner=self.seller).exists())
+
+    def test_unreadable_file_keeps_and_reports_earlier_rows(self):
+        self.client.force_login(self.seller)
+        huge = "x" * (csv.field_size_limit() + 1)
+        upload = SimpleUploadedFile("items.csv", (self.CSV + f"Rug,{huge},,3,,\n").encode())
+        response = self.client.post(reverse("import_listings"), {"file": upload}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 400)
+        summary = response.json()
+        self.assertEqual((summary["created"], summary["invalid"]), (2, 2))
+        self.assertTrue(summary["error"].startswith("Stopped at line 7:"))
+        self.assertTrue(Listings.objects.filter(title="Chair").exists())
+
+        # NDJSON lines are decoded one at a time: bad bytes only spoil their line
+        upload = SimpleUploadedFile("items.ndjson", b'{"title": "Vase", "description": "Blue", "starting_bid": 3}\n\xff\n')
+        response = self.client.post(reverse("import_listings"), {"file": upload})
+        self.assertContains(response, "Created 1 listing;")
+        self.assertContains(response, "1 row skipped.")
+
+    def test_upload_page_and_dry_run(self):
+        self.client.force_login(self.seller)
+        self.assertContains(self.client.get(reverse("import_listings")), "starting_bid")
+        upload = SimpleUploadedFile("items.csv", self.CSV.encode())
+        response = self.client.post(reverse("import_listings"), {"file": upload, "dry_run": "1"})
+        self.assertContains(response, "2 listings would be created;")
+        self.assertContains(response, "2 rows skipped.")
+        self.assertFalse(Listings.objects.filter(title="Lamp").exists())
+        response = self.client.post(reverse("import_listings"), {"file": SimpleUploadedFile("items.xls", b"")})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv") as f:
+            f.write(self.CSV.encode())
+            f.flush()
+            out, err = StringIO(), StringIO()
+            call_command("import_listings", f.name, "--user", "seller", stdout=out, stderr=err)
+        self.assertIn("Created 2 listing(s); skipped 2 invalid row(s)", out.getvalue())
+        self.assertIn("line 3: title: This field is required.", err.getvalue())
+
+        with tempfile.NamedTemporaryFile(suffix=".csv") as f:
+            f.write(f"title,description\nRug,{'x' * (csv.field_size_limit() + 1)}\n".encode())
+            f.flush()
+            out = StringIO()
+            with self.assertRaisesMessage(CommandError, "Stopped at line 2"):
+                call_command("import_listings", f.name, "--user", "seller", stdout=out, stderr=StringIO())
+        self.assertIn("Created 0 listing(s)", out.getvalue())
+
+
+class ProxyBidTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.carol = User.objects.create_user("carol")
+        cls.listing = Listings.objects.create(title="Lamp", price=Decimal("10.00"), owner=cls.seller)
+
+    def state(self):
+        return Listings.objects.filter(pk=self.listing.pk).values_list("price", "high_bidder", "bid_count").get()
+
+    def test_increment_ladder(self):
+        self.assertEqual(increment(Decimal("1.00")), Decimal("0.05"))
+        self.assertEqual(increment(Decimal("1.01")), Decimal("0.20"))
+        self.assertEqual(increment(Decimal("59.99")), Decimal("1.00"))
+        self.assertEqual(increment(Decimal("5000.00")), Decimal("100.00"))
+
+    def test_maximums_compete_one_increment_apart(self):
+        self.assertEqual(place_max_bid(self.listing.pk, self.alice, "20.00"), (ACCEPTED, Decimal("10.50")))
+        self.assertEqual(place_max_bid(self.listing.pk, self.bob, "15.00"), (OVERTAKEN, Decimal("15.50")))
+        self.assertEqual(self.state(), (Decimal("15.50"), self.alice.pk, 2))
+        self.assertEqual(place_max_bid(self.listing.pk, self.bob, "30.00"), (ACCEPTED, Decimal("21.00")))
+        # Raising your own lead writes nothing visible
+        self.assertEqual(place_max_bid(self.listing.pk, self.bob, "40.00"), (ACCEPTED, Decimal("21.00")))
+        self.assertEqual(self.state(), (Decimal("21.00"), self.bob.pk, 3))
+        self.assertEqual(Bids.objects.filter(listing=self.listing).count(), 3)
+
+    def test_ties_go_to_the_earlier_maximum_and_cannot_be_lowered(self):
+        place_max_bid(self.listing.pk, self.alice, "20.00")
+        self.assertEqual(place_max_bid(self.listing.pk, self.bob, "20.00"), (OVERTAKEN, Decimal("20.00")))
+        self.assertEqual(self.state()[:2], (Decimal("20.00"), self.alice.pk))
+        self.assertEqual(place_max_bid(self.listing.pk, self.bob, "20.00").status, OUTBID)
+        place_max_bid(self.listing.pk, self.carol, "50.00")
+        self.assertEqual(place_max_bid(self.listing.pk, self.carol, "40.00"), (INVALID, Decimal("21.00")))
+        self.assertEqual(ProxyBids.objects.get(bidder=self.carol).max_amount, Decimal("50.00"))
+
+    def test_manual_bids_are_answered_by_maximums(self):
+        place_max_bid(self.listing.pk, self.alice, "20.00")
+        self.assertEqual(place_bid(self.listing.pk, self.bob, "12.00"), (OVERTAKEN, Decimal("12.50")))
+        self.assertEqual(place_bid(self.listing.pk, self.bob, "20.00"), (OVERTAKEN, Decimal("20.00")))
+        self.assertEqual(place_bid(self.listing.pk, self.bob, "20.01"), (ACCEPTED, Decimal("20.01")))
+        self.assertEqual(self.state(), (Decimal("20.01"), self.bob.pk, 6))
+        # One event per Bids row, so the usual outbid notices follow
+        self.assertEqual(OutboxEvents.objects.filter(kind=OutboxEvents.BID).count(), 6)
+
+    def test_bid_form_sets_a_maximum(self):
+        self.client.force_login(self.bob)
+        place_max_bid(self.listing.pk, self.alice, "20.00")
+        response = self.client.post(reverse("bid", args=[self.listing.pk]), {"up_bid": "15", "automatic": "1"}, follow=True)
+        self.assertContains(response, "Another bidder&#x27;s maximum bid is higher. The price is now £15.50.")
+        self.assertContains(response, 'name="automatic"')
+
+    def test_replays_write_far_fewer_rows_than_manual_bidding(self):
+        users = [self.alice, self.bob, self.carol] + [User.objects.create_user(f"bidder{i}") for i in range(5)]
+        stream = bid_stream(7, len(users), Decimal("10.00"), spread=Decimal("5.00"))
+        manual_listing = Listings.objects.create(title="By hand", price=Decimal("10.00"), owner=self.seller)
+        manual = replay_manual(manual_listing.pk, users, stream)
+        proxy = replay_proxy(self.listing.pk, users, stream)
+        valuations = sorted(valuation for _, valuation in stream)
+        top, second = valuations[-1], valuations[-2]
+        self.assertEqual(manual.winner, proxy.winner)
+        self.assertEqual(proxy.price, min(top, second + increment(second)))
+        self.assertLessEqual(proxy.rows, len(users))
+        self.assertGreater(manual.rows, 20 * proxy.rows)
+        # Deterministic: the same stream replays to the same result
+        again = Listings.objects.create(title="Again", price=Decimal("10.00"), owner=self.seller)
+        self.assertEqual(replay_manual(again.pk, users, stream), manual)
+
+
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.lamp = Listings.objects.create(title="Lamp", price=Decimal("10.00"), owner=cls.seller)
+        cls.clock = Listings.objects.create(title="Clock", price=Decimal("10.00"), owner=cls.seller)
+
+    def ranking(self, listing):
+        return Listings.objects.filter(pk=listing.pk).values_list("watch_count", "hotness").get()
+
+    def test_bids_comments_and_watchers_heat_listings(self):
+        place_bid(self.lamp.pk, self.alice, "11.00")
+        Comments.objects.create(listing=self.lamp, user=self.bob, content="Still available?")
+        self.assertEqual(self.ranking(self.lamp), (0, ranking.BID_WEIGHT + ranking.COMMENT_WEIGHT))
+        self.lamp.watchlist.add(self.alice, self.bob)
+        self.lamp.watchlist.add(self.alice)  # Already watching: no change
+        self.assertEqual(self.ranking(self.lamp), (2, ranking.BID_WEIGHT + ranking.COMMENT_WEIGHT + 2 * ranking.WATCH_WEIGHT))
+        # Losing watchers lowers the count but not the heat they brought
+        self.alice.watchlist_items.remove(self.lamp, self.clock)
+        self.assertEqual(self.ranking(self.lamp)[0], 1)
+        self.assertEqual(self.ranking(self.clock), (0, 0))
+        self.bob.watchlist_items.clear()
+        self.assertEqual(self.ranking(self.lamp)[0], 0)
+
+    def test_bulk_watchlist_changes_count_once(self):
+        add_to_watchlist(self.alice, [self.lamp.pk, self.clock.pk])
+        add_to_watchlist(self.alice, [self.lamp.pk])
+        self.assertEqual(self.ranking(self.lamp), (1, ranking.WATCH_WEIGHT))
+        self.assertEqual(remove_from_watchlist(self.alice, [self.lamp.pk, self.lamp.pk]), 1)
+        self.assertEqual(remove_from_watchlist(self.alice, [self.lamp.pk]), 0)
+        self.assertEqual([self.ranking(self.lamp)[0], self.ranking(self.clock)[0]], [0, 1])
+
+    def test_decay_halves_scores_each_half_life_once(self):
+        now = timezone.now()
+        Rankings.objects.update(decayed_at=now)
+        Listings.objects.filter(pk=self.lamp.pk).update(hotness=8)
+        Listings.objects.filter(pk=self.clock.pk).update(hotness=ranking.FLOOR * 1.5)
+        later = now + timedelta(seconds=settings.AUCTIONS_HOTNESS_HALF_LIFE)
+        self.assertEqual(ranking.decay(later), 2)
+        self.assertAlmostEqual(self.ranking(self.lamp)[1], 4)
+        # Cooled below the floor, and out of the trending feed
+        self.assertEqual(self.ranking(self.clock)[1], 0)
+        self.assertEqual(list(loaders.trending_listings()), [self.lamp])
+        # That interval is done; a second worker finds nothing to do
+        self.assertEqual(ranking.decay(later), 0)
+        self.assertAlmostEqual(self.ranking(self.lamp)[1], 4)
+
+    def test_rebuild_recomputes_from_recent_activity(self):
+        now = timezone.now()
+        Bids.objects.create(listing=self.lamp, bidder=self.alice, bid_amount=Decimal("11.00"), bid_date=now)
+        Bids.objects.create(listing=self.clock, bidder=self.alice, bid_amount=Decimal("11.00"), bid_date=now - timedelta(days=30))
+        Watch.objects.create(listings_id=self.clock.pk, user_id=self.bob.pk)
+        self.assertEqual(ranking.rebuild(now), 1)
+        self.assertEqual(self.ranking(self.lamp), (0, ranking.BID_WEIGHT))
+        self.assertEqual(self.ranking(self.clock), (1, 0))
+
+    def test_feed_pages(self):
+        now = timezone.now()
+        listings = Listings.objects.bulk_create(
+            Listings(title=f"Item {i}", price=Decimal("1.00"), owner=self.seller, hotness=i % 3, watch_count=i % 4,
+                     ends_at=now + timedelta(hours=i % 5 + 1))
+            for i in range(45)
+        )
+        Listings.objects.filter(pk=listings[0].pk).update(is_active=False, hotness=100, watch_count=100)
+        expected = {
+            "trending": sorted((l for l in listings[1:] if l.hotness), key=lambda l: (-l.hotness, -l.pk)),
+            "most_watched": sorted((l for l in listings[1:] if l.watch_count), key=lambda l: (-l.watch_count, -l.pk)),
+            "ending_soon": sorted(listings[1:], key=lambda l: (l.ends_at, l.pk)),
+        }
+        for feed, ordered in expected.items():
+            seen, url = [], reverse(feed)
+            while url:
+                response = self.client.get(url)
+                seen.extend(listing.pk for listing in response.context["listings"])
+                page = response.context["page"]
+                url = page.has_next and f"{reverse(feed)}?cursor={page.next_cursor}"
+            self.assertEqual(seen, [listing.pk for listing in ordered], feed)
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.lamp = Listings.objects.create(title="Lamp", price=Decimal("10.00"), owner=cls.seller)
+        cls.clock = Listings.objects.create(title="Clock", price=Decimal("10.00"), owner=cls.seller)
+        cls.chair = Listings.objects.create(title="Chair", price=Decimal("10.00"), owner=cls.seller)
+        for i in range(25):
+            place_bid(cls.lamp.pk, cls.alice if i % 2 else cls.bob, Decimal("11.00") + i)
+        place_max_bid(cls.clock.pk, cls.alice, "20.00")
+        Comments.objects.create(listing=cls.lamp, user=cls.alice, content="Does it work?")
+        cls.lamp.watchlist.add(cls.alice)
+        close_listings([cls.lamp.pk, cls.clock.pk])
+        Listings.objects.filter(pk__in=[cls.lamp.pk, cls.clock.pk]).update(closed_at=timezone.now() - timedelta(days=100))
+
+    def deliver(self):
+        OutboxEvents.objects.update(delivered_at=timezone.now())
+
+    def test_archiving_moves_listings_and_summarises_bids(self):
+        bids = list(Bids.objects.filter(listing=self.lamp).order_by("-bid_date", "-id").values_list("bid_amount", "bidder", "bid_date"))
+        # Notifications still to be sent hold the listings back
+        self.assertEqual(archive.archive_closed(), 0)
+        self.deliver()
+        self.assertEqual(archive.archive_closed(), 2)
+        self.assertFalse(Listings.objects.filter(pk__in=[self.lamp.pk, self.clock.pk]).exists())
+        self.assertFalse(Bids.objects.exists() or Comments.objects.exists() or ProxyBids.objects.exists())
+        self.assertFalse(Watch.objects.exists())
+        # Still open, so left alone
+        self.assertTrue(Listings.objects.filter(pk=self.chair.pk, is_active=True).exists())
+        archived = ArchivedListings.objects.get(pk=self.lamp.pk)
+        self.assertEqual((archived.owner, archived.seller, archived.price), (self.bob, self.seller, Decimal("35.00")))
+        self.assertEqual((archived.bid_count, archived.bidder_count, len(archived.bids)), (25, 2, 25 * archive.BID_FORMAT.size))
+        unpacked = archive.unpack_bids(archived)
+        self.assertEqual([row[:2] for row in unpacked], [row[:2] for row in bids])
+        for (_, _, kept), (_, _, placed) in zip(unpacked, bids):
+            self.assertLess(abs(kept - placed), timedelta(seconds=1))
+        self.assertEqual(ArchivedComments.objects.get().listing_id, self.lamp.pk)
+        self.assertEqual(archive.archive_closed(), 0)
+
+    def test_recently_closed_listings_stay(self):
+        self.deliver()
+        close_listings([self.chair.pk])
+        self.assertEqual(archive.archive_closed(timedelta(days=30)), 2)
+        self.assertFalse(Listings.objects.get(pk=self.chair.pk).is_active)
+
+    def test_batches_commit_as_they_go(self):
+        self.deliver()
+        self.assertEqual(archive.archive_closed(batch_size=1, limit=1), 1)
+        self.assertEqual(ArchivedListings.objects.get().pk, self.lamp.pk)
+        out = StringIO()
+        call_command("archive_listings", "--batch-size", "1", stdout=out)
+        self.assertIn("Archived 1 listing(s)", out.getvalue())
+        self.assertEqual(ArchivedListings.objects.count(), 2)
+
+    def test_pages_read_from_the_archive(self):
+        self.deliver()
+        archive.archive_closed()
+        for url in (reverse("closed_listing", args=[self.lamp.pk]), reverse("listing", args=[self.lamp.pk])):
+            response = self.client.get(url)
+            self.assertContains(response, "Lamp")
+            self.assertContains(response, "35.00")
+            self.assertContains(response, "Does it work?")
+            self.assertEqual(len(response.context["bids"]), PAGE_SIZE)
+        page = response.context["bids"]
+        response = self.client.get(reverse("listing_bids", args=[self.lamp.pk]), {"cursor": page.next_cursor})
+        self.assertEqual([bid.bid_amount for bid in response.context["bids"]], [Decimal("15.00") - i for i in range(5)])
+        self.assertEqual(response.context["bids"].items[0].bidder, self.bob)
+        self.assertFalse(response.context["bids"].has_next)
+        self.client.force_login(self.bob)
+        self.assertContains(self.client.get(reverse("user_profile")), reverse("closed_listing", args=[self.lamp.pk]))
+        self.assertEqual(self.client.post(reverse("closed_listing", args=[self.lamp.pk])).status_code, 404)
+        sales = list(exports.sales())
+        self.assertEqual([row[0] for row in sales], [self.lamp.pk, self.clock.pk])
+        self.assertEqual(sales[0][3:7], ("seller", "bob", Decimal("35.00"), 25))
+
+    async def test_async_listing_page_reads_from_the_archive(self):
+        await sync_to_async(self.deliver)()
+        await sync_to_async(archive.archive_closed)()
+        request = AsyncRequestFactory().get(reverse("listing", args=[self.lamp.pk]))
+        request.user = AnonymousUser()
+        response = await async_views.listing(request, self.lamp.pk)
+        self.assertContains(response, "Does it work?")
+        response = await async_views.listing(request, 999)
+        self.assertRedirects(response, reverse("index"), fetch_redirect_response=False)
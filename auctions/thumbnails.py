@@ -0,0 +1,257 @@
+"""
+Thumbnails of listing photos.
+
+Listings.photo can be any URL on any host, so pages don't show it directly
+once a thumbnail exists. The build_thumbnails worker fetches each photo URL
+once, through the callable named by AUCTIONS_THUMBNAIL_FETCHER (url -> bytes).
+It renders fixed-size JPEG and WebP variants in a pool of processes and stores
+them under AUCTIONS_THUMBNAIL_DIR, named by the SHA-256 of the source image.
+The same image is stored once however many listings use it. A file never
+changes once written, so it is served with a far-future Cache-Control (see
+views.thumbnail). The digest is copied to Listings.thumbnail, which the
+{% listing_photo %} tag (templatetags/thumbnails.py) turns into a srcset.
+
+Pillow is only needed by the worker.
+"""
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import repeat
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from django.utils.module_loading import import_string
+
+from .models import Listings, Photos
+
+# (width, height) of every variant: 4:3, cropped to fill
+SIZES = ((160, 120), (320, 240), (640, 480))
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})}
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 10
+FETCH_THREADS = 8
+BATCH_SIZE = 100
+
+
+class FetchError(Exception):
+    pass
+
+
+def is_public_address(ip):
+    """Whether `ip` is on the public internet: not loopback, private, link-local (cloud metadata) and the like."""
+    address = ipaddress.ip_address(ip)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    socket.create_connection() for public hosts only. Every address the host
+    resolves to is checked, and the connection is made to a checked address
+    rather than resolving again, so DNS can't swap in another in between.
+    """
+    host, port = address
+    resolved = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in resolved:
+        if not is_public_address(sockaddr[0]):
+            raise OSError(f"Refusing to fetch from non-public address {sockaddr[0]} ({host})")
+    error = OSError(f"No addresses for {host}")
+    for *_, sockaddr in resolved:
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+class HTTPRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows redirects to HTTP(S) URLs only; the default also follows them to FTP."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlparse(newurl).scheme not in ("http", "https"):
+            raise FetchError(f"Refusing to follow a redirect to {newurl}")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# No proxies (which would be connected to instead of the photo's host), and
+# every connection, redirects included, through connect_public
+opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler, HTTPRedirectHandler,
+)
+
+
+def fetch_url(url):
+    """
+    The default fetcher: an HTTP(S) GET, refusing slow hosts, oversized files,
+    and hosts on loopback, private or link-local addresses, which a seller
+    could otherwise point the worker at to read internal services.
+    """
+    if urlparse(url).scheme not in ("http", "https"):
+        raise FetchError(f"Unsupported URL scheme: {url}")
+    request = urllib.request.Request(url, headers={"User-Agent": "auctions-thumbnailer/1.0"})
+    try:
+        with opener.open(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    except (OSError, ValueError) as e:
+        raise FetchError(str(e)) from e
+    if len(data) > MAX_SOURCE_BYTES:
+        raise FetchError("Photo is too large")
+    return data
+
+
+def fetch_file(url):
+    """A fetcher for file:// URLs, for seeded data and tests."""
+    parsed = urlparse(url)
+    if parsed.scheme != "file":
+        raise FetchError(f"Not a file URL: {url}")
+    try:
+        with open(unquote(parsed.path), "rb") as f:
+            return f.read(MAX_SOURCE_BYTES + 1)
+    except OSError as e:
+        raise FetchError(str(e)) from e
+
+
+def thumbnail_name(digest, width, extension):
+    return f"{digest[:2]}/{digest}-{width}.{extension}"
+
+
+def thumbnail_url(digest, width, extension):
+    return settings.AUCTIONS_THUMBNAIL_URL + thumbnail_name(digest, width, extension)
+
+
+def render_thumbnails(data, directory):
+    """
+    Write every variant of one source image into `directory`, unless already
+    there, and return its digest. Runs in the worker's process pool.
+    """
+    from PIL import Image, ImageOps
+
+    digest = hashlib.sha256(data).hexdigest()
+    wanted = [(size, extension) for size in SIZES for extension in FORMATS
+              if not os.path.exists(os.path.join(directory, thumbnail_name(digest, size[0], extension)))]
+    if not wanted:
+        return digest
+    image = Image.open(BytesIO(data))
+    # JPEGs can be decoded at a fraction of their size, which is most of the work for camera
+    # photos. Square, because the photo may still need rotating upright
+    largest = max(width for width, _ in SIZES)
+    image.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    os.makedirs(os.path.join(directory, digest[:2]), exist_ok=True)
+    for size, extension in wanted:
+        variant = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        path = os.path.join(directory, thumbnail_name(digest, size[0], extension))
+        image_format, options = FORMATS[extension]
+        # Write then rename, so a half written file is never served
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                variant.save(f, image_format, **options)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    return digest
+
+
+def _render(data, directory):
+    """render_thumbnails, returning (digest, error) rather than raising."""
+    try:
+        return render_thumbnails(data, directory), ""
+    except Exception as e:
+        return "", f"Not a usable image: {e}"[:200]
+
+
+def _fetch(fetcher, url):
+    try:
+        return fetcher(url), ""
+    except Exception as e:
+        return None, str(e)[:200] or type(e).__name__
+
+
+def pending_listings(batch_size=BATCH_SIZE):
+    """(id, photo) of listings waiting for thumbnails, skipping photos that already failed."""
+    failed = Photos.objects.filter(url=OuterRef("photo"), digest="")
+    return list(
+        Listings.objects.filter(thumbnail="").exclude(photo="").exclude(Exists(failed))
+        .order_by("id").values_list("id", "photo")[:batch_size]
+    )
+
+
+def build_batch(batch_size=BATCH_SIZE, executor=None, fetcher=None):
+    """
+    Thumbnail one batch of pending listings, rendering in `executor` (a
+    concurrent.futures executor; in this process if None). Returns (listings
+    given thumbnails, photos fetched, photos that failed).
+    """
+    pending = pending_listings(batch_size)
+    if not pending:
+        return 0, 0, 0
+    by_url = {}
+    for pk, url in pending:
+        by_url.setdefault(url, []).append(pk)
+    known = dict(Photos.objects.filter(url__in=list(by_url)).values_list("url", "digest"))
+    new = [url for url in by_url if url not in known]
+
+    fetcher = fetcher or import_string(settings.AUCTIONS_THUMBNAIL_FETCHER)
+    with ThreadPoolExecutor(FETCH_THREADS) as threads:
+        fetched = list(threads.map(_fetch, repeat(fetcher), new))
+    sources = [(url, data) for url, (data, error) in zip(new, fetched) if data is not None]
+    datas = [data for _, data in sources]
+    rendered = (executor.map if executor else map)(_render, datas, repeat(settings.AUCTIONS_THUMBNAIL_DIR))
+    results = dict(zip((url for url, _ in sources), rendered))
+    photos = []
+    for url, (_, fetch_error) in zip(new, fetched):
+        digest, error = results.get(url, ("", fetch_error))
+        photos.append(Photos(url=url, digest=digest, error=error))
+    Photos.objects.bulk_create(photos, ignore_conflicts=True)
+    known.update((photo.url, photo.digest) for photo in photos)
+
+    done = 0
+    for url, digest in known.items():
+        if digest:
+            # version, so cached listing fragments pick the thumbnail up
+            done += Listings.objects.filter(pk__in=by_url[url], thumbnail="").update(
+                thumbnail=digest, version=F("version") + 1,
+            )
+    return done, len(new), sum(1 for photo in photos if not photo.digest)
+
+
+def build_pending(batch_size=BATCH_SIZE, executor=None, fetcher=None):
+    """Thumbnail every pending listing. Returns the build_batch totals."""
+    totals = [0, 0, 0]
+    while True:
+        counts = build_batch(batch_size, executor, fetcher)
+        if not any(counts):
+            return tuple(totals)
+        totals = [total + count for total, count in zip(totals, counts)]
@@ -1,21 +1,48 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 
-from . import views
+from . import api, async_views, views
+
+# The views with async versions; see auctions/async_views.py
+hot_views = async_views if settings.AUCTIONS_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path("", views.index, name="index"),
+    path("", hot_views.index, name="index"),
+    path("search", views.search, name="search"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
-    path("listing/<int:listing_id>/", views.listing, name="listing"),
+    path("listing/<int:listing_id>/", hot_views.listing, name="listing"),
+    path("listing/<int:listing_id>/bids", views.listing_thread, {"thread": "bids"}, name="listing_bids"),
+    path("listing/<int:listing_id>/comments", views.listing_thread, {"thread": "comments"}, name="listing_comments"),
+    path("trending", views.feed, {"feed": "trending"}, name="trending"),
+    path("most_watched", views.feed, {"feed": "most_watched"}, name="most_watched"),
+    path("ending_soon", views.feed, {"feed": "ending_soon"}, name="ending_soon"),
     path("categories", views.categories, name="categories"),
     path("category/<str:category_name>/", views.category, name="category"),
     path("watchlist", views.watchlist, name="watchlist"),
+    path("watchlist/bulk", views.bulk_watchlist, name="bulk_watchlist"),
     path('add_to_watchlist/<int:listing_id>/', views.add_to_watchlist, name='add_to_watchlist'),
     path('remove_from_watchlist/<int:listing_id>/', views.remove_from_watchlist, name='remove_from_watchlist'),
     path("new_listing", views.new_listing, name="new_listing"),
+    path("new_listing/import", views.import_listings, name="import_listings"),
     path("my_profile", views.user_profile, name="user_profile"),
     path("closed_listing/<int:listing_id>/", views.closed_listing, name="closed_listing"),
-    path("listing/<int:listing_id>/bid/", views.bid, name="bid"),
-    path("listing/<int:listing_id>/comment/", views.add_comment, name="add_comment")
+    path("listing/<int:listing_id>/bid/", hot_views.bid, name="bid"),
+    path("listing/<int:listing_id>/comment/", views.add_comment, name="add_comment"),
+    path("_perf", views.perf, name="perf"),
+    path("export/<str:dataset>.<str:format>", views.export, name="export"),
+    re_path(r"^thumbnails/(?P<path>[0-9a-f]{2}/[0-9a-f]{64}-[0-9]+\.(?:webp|jpg))$", views.thumbnail, name="thumbnail"),
+    path("api/listings", api.listings, name="api_listings"),
+    path("api/listings/<int:listing_id>", api.listing, name="api_listing"),
+    path("api/listings/<int:listing_id>/bids", api.listing_thread, {"thread": "bids"}, name="api_listing_bids"),
+    path("api/listings/<int:listing_id>/comments", api.listing_thread, {"thread": "comments"}, name="api_listing_comments"),
+    path("api/categories", api.categories, name="api_categories"),
+    path("api/watchlist", api.watchlist, name="api_watchlist"),
 ]
+
+if settings.AUCTIONS_ASYNC_VIEWS:
+    # Live prices need ASGI: a stream would hold a WSGI worker for as long as it is open
+    urlpatterns.append(
+        path("listing/<int:listing_id>/events", async_views.listing_events, name="listing_events"),
+    )
@@ -1,20 +1,76 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
+from django.core.handlers.asgi import ASGIRequest
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.messages import error
+from django.views.decorators.http import require_GET, require_POST
+from django.views.static import serve
 
+from .accounts import PasswordHashingBusy, make_password
+from .bidding import INVALID, OVERTAKEN, parse_amount, place_bid, place_max_bid
+from .cache import FRAGMENT_TIMEOUT
+from .closing import close_listings
+from .db import read_from_replica
+from .directory import category_directory, find_category
+from . import archive, exports, imports, loaders, watchlists
 from .forms import CreateListingForm
-from .models import User, Categories, Bids, Listings, Comments
+from .models import ArchivedListings, User, Listings, Comments
+from .pagination import paginate
+from .perf import buffer as perf_buffer, summarize
+from .search import search_listings
+from .watchlists import is_watching, watched_ids
+
+# Rendered with the AUCTIONS_HOT_TEMPLATES engine (see auctions.jinja)
+HOT_TEMPLATE_NAMES = ["auctions/index.html", "auctions/category.html", "auctions/listing.html"]
 
+
+@read_from_replica
 def index(request):
-    active_listings = Listings.objects.filter(is_active=True)
-    categories = Categories.objects.all()
-    for category in categories:
-        category.active_listings = category.listings.filter(is_active=True)
-    return render(request, "auctions/index.html", {"listings": active_listings, "categories":categories})
+    """Active listings, newest first, one keyset page at a time."""
+    page = paginate(loaders.active_listings(), request.GET.get("cursor"))
+    return render(
+        request, "auctions/index.html", {"listings": page.items, "page": page, "watched": watched_ids(request.user)},
+        using=settings.AUCTIONS_HOT_TEMPLATES,
+    )
+
+
+def search(request):
+    """Full-text search over listings, filterable by category, price range and status."""
+    query = request.GET.get("q", "")
+    min_price = parse_amount(request.GET.get("min_price", ""))
+    max_price = parse_amount(request.GET.get("max_price", ""))
+    active_only = request.GET.get("include_closed") != "1"
+    page = search_listings(
+        query,
+        category=request.GET.get("category") or None,
+        min_price=min_price,
+        max_price=max_price,
+        active_only=active_only,
+        cursor=request.GET.get("cursor"),
+    )
+    return render(request, "auctions/search.html", {
+        "query": query,
+        "listings": page.items,
+        "page": page,
+        "next_query": _with_cursor(request.GET, page.next_cursor),
+        "watched": watched_ids(request.user),
+    })
+
+
+def _with_cursor(params, cursor):
+    params = params.copy()
+    params["cursor"] = cursor or ""
+    return params.urlencode()
 
 
 def login_view(request):
@@ -23,7 +79,10 @@ def login_view(request):
         # Attempt to sign user in
         username = request.POST["username"]
         password = request.POST["password"]
-        user = authenticate(request, username=username, password=password)
+        try:
+            user = authenticate(request, username=username, password=password)
+        except PasswordHashingBusy:
+            return _too_busy(request, "auctions/login.html")
 
         # Check if authentication successful
         if user is not None:
@@ -59,8 +118,13 @@ def register(request):
 
         # Attempt to create new user
         try:
-            user = User.objects.create_user(username, email, password)
-            user.save()
+            password = make_password(password)
+        except PasswordHashingBusy:
+            return _too_busy(request, "auctions/register.html")
+        try:
+            user = User.objects.create(
+                username=User.normalize_username(username), email=User.objects.normalize_email(email), password=password
+            )
         except IntegrityError:
             return render(
                 request,
@@ -73,43 +137,114 @@ def register(request):
         return render(request, "auctions/register.html")
 
 
+def _too_busy(request, template):
+    response = render(request, template, {"message": "Too many people are signing in right now. Please try again."})
+    response.status_code = 503
+    response["Retry-After"] = "5"
+    return response
+
+
+@read_from_replica
 def listing(request, listing_id):
     try:
-        listing = Listings.objects.get(pk=listing_id)
+        listing = loaders.listing_detail().get(pk=listing_id)
     except Listings.DoesNotExist:
-        return HttpResponseRedirect(reverse("index"))
+        archived = loaders.archived_listing_detail().filter(pk=listing_id).first()
+        if archived is None:
+            return HttpResponseRedirect(reverse("index"))
+        return _closed_listing_page(request, archived)
     if not listing.is_active:
-        return render(request, "auctions/closed_listing.html", {"listing":listing})
-    is_watchlist = request.user.is_authenticated and (request.user in listing.watchlist.all())
-    comments = Comments.objects.filter(listing=listing)
-    is_owner = request.user.username == listing.owner.username
+        return _closed_listing_page(request, listing)
+    user = request.user
+    is_owner = user.is_authenticated and user.id == listing.owner_id
+    is_watchlist = not is_owner and is_watching(user, listing.pk)
+    return _listing_page(request, listing, is_owner, is_watchlist)
+
+
+def _first_pages(listing):
+    """The first page of each of the listing's threads; the rest are a link away (listing_thread)."""
+    if isinstance(listing, ArchivedListings):
+        return {"bids": archive.bid_page(listing), "comments": archive.comment_page(listing)}
+    # Lazy: only fetched when a cached fragment showing them has to be re-rendered
+    return {
+        "bids": SimpleLazyObject(lambda: paginate(loaders.listing_bids(listing), keys=loaders.BID_KEYS)),
+        "comments": SimpleLazyObject(lambda: paginate(loaders.listing_comments(listing))),
+    }
+
+
+def _listing_page(request, listing, is_owner, is_watchlist):
     return render(
         request,
         "auctions/listing.html",
         {
             "listing": listing,
             "is_watchlist": is_watchlist,
-            "comments": comments,
             "is_owner": is_owner,
+            "fragment_timeout": FRAGMENT_TIMEOUT,
+            "live_updates": _live_updates(request),
+            **_first_pages(listing),
         },
+        using=settings.AUCTIONS_HOT_TEMPLATES,
     )
 
 
+def _live_updates(request):
+    """
+    Whether the listing page can stream live prices (auctions.async_views.listing_events).
+    Only under ASGI: under WSGI the open stream would tie up a worker for as long as the page stays open.
+    """
+    return settings.AUCTIONS_ASYNC_VIEWS and isinstance(request, ASGIRequest)
+
+
+def listing_thread(request, listing_id, thread):
+    """Later pages of a listing's bid history or comments (thread is "bids" or "comments")."""
+    cursor = request.GET.get("cursor")
+    listing = Listings.objects.only("id", "title").filter(pk=listing_id).first()
+    if listing is None:
+        listing = get_object_or_404(ArchivedListings, pk=listing_id)
+        page = archive.bid_page(listing, cursor) if thread == "bids" else archive.comment_page(listing, cursor)
+        return render(request, "auctions/thread.html", {"listing": listing, "thread": thread, thread: page})
+    if thread == "bids":
+        page = paginate(loaders.listing_bids(listing), cursor, keys=loaders.BID_KEYS)
+    else:
+        page = paginate(loaders.listing_comments(listing), cursor)
+    return render(request, "auctions/thread.html", {"listing": listing, "thread": thread, thread: page})
+
+
+@read_from_replica
+def feed(request, feed):
+    """Trending, most watched or ending soon listings (feed), one keyset page at a time."""
+    cursor = request.GET.get("cursor")
+    if feed == "trending":
+        page = paginate(loaders.trending_listings(), cursor, keys=loaders.TRENDING_KEYS)
+    elif feed == "most_watched":
+        page = paginate(loaders.most_watched_listings(), cursor, keys=loaders.MOST_WATCHED_KEYS)
+    else:
+        page = paginate(
+            loaders.ending_soon_listings(timezone.now()), cursor, keys=loaders.ENDING_SOON_KEYS, descending=False,
+        )
+    return render(request, "auctions/feed.html", {
+        "feed": feed, "listings": page.items, "page": page, "watched": watched_ids(request.user),
+    })
+
+
 def categories(request):
-    categories = Categories.objects.all()
-    for category in categories:
-        category.active_listings = category.listings.filter(is_active=True)
-    return render(request, "auctions/categories.html", {"categories": categories})
+    return render(request, "auctions/categories.html", {"categories": category_directory()})
 
+@read_from_replica
 def category(request, category_name):
-    category = get_object_or_404(Categories, category_name=category_name)
-    listings = category.listings.filter(is_active=True)
-    return render(request, "auctions/category.html", {"category": category, "listings": listings})
+    category = find_category(category_name=category_name)
+    if category is None:
+        raise Http404("No such category")
+    page = paginate(loaders.category_listings(category), request.GET.get("cursor"))
+    return render(request, "auctions/category.html", {
+        "category": category, "listings": page.items, "page": page, "watched": watched_ids(request.user),
+    }, using=settings.AUCTIONS_HOT_TEMPLATES)
 
 @login_required
 def watchlist(request):
     user = request.user
-    watchlist_items = user.watchlist_items.filter(is_active=True)
+    watchlist_items = list(loaders.watchlist_listings(user))
     return render(request, "auctions/watchlist.html", {"user": user, "watchlist_items":watchlist_items})
 
 @login_required
@@ -122,16 +257,15 @@ def new_listing(request):
             photo = form.cleaned_data['photo']
             starting_bid = form.cleaned_data['starting_bid']
             category = form.cleaned_data['category']
-            category_instance = None
-            if category:
-                category_instance = Categories.objects.get(category_name=category)
+            duration = form.cleaned_data['duration']
             listing = Listings(
                 title = title,
                 description = description,
                 price = starting_bid,
                 photo = photo,
-                category = category_instance,
-                owner = User.objects.get(pk=request.user.id)
+                category_id = category.pk if category else None,
+                owner = request.user,
+                ends_at = timezone.now() + timedelta(days=duration) if duration else None
             )
             listing.save()
             return HttpResponseRedirect(reverse('listing', args=[listing.id]))
@@ -141,65 +275,124 @@ def new_listing(request):
     # For GET request
     return render(request, "auctions/new_listing.html", {"form": CreateListingForm()})
 
+@login_required
+def import_listings(request):
+    """
+    Create many listings at once from an uploaded CSV or NDJSON file (see
+    auctions.imports). Replies with the import summary as JSON if the client
+    asks for JSON, and otherwise shows it on the upload page.
+    """
+    context = {"formats": imports.FORMATS}
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        status = 200
+        try:
+            if upload is None:
+                raise ValueError("Choose a file to import")
+            format = request.POST.get("format") or imports.guess_format(upload.name)
+            context["summary"] = imports.import_listings(
+                upload.file, format, request.user, dry_run=request.POST.get("dry_run") == "1"
+            )
+        except ValueError as e:
+            context["message"], status = str(e), 400
+            # What was imported before the file became unreadable, if any of it was read
+            context["summary"] = getattr(e, "summary", None)
+        if "application/json" in request.headers.get("Accept", ""):
+            if "message" in context:
+                return JsonResponse({**(context["summary"] or {}), "error": context["message"]}, status=status)
+            return JsonResponse(context["summary"], status=status)
+        return render(request, "auctions/import_listings.html", context, status=status)
+    return render(request, "auctions/import_listings.html", context)
+
 @login_required
 def add_to_watchlist(request, listing_id):
-    listing = get_object_or_404(Listings, pk=listing_id)
-    listing.watchlist.add(request.user)
-    return HttpResponseRedirect(reverse('listing', args=[listing.id]))
+    if not watchlists.add_to_watchlist(request.user, [listing_id]):
+        raise Http404("No such listing")
+    return HttpResponseRedirect(reverse('listing', args=[listing_id]))
 
 @login_required
 def remove_from_watchlist(request, listing_id):
-    listing = get_object_or_404(Listings, pk=listing_id)
-    listing.watchlist.remove(request.user)
+    watchlists.remove_from_watchlist(request.user, [listing_id])
     # Could either be removing from the watchlist, or the listing page
     next_page = request.GET.get("next")
     if next_page == "watchlist":
         return HttpResponseRedirect(reverse("watchlist"))
-    return HttpResponseRedirect(reverse("listing", args=[listing.id]))
+    return HttpResponseRedirect(reverse("listing", args=[listing_id]))
+
+@login_required
+@require_POST
+def bulk_watchlist(request):
+    """
+    Add and remove many listings at once. Takes `add` and `remove` lists of
+    listing ids, either as a JSON object or as repeated form fields (the
+    watchlist page's "Remove selected"). JSON requests get JSON back.
+    """
+    is_json = request.content_type == "application/json"
+    try:
+        data = json.loads(request.body) if is_json else {name: request.POST.getlist(name) for name in ("add", "remove")}
+        add, remove = ([int(pk) for pk in data.get(name) or []] for name in ("add", "remove"))
+        if not all(0 < pk <= watchlists.MAX_LISTING_ID for pk in add + remove):
+            raise ValueError
+    except (ValueError, TypeError, AttributeError):
+        return HttpResponseBadRequest("add and remove must be lists of listing ids")
+    added = watchlists.add_to_watchlist(request.user, add) if add else []
+    removed = watchlists.remove_from_watchlist(request.user, remove) if remove else 0
+    if not is_json:
+        return HttpResponseRedirect(reverse("watchlist"))
+    return JsonResponse({"added": sorted(added), "removed": removed, "count": len(watched_ids(request.user))})
 
 
 @login_required
 def user_profile(request):
     """ A page to see everything associated with that user e.g. listings, watchlist etc."""
     user = request.user
-    items = user.owner.filter(is_active=False)
-    sales = user.owner.filter(is_active=True)
+    # Recently closed listings, then those already archived
+    items = list(loaders.owned_listings(user, is_active=False)) + list(loaders.owned_archived_listings(user))
+    sales = list(loaders.owned_listings(user, is_active=True))
     return render(request, "auctions/user_profile.html", {"user": user, "items": items, "sales": sales})
 
 def closed_listing(request, listing_id):
     """Page that appears after seller closes listing or listing ends naturally."""
-    listing = get_object_or_404(Listings, pk=listing_id)
-    comments = Comments.objects.filter(listing=listing)
+    listing = loaders.listing_detail().filter(pk=listing_id).first()
+    if listing is None:
+        if request.method == "POST":
+            raise Http404("No such listing")
+        # Long closed, and archived
+        return _closed_listing_page(request, get_object_or_404(loaders.archived_listing_detail(), pk=listing_id))
     if request.method=="POST":
-        listing.is_active = False
-        top_bid = listing.bids.order_by('-bid_amount').first()
-        if top_bid:
-            listing.owner = top_bid.bidder
+        close_listings([listing.id])
+        listing.refresh_from_db()
+        if listing.high_bidder_id:
             message = "This auction is over, the item was sold to the highest bidder."
         else:
             message = "This auction was closed by the seller."
-        listing.save()
         return render(request, "auctions/closed_listing.html", {"listing": listing, "message": message})
-    is_owner = request.user == listing.owner
-    return render(request, "auctions/closed_listing.html", {"listing": listing, "is_owner": is_owner, "comments": comments})
+    return _closed_listing_page(request, listing)
 
 
+def _closed_listing_page(request, listing):
+    is_owner = request.user.is_authenticated and request.user.id == listing.owner_id
+    return render(request, "auctions/closed_listing.html", {"listing": listing, "is_owner": is_owner, **_first_pages(listing)})
+
+
+@login_required
 def bid(request, listing_id):
-    """When people submit bids on listings."""
+    """When people submit bids on listings, either outright or as a maximum to bid up to automatically."""
     if request.method == "POST":
-        listing = get_object_or_404(Listings, pk=listing_id)
-        if listing.is_active:
-            new_bid = float(request.POST['up_bid'])
-            if new_bid > listing.price:
-                bid = Bids(bid_amount = new_bid, bidder = request.user, listing = listing)
-                bid.save()
-                listing.price = new_bid
-                listing.save()
-            else:
-                error(request, "Your bid must be higher than the current price.")
+        place = place_max_bid if request.POST.get("automatic") == "1" else place_bid
+        _report_bid(request, place(listing_id, request.user, request.POST.get("up_bid", "")))
     return HttpResponseRedirect(reverse("listing", args=[listing_id]))
 
 
+def _report_bid(request, result):
+    if result.status == INVALID:
+        error(request, "Please enter a valid bid." if result.amount is None else "You can only raise your maximum bid.")
+    elif result.status == OVERTAKEN:
+        error(request, f"Another bidder's maximum bid is higher. The price is now £{result.amount}.")
+    elif not result.accepted:
+        error(request, "Your bid must be higher than the current price.")
+
+
 def add_comment(request, listing_id):
     if request.method == "POST":
         listing = get_object_or_404(Listings, pk=listing_id)
@@ -208,5 +401,55 @@ def add_comment(request, listing_id):
             comment = Comments(user = request.user, content = comment_instance, listing = listing)
             comment.save()
     return HttpResponseRedirect(reverse("listing", args=[listing.id]))
-    
-    
\ No newline at end of file
+
+
+@staff_member_required
+def perf(request):
+    """Staff-only summary of recent request timings recorded by PerfMiddleware."""
+    try:
+        top = int(request.GET.get("top", 10))
+    except ValueError:
+        top = 0
+    if top < 1:
+        return HttpResponseBadRequest("top must be a positive whole number")
+    summary = summarize(list(perf_buffer), top=top)
+    if request.GET.get("format") == "json":
+        return JsonResponse(summary)
+    return render(request, "auctions/perf.html", {"summary": summary})
+
+
+@login_required
+@require_GET
+def export(request, dataset, format):
+    """
+    Stream an export (see auctions.exports) as a download. Filters come from
+    ?since=&until=&category=&user=, and ?gzip=1 compresses it. Only staff may
+    export other people's data; everyone else gets their own.
+    """
+    params = request.GET
+    user = params.get("user", "") if request.user.is_staff else request.user.username
+    if dataset == "activity" and not user:
+        user = request.user.username
+    compress = params.get("gzip") == "1"
+    try:
+        filters = exports.parse_filters(params.get("since", ""), params.get("until", ""), params.get("category", ""), user)
+        blocks = exports.export(dataset, format, compress, **filters)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(
+        blocks, content_type="application/gzip" if compress else f"{exports.CONTENT_TYPES[format]}; charset=utf-8"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{exports.filename(dataset, format, compress)}"'
+    return response
+
+
+@require_GET
+def thumbnail(request, path):
+    """
+    A listing photo thumbnail (see auctions.thumbnails). Its name is the digest
+    of its contents, so browsers and proxies may keep it forever. Better served
+    by the web server straight from AUCTIONS_THUMBNAIL_DIR.
+    """
+    response = serve(request, path, document_root=settings.AUCTIONS_THUMBNAIL_DIR)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
@@ -0,0 +1,97 @@
+"""
+Watchlist changes in bulk, and a cached copy of each user's watchlist.
+
+Each user's watched listing ids are cached as one sorted array('I') (4 bytes
+an id) and looked up by bisection, so asking whether a user watches a
+listing costs one primary key lookup, of the user's watchlist stamp (see
+auctions.stamps), rather than a query over the listing's watchers. The cache
+is kept under that stamp, and any change to Listings.watchlist bumps it in
+the same transaction, so every process sees the change: m2m_changed covers
+.add()/.remove()/.clear() (see signals.py), and the bulk functions below
+bump it explicitly, and keep the listings' watcher counts (see
+auctions.ranking), because they write the through table directly.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import ranking, stamps
+from .models import Listings
+
+Watch = Listings.watchlist.through
+TIMEOUT = 60 * 60
+# The largest id an AutoField can hold, well within array('I')
+MAX_LISTING_ID = 2**31 - 1
+
+
+class WatchedIds:
+    """A read-only set of listing ids backed by a sorted array."""
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids=()):
+        self.ids = ids if isinstance(ids, array) else array("I", sorted(ids))
+
+    def __contains__(self, listing_id):
+        i = bisect_left(self.ids, listing_id)
+        return i < len(self.ids) and self.ids[i] == listing_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+
+def _stamp(user_id):
+    return f"watchlist:{user_id}"
+
+
+def watched_ids(user):
+    """The listing ids `user` watches (none for anonymous users), cached."""
+    if not user.is_authenticated:
+        return WatchedIds()
+    key = f"auctions:watchlist:{user.pk}:{stamps.read(_stamp(user.pk))}"
+    packed = cache.get(key)
+    if packed is None:
+        ids = Watch.objects.filter(user_id=user.pk).order_by("listings_id").values_list("listings_id", flat=True)
+        packed = array("I", ids).tobytes()
+        cache.set(key, packed, TIMEOUT)
+    ids = array("I")
+    ids.frombytes(packed)
+    return WatchedIds(ids)
+
+
+def is_watching(user, listing_id):
+    return listing_id in watched_ids(user)
+
+
+def forget(user_ids):
+    """Invalidate these users' cached watchlists, in every process, as the current transaction commits."""
+    stamps.bump(_stamp(user_id) for user_id in user_ids)
+
+
+def add_to_watchlist(user, listing_ids):
+    """Watch every existing listing in `listing_ids` in one transaction. Returns the ids that exist."""
+    with transaction.atomic():
+        found = list(Listings.objects.filter(pk__in=set(listing_ids)).values_list("pk", flat=True))
+        watched = set(Watch.objects.filter(user_id=user.pk, listings_id__in=found).values_list("listings_id", flat=True))
+        added = [pk for pk in found if pk not in watched]
+        Watch.objects.bulk_create((Watch(user_id=user.pk, listings_id=pk) for pk in added), ignore_conflicts=True)
+        ranking.watchers_added(added)
+        forget([user.pk])
+    return found
+
+
+def remove_from_watchlist(user, listing_ids):
+    """Stop watching the given listings in one transaction. Returns how many were being watched."""
+    with transaction.atomic():
+        watched = list(
+            Watch.objects.filter(user_id=user.pk, listings_id__in=set(listing_ids)).values_list("listings_id", flat=True)
+        )
+        Watch.objects.filter(user_id=user.pk, listings_id__in=watched).delete()
+        ranking.watchers_removed(watched)
+        forget([user.pk])
+    return len(watched)
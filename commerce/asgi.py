@@ -12,5 +12,19 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
+# Serve the async versions of the busiest views (see auctions/async_views.py)
+os.environ.setdefault('AUCTIONS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402 (needs the settings module set above)
+
+if not settings.DEBUG:
+    # Serve the collected, precompressed static files (see auctions/staticfiles.py)
+    from auctions.staticfiles import ASGICompressedStaticFiles
+    application = ASGICompressedStaticFiles(application)
+
+    # Compile the busiest templates before the first request rather than during it
+    from auctions.perf import warm_templates
+    from auctions.views import HOT_TEMPLATE_NAMES
+    warm_templates(HOT_TEMPLATE_NAMES)
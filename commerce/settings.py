@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
+import importlib.util
 import os
 
+import django
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -23,9 +27,9 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = '6ps8j!crjgrxt34cqbqn7x&b3y%(fny8k8nh21+qa)%ws3fh!q'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('AUCTIONS_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('AUCTIONS_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -41,11 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auctions.perf.PerfMiddleware',
+    'auctions.db.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware with users cached per process (see auctions/accounts.py)
+    'auctions.accounts.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,9 +61,9 @@ ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for auctions.perf
+        'BACKEND': 'auctions.perf.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,25 +71,127 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Each template is parsed once per process. In DEBUG the autoreloader
+            # empties the cache when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+            # Source positions are only kept for DEBUG's error pages
+            'debug': DEBUG,
         },
     },
 ]
 
+# Jinja2 versions of the hot pages, if jinja2 is installed (see auctions/jinja.py).
+# AUCTIONS_JINJA2=1 renders those pages with it.
+if importlib.util.find_spec('jinja2'):
+    TEMPLATES.append({
+        'NAME': 'jinja2',
+        'BACKEND': 'auctions.jinja.TimedJinja2',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'environment': 'auctions.jinja.environment',
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    })
+AUCTIONS_HOT_TEMPLATES = 'jinja2' if os.environ.get('AUCTIONS_JINJA2') == '1' else None
+
 WSGI_APPLICATION = 'commerce.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
+# SQLite unless AUCTIONS_DB_ENGINE=postgresql. Connections are kept open for
+# AUCTIONS_DB_CONN_MAX_AGE seconds. AUCTIONS_DB_REPLICA_HOST (PostgreSQL) or
+# AUCTIONS_DB_REPLICA_NAME (a replicated SQLite file) adds a read replica used
+# by the hot read-only pages; see auctions/db.py.
+
+CONN_MAX_AGE = int(os.environ.get('AUCTIONS_DB_CONN_MAX_AGE', '600'))
+
+if os.environ.get('AUCTIONS_DB_ENGINE') == 'postgresql':
+    PRIMARY_DATABASE = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('AUCTIONS_DB_NAME', 'auctions'),
+        'USER': os.environ.get('AUCTIONS_DB_USER', ''),
+        'PASSWORD': os.environ.get('AUCTIONS_DB_PASSWORD', ''),
+        'HOST': os.environ.get('AUCTIONS_DB_HOST', ''),
+        'PORT': os.environ.get('AUCTIONS_DB_PORT', ''),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # PgBouncer in transaction mode can't keep a server-side cursor between transactions
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('AUCTIONS_DB_PGBOUNCER') == '1',
+        'OPTIONS': {},
+    }
+    if os.environ.get('AUCTIONS_DB_POOL_SIZE') and django.VERSION >= (5, 1):
+        # Django's own psycopg 3 pool replaces persistent connections
+        PRIMARY_DATABASE['CONN_MAX_AGE'] = 0
+        PRIMARY_DATABASE['OPTIONS']['pool'] = {'min_size': 2, 'max_size': int(os.environ['AUCTIONS_DB_POOL_SIZE'])}
+    REPLICA_DATABASE = os.environ.get('AUCTIONS_DB_REPLICA_HOST') and {
+        **PRIMARY_DATABASE, 'HOST': os.environ['AUCTIONS_DB_REPLICA_HOST'],
+    }
+else:
+    PRIMARY_DATABASE = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('AUCTIONS_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'OPTIONS': {},
+    }
+    if django.VERSION >= (5, 1):
+        # Take the write lock when a transaction starts, so a read-then-write transaction
+        # waits its turn instead of failing when another writer got in first
+        PRIMARY_DATABASE['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    REPLICA_DATABASE = os.environ.get('AUCTIONS_DB_REPLICA_NAME') and {
+        **PRIMARY_DATABASE, 'NAME': os.environ['AUCTIONS_DB_REPLICA_NAME'],
     }
+
+DATABASES = {'default': PRIMARY_DATABASE}
+if REPLICA_DATABASE:
+    DATABASES['replica'] = {**REPLICA_DATABASE, 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['auctions.db.ReplicaRouter']
+AUCTIONS_REPLICA_PIN_SECONDS = 5
+
+# Applied to every new SQLite connection (see auctions/db.py). WAL lets readers
+# carry on during a write; NORMAL sync is durable in WAL mode bar a power cut.
+# WAL is persistent and leaves -wal/-shm files beside the database, so it is
+# off by default in DEBUG, where the database is the checked-in db.sqlite3.
+SQLITE_WAL = os.environ.get('AUCTIONS_SQLITE_WAL', '0' if DEBUG else '1') == '1'
+AUCTIONS_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL' if SQLITE_WAL else 'DELETE',
+    'synchronous': 'NORMAL' if SQLITE_WAL else 'FULL',
+    'busy_timeout': int(os.environ.get('AUCTIONS_SQLITE_BUSY_TIMEOUT_MS', '10000')),
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+    'temp_store': 'MEMORY',
 }
 
 AUTH_USER_MODEL = 'auctions.User'
 
+# Users are loaded through a per-process cache and passwords are hashed in a
+# small thread pool (see auctions/accounts.py)
+AUTHENTICATION_BACKENDS = ['auctions.accounts.CachedUserBackend']
+AUCTIONS_USER_CACHE_TTL = int(os.environ.get('AUCTIONS_USER_CACHE_TTL', '60'))
+AUCTIONS_PASSWORD_THREADS = int(os.environ.get('AUCTIONS_PASSWORD_THREADS', '2'))
+AUCTIONS_PASSWORD_WAIT = 5  # seconds
+
+# Sessions: in the database for development. Outside DEBUG, with a cache every
+# process shares (AUCTIONS_CACHE_DIR), cached_db reads them from the cache and
+# only writes through to the database when they change. With per-process caches
+# it can't be used: a logout in one process would leave the session alive in
+# the others' copies. AUCTIONS_SESSION_ENGINE=signed_cookies keeps them in the
+# cookie, with no server-side storage at all (the session can't then be
+# revoked server-side).
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get(
+    'AUCTIONS_SESSION_ENGINE', 'cached_db' if not DEBUG and os.environ.get('AUCTIONS_CACHE_DIR') else 'db'
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -120,3 +229,82 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.environ.get('AUCTIONS_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+# Outside DEBUG, collectstatic writes content-hashed, precompressed files and
+# commerce/wsgi.py serves them itself (see auctions/staticfiles.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'auctions.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+
+# Caching
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Per-process local memory (least recently used entries are culled first) unless
+# AUCTIONS_CACHE_DIR is set, in which case every process shares a file based cache.
+
+if os.environ.get('AUCTIONS_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['AUCTIONS_CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'auctions',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+    if SESSION_ENGINE.endswith('.cached_db'):
+        raise ImproperlyConfigured('AUCTIONS_SESSION_ENGINE=cached_db needs a shared cache (AUCTIONS_CACHE_DIR)')
+
+
+# Request profiling (see auctions/perf.py)
+
+AUCTIONS_PERF_ENABLED = os.environ.get('AUCTIONS_PERF_ENABLED', '1') == '1'
+AUCTIONS_PERF_BUFFER_SIZE = 5000
+AUCTIONS_PERF_SNAPSHOT_DIR = os.environ.get('AUCTIONS_PERF_SNAPSHOT_DIR')
+
+
+# Async views and live updates (see auctions/async_views.py and auctions/pubsub.py)
+
+AUCTIONS_ASYNC_VIEWS = os.environ.get('AUCTIONS_ASYNC_VIEWS') == '1'
+AUCTIONS_PUBSUB_BACKEND = 'auctions.pubsub.LocalBroker'
+
+
+# Notification emails (see auctions/notifications.py). Written to files under
+# AUCTIONS_EMAIL_DIR unless AUCTIONS_EMAIL_BACKEND names a real backend.
+
+EMAIL_BACKEND = os.environ.get('AUCTIONS_EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('AUCTIONS_EMAIL_DIR', os.path.join(BASE_DIR, 'sent_emails'))
+DEFAULT_FROM_EMAIL = 'auctions@localhost'
+
+
+# Listing photo thumbnails (see auctions/thumbnails.py), built by the
+# build_thumbnails worker. Set AUCTIONS_THUMBNAIL_URL to serve the directory
+# from a web server or CDN instead of Django.
+
+AUCTIONS_THUMBNAIL_DIR = os.environ.get('AUCTIONS_THUMBNAIL_DIR', os.path.join(BASE_DIR, 'thumbnails'))
+AUCTIONS_THUMBNAIL_URL = os.environ.get('AUCTIONS_THUMBNAIL_URL', '/thumbnails/')
+AUCTIONS_THUMBNAIL_FETCHER = 'auctions.thumbnails.fetch_url'
+
+
+# Trending feed (see auctions/ranking.py): listing activity scores halve every
+# AUCTIONS_HOTNESS_HALF_LIFE seconds, applied by the decay_hotness worker.
+
+AUCTIONS_HOTNESS_HALF_LIFE = int(os.environ.get('AUCTIONS_HOTNESS_HALF_LIFE', str(6 * 60 * 60)))
+
+
+# Archiving (see auctions/archive.py): the archive_listings command moves
+# listings closed more than AUCTIONS_ARCHIVE_AFTER_DAYS days ago out of the
+# live tables.
+
+AUCTIONS_ARCHIVE_AFTER_DAYS = int(os.environ.get('AUCTIONS_ARCHIVE_AFTER_DAYS', '90'))
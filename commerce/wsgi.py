@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
 application = get_wsgi_application()
+
+if not settings.DEBUG:
+    # Serve the collected, precompressed static files (see auctions/staticfiles.py)
+    from auctions.staticfiles import CompressedStaticFiles
+    application = CompressedStaticFiles(application)
+
+    # Compile the busiest templates before the first request rather than during it
+    from auctions.perf import warm_templates
+    from auctions.views import HOT_TEMPLATE_NAMES
+    warm_templates(HOT_TEMPLATE_NAMES)